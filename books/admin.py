@@ -1,414 +1,321 @@
-from django.db import models
-from django.contrib.auth.models import User
-from django.core.validators import MinValueValidator, MaxValueValidator
-import os
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Case, Exists, OuterRef, Value, When
 from django.utils import timezone
-from django.urls import reverse
-
-def book_cover_path(instance, filename):
-    """تعیین مسیر ذخیره تصویر جلد کتاب"""
-    return f'book_covers/{instance.title.replace(" ", "_")}{os.path.splitext(filename)[1]}'
-
-class Genre(models.Model):
-    """مدل برای دسته‌بندی سلسله‌مراتبی کتاب‌ها"""
-    name = models.CharField(max_length=100, verbose_name='نام ژانر')
-    parent = models.ForeignKey(
-        'self', 
-        on_delete=models.SET_NULL, 
-        null=True, 
-        blank=True, 
-        verbose_name='ژانر والد'
-    )
-    
-    class Meta:
-        verbose_name = 'ژانر'
-        verbose_name_plural = 'ژانرها'
-        ordering = ['name']
-    
-    def __str__(self):
-        return self.name
-
-class Book(models.Model):
-    """مدل جامع کتاب با تمام ویژگی‌های ضروری"""
-    STATUS_CHOICES = [
-        ('available', 'موجود'),
-        ('borrowed', 'امانت داده شده'),
-        ('reserved', 'رزرو شده'),
-        ('maintenance', 'در حال تعمیر'),
-        ('damaged', 'آسیب دیده'),
-    ]
-    
-    PHYSICAL_CONDITION_CHOICES = [
-        ('excellent', 'عالی'),
-        ('good', 'خوب'),
-        ('fair', 'متوسط'),
-        ('poor', 'ضعیف'),
-        ('damaged', 'آسیب دیده'),
+
+from . import events, fines
+from .inventory import expected_available, recount_copies, status_for
+from .models import Book, BorrowRecord, Closure, Copy, FineEntry, Genre, LoanPolicy, Member, Reservation, SlowQuery
+from .pagination import EstimatedCountPaginator
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    پایه changelist برای جدول‌های بزرگ
+
+    شمارش کل با برآورد planner انجام می‌شود و شمارش دوم «همه نتایج» حذف شده است.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ['name', 'parent']
+    list_select_related = ['parent']
+    search_fields = ['name']
+    autocomplete_fields = ['parent']
+
+
+class CopyInline(admin.TabularInline):
+    model = Copy
+    fields = ['barcode', 'status', 'condition', 'location']
+    extra = 0
+
+
+@admin.register(Book)
+class BookAdmin(ScalableAdmin):
+    list_display = ['title', 'authors', 'isbn', 'genre', 'quantity', 'available', 'status']
+    list_select_related = ['genre']
+    list_filter = ['status', 'genre']
+    # جستجوی پیشوندی/دقیق تا از ایندکس title و isbn استفاده شود
+    search_fields = ['^title', '=isbn']
+    autocomplete_fields = ['genre']
+    readonly_fields = ['available', 'created_at', 'updated_at']
+    actions = ['mark_maintenance', 'mark_damaged', 'restore_status']
+    inlines = [CopyInline]
+
+    def get_readonly_fields(self, request, obj=None):
+        # تعداد کل کتاب‌های دارای نسخه را recount_copies از نسخه‌ها محاسبه می‌کند
+        if obj is not None and obj.copies.exists():
+            return [*self.readonly_fields, 'quantity']
+        return self.readonly_fields
+
+    @staticmethod
+    @transaction.atomic
+    def _update(queryset, **changes):
+        ids = list(queryset.values_list('pk', flat=True))
+        updated = Book.objects.filter(pk__in=ids).update(updated_at=timezone.now(), **changes)
+        events.record_many('book_updated', [{'book_id': pk} for pk in ids])
+        return updated
+
+    @admin.action(description='انتقال به تعمیر')
+    def mark_maintenance(self, request, queryset):
+        updated = self._update(queryset, status='maintenance')
+        self.message_user(request, f'{updated} کتاب به تعمیر منتقل شد')
+
+    @admin.action(description='ثبت آسیب‌دیدگی')
+    def mark_damaged(self, request, queryset):
+        updated = self._update(queryset, status='damaged', physical_condition='damaged')
+        self.message_user(request, f'{updated} کتاب آسیب‌دیده ثبت شد')
+
+    @admin.action(description='بازگرداندن وضعیت بر اساس موجودی')
+    def restore_status(self, request, queryset):
+        updated = self._update(
+            queryset.exclude(physical_condition='damaged'),
+            status=Case(When(available=0, then=Value('borrowed')), default=Value('available')),
+        )
+        self.message_user(request, f'وضعیت {updated} کتاب به‌روزرسانی شد')
+
+
+@admin.register(Copy)
+class CopyAdmin(ScalableAdmin):
+    list_display = ['barcode', 'book', 'status', 'condition', 'location', 'updated_at']
+    list_select_related = ['book']
+    list_filter = ['status', 'condition']
+    search_fields = ['=barcode', '=book__isbn']
+    autocomplete_fields = ['book']
+    readonly_fields = ['created_at', 'updated_at']
+    actions = ['mark_available', 'mark_maintenance', 'mark_lost']
+
+    @staticmethod
+    @transaction.atomic
+    def _set_status(queryset, status):
+        # UPDATE گروهی سیگنال ندارد، پس موجودی کتاب‌ها یک‌جا دوباره شمرده می‌شود
+        book_ids = set(queryset.values_list('book_id', flat=True))
+        updated = queryset.update(status=status, updated_at=timezone.now())
+        recount_copies(book_ids)
+        events.record_many('book_updated', [{'book_id': pk} for pk in book_ids])
+        return updated
+
+    @admin.action(description='آماده امانت')
+    def mark_available(self, request, queryset):
+        # نسخه‌های در دست امانت فقط با ثبت بازگشت آزاد می‌شوند
+        updated = self._set_status(queryset.exclude(status='borrowed'), 'available')
+        self.message_user(request, f'{updated} نسخه آماده امانت شد')
+
+    @admin.action(description='انتقال به تعمیر')
+    def mark_maintenance(self, request, queryset):
+        updated = self._set_status(queryset.exclude(status='borrowed'), 'maintenance')
+        self.message_user(request, f'{updated} نسخه به تعمیر منتقل شد')
+
+    @admin.action(description='ثبت مفقودی')
+    def mark_lost(self, request, queryset):
+        updated = self._set_status(queryset, 'lost')
+        self.message_user(request, f'{updated} نسخه مفقود ثبت شد')
+
+
+@admin.register(Member)
+class MemberAdmin(ScalableAdmin):
+    list_display = ['member_id', 'last_name', 'first_name', 'member_type', 'email', 'active', 'membership_end', 'fine_balance']
+    list_filter = ['active', 'member_type']
+    search_fields = ['=member_id', '^last_name', '=email']
+    raw_id_fields = ['user']
+    actions = ['activate', 'deactivate']
+
+    @admin.action(description='فعال‌سازی عضویت')
+    def activate(self, request, queryset):
+        self.message_user(request, f'{queryset.update(active=True)} عضو فعال شد')
+
+    @admin.action(description='غیرفعال‌سازی عضویت')
+    def deactivate(self, request, queryset):
+        self.message_user(request, f'{queryset.update(active=False)} عضو غیرفعال شد')
+
+
+class OverdueFilter(admin.SimpleListFilter):
+    """امانت‌های باز با موعد گذشته (ایندکس returned, due_date)"""
+    title = 'تأخیر'
+    parameter_name = 'overdue'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'دارای تأخیر')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(returned=False, due_date__lt=timezone.now().date())
+        return queryset
+
+
+@admin.register(BorrowRecord)
+class BorrowRecordAdmin(ScalableAdmin):
+    list_display = ['book', 'member', 'copy', 'borrow_date', 'due_date', 'return_date', 'returned', 'renewal_count', 'fine_amount']
+    list_select_related = ['book', 'member', 'copy']
+    list_filter = ['returned', OverdueFilter]
+    search_fields = ['=member__member_id', '=book__isbn', '=copy__barcode']
+    autocomplete_fields = ['book', 'member', 'copy']
+    readonly_fields = ['borrow_date', 'fine_amount']
+    actions = ['mark_returned', 'renew']
+    # فیلدهای لازم برای قواعد سیاست امانت در کارهای گروهی (یک JOIN، بدون کوئری اضافه)
+    POLICY_FIELDS = ['pk', 'book_id', 'member_id', 'due_date', 'member__member_type', 'book__genre']
+
+    @staticmethod
+    def _open_loans(queryset):
+        return queryset.filter(returned=False).select_related('member', 'book')
+
+    @admin.action(description='ثبت بازگشت')
+    @transaction.atomic
+    def mark_returned(self, request, queryset):
+        today = timezone.now().date()
+        # قفل ردیف‌ها تا بازگشت همزمان از API همین امانت‌ها را دوباره ثبت نکند
+        records = list(
+            self._open_loans(queryset).select_for_update(of=('self',)).only(*self.POLICY_FIELDS, 'copy_id')
+        )
+        for record in records:
+            record.returned = True
+            record.return_date = today
+            record.calculate_fine()
+        # bulk_update یک UPDATE با CASE برای هر دسته است
+        BorrowRecord.objects.bulk_update(records, ['returned', 'return_date', 'fine_amount'], batch_size=1000)
+        # امانت‌های باز جریمه ذخیره‌شده ندارند
+        fines.settle([(record, 0) for record in records], user=request.user)
+        Copy.objects.filter(pk__in=[record.copy_id for record in records if record.copy_id], status='borrowed').update(
+            status='available', updated_at=timezone.now()
+        )
+        # موجودی کتاب‌های درگیر با یک UPDATE از روی امانت‌های باز دوباره محاسبه می‌شود
+        Book.objects.filter(pk__in={record.book_id for record in records}).update(
+            available=expected_available(),
+            status=status_for(expected_available()),
+            updated_at=timezone.now(),
+        )
+        events.record_many('return', [
+            {
+                'book_id': record.book_id, 'member_id': record.member_id, 'object_id': record.pk,
+                'data': {'fine_amount': str(record.fine_amount)},
+            }
+            for record in records
+        ])
+        self.message_user(request, f'بازگشت {len(records)} امانت ثبت شد')
+
+    @admin.action(description='تمدید طبق سیاست امانت')
+    @transaction.atomic
+    def renew(self, request, queryset):
+        records = list(self._open_loans(queryset).only(*self.POLICY_FIELDS, 'renewal_count'))
+        renewed = [record for record in records if record.renew()]
+        BorrowRecord.objects.bulk_update(renewed, ['due_date', 'renewal_count'], batch_size=1000)
+        events.record_many('renewal', [
+            {
+                'book_id': record.book_id, 'member_id': record.member_id, 'object_id': record.pk,
+                'data': {'due_date': record.due_date.isoformat()},
+            }
+            for record in renewed
+        ])
+        skipped = len(records) - len(renewed)
+        self.message_user(request, f'{len(renewed)} امانت تمدید شد؛ {skipped} به سقف تمدید رسیده')
+
+
+@admin.register(Reservation)
+class ReservationAdmin(ScalableAdmin):
+    list_display = ['book', 'member', 'reservation_date', 'expiration_date', 'status']
+    list_select_related = ['book', 'member']
+    list_filter = ['status']
+    search_fields = ['=member__member_id', '=book__isbn']
+    autocomplete_fields = ['book', 'member']
+    actions = ['approve', 'cancel', 'expire']
+
+    @transaction.atomic
+    def _set_status(self, request, queryset, status, label):
+        """
+        تغییر گروهی وضعیت با رعایت یکتایی (کتاب، عضو، وضعیت)
+
+        از چند رزرو انتخاب‌شده یک کتاب و عضو فقط تازه‌ترین تغییر می‌کند. اگر رزرو
+        دیگری از همان کتاب و عضو وضعیت مقصد را داشته باشد، رزرو انتخاب‌شده رد و در
+        پیام گزارش می‌شود تا سابقه قبلی از بین نرود.
+        """
+        selected = list(queryset.order_by('-pk').values('pk', 'book_id', 'member_id'))
+        rows = list({(row['book_id'], row['member_id']): row for row in reversed(selected)}.values())
+        blocked = set(Reservation.objects.filter(pk__in=[row['pk'] for row in rows]).filter(Exists(
+            Reservation.objects.filter(status=status, book_id=OuterRef('book_id'), member_id=OuterRef('member_id'))
+        )).values_list('pk', flat=True))
+        rows = [row for row in rows if row['pk'] not in blocked]
+        updated = Reservation.objects.filter(pk__in=[row['pk'] for row in rows]).update(status=status)
+        events.record_many('reservation', [
+            {'book_id': row['book_id'], 'member_id': row['member_id'], 'object_id': row['pk'], 'data': {'status': status}}
+            for row in rows
+        ])
+        self.message_user(request, f'{updated} رزرو {label} شد')
+        skipped = len(selected) - len(rows)
+        if skipped:
+            self.message_user(
+                request, f'{skipped} رزرو به دلیل رزرو دیگری از همان کتاب و عضو {label} نشد', messages.WARNING
+            )
+
+    @admin.action(description='تایید رزرو')
+    def approve(self, request, queryset):
+        self._set_status(request, queryset.filter(status='pending'), 'approved', 'تایید')
+
+    @admin.action(description='لغو رزرو')
+    def cancel(self, request, queryset):
+        self._set_status(request, queryset.exclude(status='canceled'), 'canceled', 'لغو')
+
+    @admin.action(description='منقضی کردن رزرو')
+    def expire(self, request, queryset):
+        self._set_status(request, queryset.filter(status__in=['pending', 'approved']), 'expired', 'منقضی')
+
+
+@admin.register(LoanPolicy)
+class LoanPolicyAdmin(admin.ModelAdmin):
+    list_display = [
+        'member_type', 'genre', 'loan_days', 'max_loans', 'max_renewals',
+        'fine_per_day', 'grace_days', 'max_fine', 'updated_at'
     ]
-    
-    # اطلاعات اصلی
-    title = models.CharField(max_length=200, verbose_name='عنوان کتاب')
-    authors = models.CharField(max_length=200, verbose_name='نویسنده/نویسندگان')
-    isbn = models.CharField(max_length=20, unique=True, verbose_name='شابک/کد کتاب')
-    publisher = models.CharField(max_length=100, verbose_name='ناشر')
-    publication_year = models.PositiveIntegerField(
-        verbose_name='سال انتشار',
-        validators=[
-            MinValueValidator(1000), 
-            MaxValueValidator(timezone.now().year)
-        ]
-    )
-    genre = models.ForeignKey(
-        Genre, 
-        on_delete=models.SET_NULL, 
-        null=True, 
-        blank=True,
-        verbose_name='ژانر'
-    )
-    
-    # وضعیت فیزیکی
-    pages = models.PositiveIntegerField(verbose_name='تعداد صفحات')
-    physical_condition = models.CharField(
-        max_length=15,
-        choices=PHYSICAL_CONDITION_CHOICES,
-        default='good',
-        verbose_name='وضعیت فیزیکی'
-    )
-    cover = models.ImageField(
-        upload_to=book_cover_path,
-        verbose_name='تصویر جلد',
-        blank=True,
-        null=True
-    )
-    
-    # مدیریت موجودیت
-    quantity = models.PositiveIntegerField(
-        default=1,
-        validators=[MinValueValidator(1)],
-        verbose_name='تعداد کل'
-    )
-    available = models.PositiveIntegerField(
-        verbose_name='موجودی', 
-        default=1,
-        editable=False
-    )
-    status = models.CharField(
-        max_length=15, 
-        choices=STATUS_CHOICES, 
-        default='available',
-        verbose_name='وضعیت'
-    )
-    
-    # اطلاعات اضافی
-    description = models.TextField(blank=True, verbose_name='توضیحات')
-    created_at = models.DateTimeField(
-        auto_now_add=True,
-        verbose_name='تاریخ اضافه شدن'
-    )
-    updated_at = models.DateTimeField(
-        auto_now=True,
-        verbose_name='تاریخ به‌روزرسانی'
-    )
-
-    class Meta:
-        verbose_name = 'کتاب'
-        verbose_name_plural = 'کتاب‌ها'
-        ordering = ['title']
-        indexes = [
-            models.Index(fields=['title']),
-            models.Index(fields=['isbn']),
-            models.Index(fields=['publication_year']),
-        ]
-
-    def __str__(self):
-        return f"{self.title} - {self.authors}"
-
-    def save(self, *args, **kwargs):
-        """محاسبه خودکار موجودی و وضعیت"""
-        # محاسبه موجودی
-        if not self.available:
-            self.available = self.quantity
-        
-        # به‌روزرسانی خودکار وضعیت
-        if self.available == 0:
-            self.status = 'borrowed'
-        elif self.physical_condition == 'damaged':
-            self.status = 'damaged'
-        
-        super().save(*args, **kwargs)
-    
-    def get_absolute_url(self):
-        return reverse('book_detail', args=[str(self.id)])
-
-
-class Member(models.Model):
-    """مدل جامع اعضا با قابلیت اتصال به سیستم احراز هویت"""
-    MEMBER_TYPE_CHOICES = [
-        ('student', 'دانشجو'),
-        ('professor', 'استاد'),
-        ('staff', 'کارمند'),
-        ('guest', 'میهمان'),
+    list_select_related = ['genre']
+    list_filter = ['member_type']
+    autocomplete_fields = ['genre']
+
+
+@admin.register(Closure)
+class ClosureAdmin(admin.ModelAdmin):
+    list_display = ['date', 'reason']
+    date_hierarchy = 'date'
+    search_fields = ['reason']
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """نمایش آمار کوئری‌های کند برای یافتن ایندکس‌های لازم"""
+    list_display = [
+        'fingerprint', 'calls', 'total_time', 'mean_time_display',
+        'max_time', 'last_origin', 'last_seen'
     ]
-    
-    # اتصال به سیستم کاربری
-    user = models.OneToOneField(
-        User, 
-        on_delete=models.CASCADE,
-        null=True,
-        blank=True,
-        verbose_name='حساب کاربری'
-    )
-    
-    # اطلاعات هویتی
-    first_name = models.CharField(max_length=100, verbose_name='نام')
-    last_name = models.CharField(max_length=100, verbose_name='نام خانوادگی')
-    member_id = models.CharField(
-        max_length=20, 
-        unique=True, 
-        verbose_name='شماره عضویت'
-    )
-    student_id = models.CharField(
-        max_length=20, 
-        unique=True,
-        null=True,
-        blank=True,
-        verbose_name='شماره دانشجویی/پرسنلی'
-    )
-    
-    # اطلاعات تماس
-    phone = models.CharField(
-        max_length=15, 
-        blank=True, 
-        null=True,
-        verbose_name='تلفن'
-    )
-    email = models.EmailField(
-        verbose_name='ایمیل'
-    )
-    address = models.TextField(
-        blank=True,
-        verbose_name='آدرس'
-    )
-    
-    # وضعیت عضویت
-    member_type = models.CharField(
-        max_length=10,
-        choices=MEMBER_TYPE_CHOICES,
-        default='student',
-        verbose_name='نوع عضو'
-    )
-    membership_start = models.DateField(
-        auto_now_add=True,
-        verbose_name='تاریخ شروع عضویت'
-    )
-    membership_end = models.DateField(
-        verbose_name='تاریخ پایان عضویت'
-    )
-    active = models.BooleanField(
-        default=True, 
-        verbose_name='فعال'
-    )
-    max_borrow_limit = models.PositiveIntegerField(
-        default=3,
-        verbose_name='حداکثر تعداد امانت'
-    )
-    
-    # اطلاعات اضافی
-    notes = models.TextField(
-        blank=True,
-        verbose_name='یادداشت‌ها'
-    )
-
-    class Meta:
-        verbose_name = 'عضو'
-        verbose_name_plural = 'اعضا'
-        ordering = ['last_name', 'first_name']
-        indexes = [
-            models.Index(fields=['member_id']),
-            models.Index(fields=['last_name', 'first_name']),
-        ]
-
-    def __str__(self):
-        return f"{self.get_full_name()} ({self.member_id})"
-
-    def get_full_name(self):
-        """نام کامل عضو"""
-        if self.user:
-            return self.user.get_full_name()
-        return f"{self.first_name} {self.last_name}"
-    
-    def is_membership_valid(self):
-        """بررسی اعتبار عضویت"""
-        return self.active and self.membership_end >= timezone.now().date()
-    
-    @property
-    def name(self):
-        """برای سازگاری با کدهای قدیمی"""
-        return self.get_full_name()
-
-
-class BorrowRecord(models.Model):
-    """مدل پیشرفته سوابق امانت کتاب"""
-    book = models.ForeignKey(
-        Book, 
-        on_delete=models.CASCADE, 
-        verbose_name='کتاب',
-        related_name='borrow_records'
-    )
-    member = models.ForeignKey(
-        Member, 
-        on_delete=models.CASCADE, 
-        verbose_name='عضو',
-        related_name='borrow_records'
-    )
-    
-    # اطلاعات امانت
-    borrow_date = models.DateField(
-        auto_now_add=True,
-        verbose_name='تاریخ امانت'
-    )
-    due_date = models.DateField(
-        verbose_name='موعد بازگشت'
-    )
-    return_date = models.DateField(
-        null=True, 
-        blank=True, 
-        verbose_name='تاریخ بازگشت'
-    )
-    returned = models.BooleanField(
-        default=False, 
-        verbose_name='برگشت داده شده؟'
-    )
-    
-    # اطلاعات تمدید و جریمه
-    renewal_count = models.PositiveIntegerField(
-        default=0,
-        verbose_name='تعداد تمدید'
-    )
-    fine_amount = models.DecimalField(
-        max_digits=10, 
-        decimal_places=2, 
-        default=0, 
-        verbose_name='مبلغ جریمه'
-    )
-    
-    # اطلاعات اضافی
-    notes = models.TextField(
-        blank=True,
-        verbose_name='یادداشت‌ها'
-    )
-
-    class Meta:
-        verbose_name = 'سابقه امانت'
-        verbose_name_plural = 'سوابق امانت'
-        ordering = ['-borrow_date']
-        permissions = [
-            ('can_renew_borrowing', 'می‌تواند امانت را تمدید کند'),
-        ]
-        indexes = [
-            models.Index(fields=['borrow_date']),
-            models.Index(fields=['due_date']),
-        ]
-
-    def __str__(self):
-        status = "برگشت داده شده" if self.returned else "در دست امانت"
-        return f"{self.book.title} - {self.member.name} ({status})"
-
-    def save(self, *args, **kwargs):
-        """محاسبات خودکار هنگام ذخیره"""
-        # محاسبه تاریخ برگشت
-        if self.returned and not self.return_date:
-            self.return_date = timezone.now().date()
-        
-        # محاسبه موعد برگشت برای امانت جدید
-        if not self.pk:
-            self.set_due_date()
-        
-        # محاسبه جریمه
-        self.calculate_fine()
-        
-        super().save(*args, **kwargs)
-    
-    def set_due_date(self):
-        """تعیین تاریخ برگشت بر اساس نوع عضو"""
-        base_days = 14  # پیش‌فرض برای دانشجویان و مهمانان
-        
-        if self.member.member_type == 'professor':
-            base_days = 30
-        elif self.member.member_type == 'staff':
-            base_days = 21
-            
-        self.due_date = self.borrow_date + timezone.timedelta(days=base_days)
-    
-    def calculate_fine(self):
-        """محاسبه جریمه تأخیر"""
-        if not self.returned or not self.return_date:
-            self.fine_amount = 0
-            return
-        
-        if self.return_date > self.due_date:
-            days_late = (self.return_date - self.due_date).days
-            self.fine_amount = days_late * 5000  # 5000 تومان برای هر روز تأخیر
-
-
-class Reservation(models.Model):
-    """مدل مدیریت رزرو کتاب"""
-    RESERVATION_STATUS = [
-        ('pending', 'در انتظار تایید'),
-        ('approved', 'تایید شده'),
-        ('canceled', 'لغو شده'),
-        ('expired', 'منقضی شده'),
+    search_fields = ['normalized_sql', 'last_origin']
+    ordering = ['-total_time']
+    readonly_fields = [
+        'fingerprint', 'normalized_sql', 'sample_sql', 'calls', 'total_time',
+        'max_time', 'last_origin', 'plan', 'first_seen', 'last_seen'
     ]
-    
-    book = models.ForeignKey(
-        Book, 
-        on_delete=models.CASCADE, 
-        verbose_name='کتاب',
-        related_name='reservations'
-    )
-    member = models.ForeignKey(
-        Member, 
-        on_delete=models.CASCADE, 
-        verbose_name='عضو',
-        related_name='reservations'
-    )
-    
-    # اطلاعات رزرو
-    reservation_date = models.DateTimeField(
-        auto_now_add=True,
-        verbose_name='تاریخ رزرو'
-    )
-    expiration_date = models.DateTimeField(
-        verbose_name='تاریخ انقضا'
-    )
-    status = models.CharField(
-        max_length=10, 
-        choices=RESERVATION_STATUS, 
-        default='pending',
-        verbose_name='وضعیت'
-    )
-    
-    # اطلاعات اضافی
-    notes = models.TextField(
-        blank=True,
-        verbose_name='یادداشت‌ها'
-    )
-
-    class Meta:
-        verbose_name = 'رزرو'
-        verbose_name_plural = 'رزروها'
-        ordering = ['-reservation_date']
-        unique_together = ['book', 'member', 'status']
-
-    def __str__(self):
-        return f"رزرو {self.book.title} توسط {self.member.name}"
-
-    def save(self, *args, **kwargs):
-        """تعیین خودکار تاریخ انقضا"""
-        if not self.expiration_date:
-            self.expiration_date = timezone.now() + timezone.timedelta(days=3)
-        super().save(*args, **kwargs)
-    
-    def is_active(self):
-        """بررسی فعال بودن رزرو"""
-        return self.status == 'approved' and timezone.now() < self.expiration_date
\ No newline at end of file
+
+    @admin.display(description='میانگین زمان (ms)')
+    def mean_time_display(self, obj):
+        return round(obj.mean_time, 1)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(FineEntry)
+class FineEntryAdmin(ScalableAdmin):
+    """دفتر جریمه فقط‌خواندنی است؛ سطرها از طریق books.fines ثبت می‌شوند تا مانده عضو همراهشان تغییر کند"""
+    list_display = ['member', 'kind', 'amount', 'record_id', 'note', 'created_by', 'created_at']
+    list_select_related = ['member', 'created_by']
+    list_filter = ['kind']
+    search_fields = ['=member__member_id']
+    raw_id_fields = ['member', 'created_by']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -3,3 +3,28 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from . import autocomplete, catalog, events, inventory, policies, slow_queries, sync
+        from .models import Book, Closure, Copy, Genre, LoanPolicy, Reservation
+
+        connection_created.connect(slow_queries.install, dispatch_uid='books.slow_queries')
+        post_save.connect(autocomplete.book_saved, sender=Book, dispatch_uid='books.autocomplete.saved')
+        post_delete.connect(autocomplete.book_deleted, sender=Book, dispatch_uid='books.autocomplete.deleted')
+        post_delete.connect(sync.record_deletion, sender=Book, dispatch_uid='books.sync.book_deleted')
+        post_delete.connect(sync.record_deletion, sender=Genre, dispatch_uid='books.sync.genre_deleted')
+        post_save.connect(events.book_saved, sender=Book, dispatch_uid='books.events.book_saved')
+        post_delete.connect(events.book_deleted, sender=Book, dispatch_uid='books.events.book_deleted')
+        post_save.connect(events.reservation_saved, sender=Reservation, dispatch_uid='books.events.reservation_saved')
+        post_save.connect(inventory.copy_changed, sender=Copy, dispatch_uid='books.inventory.copy_saved')
+        post_delete.connect(inventory.copy_changed, sender=Copy, dispatch_uid='books.inventory.copy_deleted')
+        for model in (LoanPolicy, Closure, Genre):
+            uid = f'books.policies.{model._meta.model_name}'
+            post_save.connect(policies.policy_changed, sender=model, dispatch_uid=f'{uid}.saved')
+            post_delete.connect(policies.policy_changed, sender=model, dispatch_uid=f'{uid}.deleted')
+        for model in (Book, Genre):
+            uid = f'books.catalog.{model._meta.model_name}'
+            post_save.connect(catalog.changed, sender=model, dispatch_uid=f'{uid}.saved')
+            post_delete.connect(catalog.deleted, sender=model, dispatch_uid=f'{uid}.deleted')
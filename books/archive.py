@@ -0,0 +1,101 @@
+"""
+بایگانی سوابق امانت قدیمی و خواندن یکپارچه از هر دو جدول
+
+سوابق برگشت‌داده‌شده‌ای که از BORROW_ARCHIVE_AFTER_DAYS قدیمی‌تر باشند به‌صورت
+دسته‌ای به ArchivedBorrowRecord منتقل می‌شوند تا جدول BorrowRecord و ایندکس‌هایش
+فقط امانت‌های باز و سوابق اخیر را نگه دارند.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedBorrowRecord, Book, BorrowRecord
+
+# ستون‌های مشترک دو جدول
+HISTORY_FIELDS = [
+    'book_id', 'member_id', 'copy_id', 'borrow_date', 'due_date', 'return_date',
+    'returned', 'renewal_count', 'fine_amount', 'notes',
+]
+
+
+def archive_borrow_records(older_than_days=None, batch_size=None):
+    """انتقال دسته‌ای سوابق قدیمی؛ تعداد سوابق منتقل‌شده را برمی‌گرداند"""
+    if older_than_days is None:
+        older_than_days = settings.BORROW_ARCHIVE_AFTER_DAYS
+    if batch_size is None:
+        batch_size = settings.BORROW_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now().date() - timezone.timedelta(days=older_than_days)
+
+    moved = 0
+    while True:
+        # هر دسته در تراکنش کوتاه خودش تا قفل‌ها طولانی نشوند
+        with transaction.atomic():
+            records = list(
+                BorrowRecord.objects
+                .filter(returned=True, return_date__lt=cutoff)
+                .order_by('pk')
+                .select_for_update(skip_locked=True)
+                .values('pk', *HISTORY_FIELDS)[:batch_size]
+            )
+            if not records:
+                break
+            ids = [record.pop('pk') for record in records]
+            ArchivedBorrowRecord.objects.bulk_create(
+                [
+                    ArchivedBorrowRecord(original_id=pk, **record)
+                    for pk, record in zip(ids, records)
+                ],
+                ignore_conflicts=True,
+            )
+            BorrowRecord.objects.filter(pk__in=ids).delete()
+        moved += len(ids)
+    return moved
+
+
+def borrow_history(**filters):
+    """
+    سوابق امانت از هر دو جدول به‌صورت یک queryset از dict (union)
+
+    filters روی ستون‌های مشترک اعمال می‌شود، مثلاً member=... یا book_id=...
+    """
+    fields = {
+        'record_id': F('pk'),
+        'book_title': F('book__title'),
+        'member_first_name': F('member__first_name'),
+        'member_last_name': F('member__last_name'),
+    }
+    hot = (
+        BorrowRecord.objects.filter(**filters).order_by()
+        .values(*HISTORY_FIELDS, **fields)
+        .annotate(archived=Value(False, output_field=BooleanField()))
+    )
+    fields['record_id'] = F('original_id')
+    cold = (
+        ArchivedBorrowRecord.objects.filter(**filters).order_by()
+        .values(*HISTORY_FIELDS, **fields)
+        .annotate(archived=Value(True, output_field=BooleanField()))
+    )
+    return hot.union(cold, all=True).order_by('-borrow_date', '-record_id')
+
+
+def _borrow_count(model):
+    return Subquery(
+        model.objects.filter(book=OuterRef('pk'))
+        .order_by().values('book')
+        .annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    )
+
+
+def with_total_borrow_count(queryset=None):
+    """افزودن borrow_count از هر دو جدول بدون join ضربی"""
+    if queryset is None:
+        queryset = Book.objects.all()
+    return queryset.annotate(
+        borrow_count=(
+            Coalesce(_borrow_count(BorrowRecord), 0)
+            + Coalesce(_borrow_count(ArchivedBorrowRecord), 0)
+        )
+    )
@@ -0,0 +1,228 @@
+"""
+ایندکس پیشوندی درون‌حافظه‌ای برای تکمیل خودکار عنوان، نویسنده و ناشر
+
+ایندکس یک آرایه مرتب از (عبارت نرمال‌شده، شناسه کتاب) است و جستجوی پیشوند
+با bisect انجام می‌شود؛ پیشنهادها هیچ‌وقت به پایگاه داده نمی‌روند. هر پروسه
+ایندکس خودش را دارد: تغییرات محلی با سیگنال‌های Book اعمال می‌شوند و تغییرات
+پروسه‌های دیگر با یک شمارنده نسل در کش تشخیص داده شده و ایندکس در پس‌زمینه
+از نو ساخته می‌شود.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'autocomplete:generation'
+
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه',
+    '\u200c': ' ', '-': ' ', '_': ' ',
+})
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """یکسان‌سازی حروف عربی/فارسی، حذف اعراب و کوچک‌کردن حروف"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    text = unicodedata.normalize('NFKC', text).casefold().translate(_CHAR_MAP)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def terms_for(title, authors, publisher):
+    """همه پسوندهای کلمه‌به‌کلمه هر فیلد تا پیشوند هر کلمه قابل جستجو باشد"""
+    terms = set()
+    for value in (title, authors, publisher):
+        words = normalize(value).split(' ')
+        for start in range(len(words)):
+            term = ' '.join(words[start:])
+            if term:
+                terms.add(term)
+    return terms
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._entries = []      # [(term, book_id)] مرتب
+        self._books = {}        # book_id -> {'title', 'authors', 'publisher', 'score', 'terms'}
+        self._lock = threading.RLock()
+        self._built = False
+        self._rebuilding = False
+        self.generation = None
+        self._last_check = 0.0
+
+    # ---------- ساخت ----------
+
+    def load(self, rows):
+        """ساخت کامل ایندکس از سطرهای (id, title, authors, publisher, score)"""
+        entries = []
+        books = {}
+        for book_id, title, authors, publisher, score in rows:
+            terms = terms_for(title, authors, publisher)
+            books[book_id] = {
+                'title': title, 'authors': authors, 'publisher': publisher,
+                'score': score or 0, 'terms': terms,
+            }
+            entries.extend((term, book_id) for term in terms)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._books = books
+            self._built = True
+            self._last_check = time.monotonic()
+
+    def rebuild(self):
+        from .archive import with_total_borrow_count
+
+        generation = cache.get(GENERATION_KEY)
+        rows = with_total_borrow_count().order_by().values_list(
+            'id', 'title', 'authors', 'publisher', 'borrow_count'
+        )
+        self.load(rows.iterator(chunk_size=2000))
+        self.generation = generation
+
+    def warm(self):
+        """ساخت ایندکس در شروع پروسه وب؛ در صورت خطا ساخت به اولین استفاده موکول می‌شود"""
+        try:
+            self.rebuild()
+        except DatabaseError:
+            logger.warning('autocomplete index not built at startup', exc_info=True)
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            from django.db import connections
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception('autocomplete index rebuild failed')
+            finally:
+                self._rebuilding = False
+                connections.close_all()
+
+        threading.Thread(target=run, name='autocomplete-rebuild', daemon=True).start()
+
+    def _sync(self):
+        """بررسی دوره‌ای شمارنده نسل در کش برای تغییرات پروسه‌های دیگر"""
+        now = time.monotonic()
+        if now - self._last_check < getattr(settings, 'AUTOCOMPLETE_SYNC_INTERVAL', 30):
+            return
+        self._last_check = now
+        if cache.get(GENERATION_KEY) != self.generation:
+            self._rebuild_in_background()
+
+    # ---------- به‌روزرسانی تدریجی ----------
+
+    def update(self, book):
+        """اعمال ذخیره یک کتاب؛ اگر متن ایندکس‌شده عوض شده باشد True برمی‌گرداند"""
+        terms = terms_for(book.title, book.authors, book.publisher)
+        with self._lock:
+            current = self._books.get(book.pk)
+            if current is not None and current['terms'] == terms:
+                current.update(title=book.title, authors=book.authors, publisher=book.publisher)
+                return False
+            if current is not None:
+                self._remove_terms(book.pk, current['terms'])
+            for term in terms:
+                bisect.insort(self._entries, (term, book.pk))
+            self._books[book.pk] = {
+                'title': book.title, 'authors': book.authors, 'publisher': book.publisher,
+                'score': current['score'] if current else 0, 'terms': terms,
+            }
+        return True
+
+    def remove(self, book_id):
+        with self._lock:
+            current = self._books.pop(book_id, None)
+            if current is not None:
+                self._remove_terms(book_id, current['terms'])
+
+    def bump(self, book_id, amount=1):
+        """افزایش امتیاز محبوبیت (مثلاً پس از هر امانت)"""
+        with self._lock:
+            current = self._books.get(book_id)
+            if current is not None:
+                current['score'] += amount
+
+    def _remove_terms(self, book_id, terms):
+        for term in terms:
+            position = bisect.bisect_left(self._entries, (term, book_id))
+            if position < len(self._entries) and self._entries[position] == (term, book_id):
+                del self._entries[position]
+
+    # ---------- جستجو ----------
+
+    def search(self, query, limit=10):
+        if not self._built:
+            self.rebuild()
+        else:
+            self._sync()
+
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        max_candidates = getattr(settings, 'AUTOCOMPLETE_MAX_CANDIDATES', 500)
+        with self._lock:
+            candidates = set()
+            position = bisect.bisect_left(self._entries, (prefix,))
+            while position < len(self._entries) and len(candidates) < max_candidates:
+                term, book_id = self._entries[position]
+                if not term.startswith(prefix):
+                    break
+                candidates.add(book_id)
+                position += 1
+            books = [(book_id, self._books[book_id]) for book_id in candidates]
+
+        books.sort(key=lambda item: (-item[1]['score'], item[1]['title']))
+        return [
+            {
+                'id': book_id,
+                'title': book['title'],
+                'authors': book['authors'],
+                'publisher': book['publisher'],
+            }
+            for book_id, book in books[:limit]
+        ]
+
+    @property
+    def built(self):
+        return self._built
+
+
+index = AutocompleteIndex()
+
+
+def book_saved(sender, instance, **kwargs):
+    """گیرنده post_save کتاب"""
+    if not index.built or index.update(instance):
+        _bump_generation()
+
+
+def book_deleted(sender, instance, **kwargs):
+    """گیرنده post_delete کتاب"""
+    index.remove(instance.pk)
+    _bump_generation()
+
+
+def _bump_generation():
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY)
+    # این پروسه تغییر خودش را اعمال کرده؛ اگر نسل دیگری هم در این فاصله ثبت شده باشد
+    # بررسی دوره‌ای بعدی ایندکس را از نو می‌سازد
+    if index.generation is not None and generation == index.generation + 1:
+        index.generation = generation
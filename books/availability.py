@@ -0,0 +1,96 @@
+"""
+بیت‌مپ فشرده کتاب‌های در دسترس برای کیوسک‌ها
+
+بیت id & 7 از بایت id >> 3 (کم‌ارزش‌ترین بیت اول) برای کتاب‌های قابل امانت
+روشن است؛ بیت‌مپ با zlib فشرده و base64 می‌شود. نسخه بیت‌مپ شناسه آخرین رویداد
+لاگ امانت (CirculationEvent) است که در آن لحاظ شده است.
+
+بیت‌مپ در کش نگه داشته می‌شود و با رویدادهای امانت، بازگشت و ویرایش کتاب پس از
+نسخه‌اش به‌روز می‌شود: فقط کتاب‌های همان رویدادها دوباره خوانده می‌شوند. چون
+وضعیت فعلی خوانده می‌شود، اعمال دوباره یک رویداد بی‌اثر است.
+"""
+import base64
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from . import events
+from .models import Book, CirculationEvent
+
+SNAPSHOT_KEY = 'availability:snapshot'
+AVAILABLE = Q(available__gt=0, status='available')
+
+
+def _set(bits, book_id, value):
+    index = book_id >> 3
+    if index >= len(bits):
+        bits.extend(bytes(index + 1 - len(bits)))
+    if value:
+        bits[index] |= 1 << (book_id & 7)
+    else:
+        bits[index] &= ~(1 << (book_id & 7)) & 0xFF
+
+
+def encode(bits):
+    return base64.b64encode(zlib.compress(bytes(bits), 9)).decode('ascii')
+
+
+def build():
+    """ساخت کامل بیت‌مپ با یک کوئری روی شناسه‌ها"""
+    upper = timezone.now() - timedelta(seconds=settings.EVENT_SAFETY_LAG)
+    # نسخه پیش از خواندن وضعیت گرفته می‌شود؛ رویدادهای بعدی دوباره (و بی‌ضرر) اعمال می‌شوند
+    version = (
+        CirculationEvent.objects.filter(created_at__lte=upper)
+        .order_by('-id').values_list('id', flat=True).first()
+    ) or 0
+    bits = bytearray()
+    for book_id in Book.objects.filter(AVAILABLE).values_list('pk', flat=True).iterator(chunk_size=10000):
+        _set(bits, book_id, True)
+    return {'version': version, 'bits': bytes(bits)}
+
+
+def changes(since):
+    """
+    (نسخه، در دسترس‌ها، نادسترس‌ها) برای کتاب‌هایی که پس از since تغییر کرده‌اند
+
+    اگر رویدادها بیشتر از AVAILABILITY_DIFF_LIMIT باشند None برمی‌گرداند و
+    کلاینت باید بیت‌مپ کامل را بگیرد.
+    """
+    limit = settings.AVAILABILITY_DIFF_LIMIT
+    pending = list(events.pending(since, limit + 1))
+    if len(pending) > limit:
+        return None
+    if not pending:
+        return since, [], []
+    touched = {event.book_id for event in pending if event.book_id is not None}
+    available = set(Book.objects.filter(AVAILABLE, pk__in=touched).values_list('pk', flat=True)) if touched else set()
+    return pending[-1].id, sorted(available), sorted(touched - available)
+
+
+def snapshot():
+    """بیت‌مپ فعلی از کش، به‌روزشده با رویدادهای پس از نسخه‌اش"""
+    snap = cache.get(SNAPSHOT_KEY)
+    if snap is not None:
+        diff = changes(snap['version'])
+        if diff is None:
+            snap = None
+        elif diff[0] == snap['version']:
+            return snap
+        else:
+            version, available, unavailable = diff
+            bits = bytearray(snap['bits'])
+            for book_id in available:
+                _set(bits, book_id, True)
+            for book_id in unavailable:
+                _set(bits, book_id, False)
+            snap = {'version': version, 'bits': bytes(bits)}
+    if snap is None:
+        snap = build()
+    # نسخه فشرده هم کش می‌شود تا هر درخواست دوباره فشرده‌سازی نکند
+    snap['encoded'] = encode(snap['bits'])
+    cache.set(SNAPSHOT_KEY, snap, None)
+    return snap
@@ -0,0 +1,41 @@
+"""
+نسخه کاتالوگ برای کلید قطعه‌های کش‌شده صفحه‌های HTML
+
+هر تغییر کتاب (حتی UPDATE های موجودی که سیگنال ندارند) updated_at را جلو می‌برد،
+پس بیشینه updated_at کتاب‌ها و ژانرها به‌همراه شمارنده حذف‌ها نسخه کل کاتالوگ است.
+خود نسخه CATALOG_VERSION_TTL ثانیه کش می‌شود تا مرور ناشناس تقریباً کوئری نزند.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import Book, Genre
+
+VERSION_KEY = 'catalog:version'
+DELETES_KEY = 'catalog:deletes'
+
+
+def _compute():
+    books = Book.objects.aggregate(last=Max('updated_at'))['last']
+    genres = Genre.objects.aggregate(last=Max('updated_at'))['last']
+    stamps = [stamp.timestamp() for stamp in (books, genres) if stamp]
+    return f"{max(stamps, default=0)}:{cache.get(DELETES_KEY, 0)}"
+
+
+def version():
+    return cache.get_or_set(VERSION_KEY, _compute, settings.CATALOG_VERSION_TTL)
+
+
+def changed(sender, instance, raw=False, **kwargs):
+    """گیرنده post_save کتاب و ژانر؛ تغییرات همین پروسه بلافاصله دیده شوند"""
+    if not raw:
+        cache.delete(VERSION_KEY)
+
+
+def deleted(sender, instance, **kwargs):
+    """گیرنده post_delete کتاب و ژانر؛ حذف بیشینه updated_at را جلو نمی‌برد"""
+    try:
+        cache.incr(DELETES_KEY)
+    except ValueError:
+        cache.add(DELETES_KEY, 1, None)
+    cache.delete(VERSION_KEY)
@@ -0,0 +1,129 @@
+"""
+امانت و بازگشت در میز امانت
+
+مسیر بارکد نسخه، کتاب و عضو را هر کدام با یک جستجوی ایندکس‌دار پیدا می‌کند
+(بارکد و شماره عضویت یکتا هستند) و به annotate لیست کتاب‌ها نیازی ندارد.
+برای کتاب‌هایی که نسخه ثبت‌شده ندارند امانت مثل قبل روی موجودی کل کتاب است.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from library import metrics
+
+from . import events, fines, inventory, policies, trending
+from .autocomplete import index as autocomplete_index
+from .models import BorrowRecord, Copy
+
+
+class CirculationError(Exception):
+    pass
+
+
+class LimitReached(CirculationError):
+    pass
+
+
+class Unavailable(CirculationError):
+    pass
+
+
+class FinesOutstanding(CirculationError):
+    pass
+
+
+class AlreadyReturned(CirculationError):
+    pass
+
+
+def _claim_copy(book_id, copy=None):
+    """
+    علامت زدن یک نسخه به عنوان امانت‌داده‌شده با UPDATE شرطی
+
+    بدون copy اولین نسخه آزاد کتاب انتخاب می‌شود؛ اگر کتاب نسخه ثبت‌شده نداشته
+    باشد None برمی‌گرداند.
+    """
+    if copy is None:
+        # skip_locked تا دو میز همزمان یک نسخه را انتخاب نکنند
+        copy = (
+            Copy.objects.select_for_update(skip_locked=True)
+            .filter(book_id=book_id, status='available')
+            .only('pk', 'barcode', 'book_id')
+            .first()
+        )
+        if copy is None:
+            if Copy.objects.filter(book_id=book_id).exists():
+                raise Unavailable('Book not available')
+            return None
+    claimed = Copy.objects.filter(pk=copy.pk, status='available').update(
+        status='borrowed', updated_at=timezone.now()
+    )
+    if not claimed:
+        raise Unavailable('Copy not available')
+    return copy
+
+
+def checkout(member, book, copy=None):
+    """ثبت امانت برای عضو؛ در صورت رسیدن به سقف یا نبود نسخه خطا می‌دهد"""
+    book_id = book.pk
+    # مانده جریمه یک ستون خود عضو است و کوئری اضافه ندارد
+    if fines.outstanding(member):
+        raise FinesOutstanding('Member has outstanding fines')
+    open_loans = BorrowRecord.objects.filter(member=member, returned=False).count()
+    if open_loans >= policies.max_loans(member, book.genre_id):
+        raise LimitReached('Member has reached borrow limit')
+
+    with transaction.atomic():
+        copy = _claim_copy(book_id, copy)
+        # کاهش شرطی موجودی؛ در امانت همزمان آخرین نسخه فقط یکی موفق می‌شود
+        if not inventory.checkout(book_id):
+            if copy is None:
+                raise Unavailable('Book not available')
+            # نسخه آزاد بوده ولی شمارنده کتاب عقب مانده است
+            inventory.recount_copies([book_id])
+            trending.bump([book_id])
+
+        # موعد بازگشت از سیاست امانت و بدون کوئری اضافه تعیین می‌شود
+        record = BorrowRecord.objects.create(
+            book=book,
+            member=member,
+            copy=copy,
+            borrow_date=timezone.now().date(),
+        )
+        data = {'barcode': copy.barcode} if copy else {}
+        events.record('checkout', book_id=book_id, member_id=member.pk, object_id=record.pk, **data)
+
+    metrics.CIRCULATION.inc(event='checkout')
+    autocomplete_index.bump(book_id)
+    return record
+
+
+def checkin(record):
+    """
+    ثبت بازگشت امانت و آزاد کردن نسخه؛ جریمه هنگام ذخیره محاسبه و در دفتر جریمه ثبت می‌شود
+
+    بازگشت با UPDATE شرطی روی returned=False گرفته می‌شود تا دو بازگشت هم‌زمان یک
+    امانت موجودی و جریمه را دو بار تغییر ندهند.
+    """
+    with transaction.atomic():
+        today = timezone.now().date()
+        if not BorrowRecord.objects.filter(pk=record.pk, returned=False).update(returned=True, return_date=today):
+            raise AlreadyReturned('Book already returned')
+        record.returned = True
+        record.return_date = today
+        record.save()
+
+        if record.copy_id:
+            Copy.objects.filter(pk=record.copy_id, status='borrowed').update(
+                status='available', updated_at=timezone.now()
+            )
+        inventory.checkin(record.book_id)
+        events.record(
+            'return', book_id=record.book_id, member_id=record.member_id, object_id=record.pk,
+            fine_amount=str(record.fine_amount),
+        )
+
+    metrics.CIRCULATION.inc(event='return')
+    if record.fine_amount:
+        metrics.CIRCULATION.inc(event='fine')
+        metrics.FINES_AMOUNT.inc(float(record.fine_amount))
+    return record
@@ -0,0 +1,175 @@
+"""
+همگام‌سازی اعضا با خروجی دایرکتوری دانشگاه
+
+فایل CSV ردیف‌به‌ردیف خوانده می‌شود و در دسته‌های DIRECTORY_SYNC_CHUNK_SIZE تایی
+با اعضای موجود (بر اساس student_id و در نبود آن member_id) مقایسه می‌شود. برای هر
+دسته یک SELECT، یک bulk_create و یک bulk_update اجرا می‌شود. در پایان اعضای
+دایرکتوری که در فایل نبوده‌اند با UPDATE های دسته‌ای غیرفعال می‌شوند.
+
+ستون‌های فایل: student_id, first_name, last_name, email, member_type, membership_end
+"""
+import csv
+from datetime import date
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Member
+
+COLUMNS = ['student_id', 'first_name', 'last_name', 'email', 'member_type', 'membership_end']
+# نوع‌هایی که از دایرکتوری می‌آیند؛ میهمان‌ها دستی ثبت می‌شوند و غیرفعال نمی‌شوند
+DIRECTORY_TYPES = ['student', 'professor', 'staff']
+UPDATE_FIELDS = ['student_id', 'member_type', 'membership_end', 'active']
+# شماره عضویت اعضای جدید همان شماره دانشجویی است و باید در هر دو ستون جا شود
+REQUIRED_FIELDS = ['member_id', 'student_id', 'first_name', 'last_name', 'email']
+
+
+class DirectoryError(Exception):
+    pass
+
+
+def read_directory(stream):
+    """ردیف‌های فایل را به صورت (شماره خط، dict) و بدون بارگذاری کل فایل برمی‌گرداند"""
+    reader = csv.DictReader(stream)
+    missing = [column for column in COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise DirectoryError(f"Missing columns: {', '.join(missing)}")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _parse(row, student_id):
+    member_type = (row['member_type'] or '').strip().lower()
+    if member_type not in DIRECTORY_TYPES:
+        raise ValueError(f'Unknown member type {member_type!r}')
+    try:
+        membership_end = date.fromisoformat((row['membership_end'] or '').strip())
+    except ValueError:
+        raise ValueError('membership_end must be YYYY-MM-DD')
+    data = {
+        'student_id': student_id,
+        'first_name': (row['first_name'] or '').strip(),
+        'last_name': (row['last_name'] or '').strip(),
+        'email': (row['email'] or '').strip(),
+        'member_type': member_type,
+        'membership_end': membership_end,
+        'active': True,
+    }
+    # ردیف نامعتبر باید همین‌جا رد شود؛ خطای پایگاه داده در bulk_create کل دسته را می‌اندازد
+    for field in REQUIRED_FIELDS:
+        value = data.get(field, student_id)
+        max_length = Member._meta.get_field(field).max_length
+        if not value:
+            raise ValueError(f'{field} is required')
+        if len(value) > max_length:
+            raise ValueError(f'{field} must be at most {max_length} characters')
+    try:
+        validate_email(data['email'])
+    except ValidationError:
+        raise ValueError('Invalid email')
+    return data
+
+
+def _apply_chunk(chunk, seen, summary, dry_run):
+    rows = {}
+    for line, row in chunk:
+        summary['rows'] += 1
+        student_id = (row['student_id'] or '').strip()
+        if not student_id:
+            summary['errors'].append({'line': line, 'student_id': '', 'error': 'student_id is required'})
+            continue
+        if student_id in seen:
+            summary['errors'].append({'line': line, 'student_id': student_id, 'error': 'Duplicate student_id'})
+            continue
+        # ردیف نامعتبر هم دیده‌شده حساب می‌شود تا عضو موجودش غیرفعال نشود
+        seen.add(student_id)
+        try:
+            rows[student_id] = (line, _parse(row, student_id))
+        except ValueError as e:
+            summary['errors'].append({'line': line, 'student_id': student_id, 'error': str(e)})
+
+    by_student, by_member_id = {}, {}
+    existing = (
+        Member.objects.filter(Q(student_id__in=rows) | Q(member_id__in=rows))
+        .only('pk', 'member_id', *UPDATE_FIELDS)
+    )
+    for member in existing:
+        if member.student_id:
+            by_student[member.student_id] = member
+        by_member_id[member.member_id] = member
+
+    to_create, to_update = [], []
+    for student_id, (line, data) in rows.items():
+        member = by_student.get(student_id) or by_member_id.get(student_id)
+        if member is None:
+            # شماره عضویت اعضای جدید همان شماره دانشجویی/پرسنلی است
+            to_create.append(Member(member_id=student_id, **data))
+            continue
+        if member.student_id and member.student_id != student_id:
+            summary['errors'].append({
+                'line': line, 'student_id': student_id, 'error': 'Member ID belongs to another student',
+            })
+            continue
+        changed = False
+        for field in UPDATE_FIELDS:
+            if getattr(member, field) != data[field]:
+                setattr(member, field, data[field])
+                changed = True
+        if changed:
+            to_update.append(member)
+        else:
+            summary['unchanged'] += 1
+
+    if not dry_run:
+        Member.objects.bulk_create(to_create, batch_size=1000)
+        Member.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=1000)
+    summary['created'] += len(to_create)
+    summary['updated'] += len(to_update)
+
+
+def _deactivate_missing(seen, chunk_size, dry_run):
+    """غیرفعال کردن اعضای دایرکتوری که در فایل نبوده‌اند، در بازه‌های شناسه"""
+    deactivated = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Member.objects
+            .filter(pk__gt=last_pk, active=True, member_type__in=DIRECTORY_TYPES, student_id__isnull=False)
+            .order_by('pk')
+            .values_list('pk', 'student_id')[:chunk_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        missing = [pk for pk, student_id in batch if student_id not in seen]
+        if missing and not dry_run:
+            Member.objects.filter(pk__in=missing).update(active=False)
+        deactivated += len(missing)
+    return deactivated
+
+
+def sync_directory(stream, chunk_size=None, deactivate_missing=True, dry_run=False):
+    """
+    همگام‌سازی اعضا با فایل دایرکتوری (شیء متنی CSV)
+
+    خلاصه‌ای شامل rows, created, updated, unchanged, deactivated و errors برمی‌گرداند؛
+    با dry_run=True فقط تغییرات شمرده می‌شوند.
+    """
+    chunk_size = chunk_size or settings.DIRECTORY_SYNC_CHUNK_SIZE
+    summary = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'deactivated': 0, 'errors': []}
+    seen = set()
+    rows = read_directory(stream)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        with transaction.atomic():
+            _apply_chunk(chunk, seen, summary, dry_run)
+    # فایل خالی یا ناقص نباید همه اعضا را غیرفعال کند
+    if deactivate_missing and seen:
+        summary['deactivated'] = _deactivate_missing(seen, chunk_size, dry_run)
+    return summary
@@ -0,0 +1,103 @@
+"""
+لاگ رویدادهای امانت و کاتالوگ با موقعیت جداگانه برای هر مصرف‌کننده
+
+رویدادها در همان تراکنش تغییر اصلی ثبت می‌شوند، پس یا هر دو commit می‌شوند یا
+هیچ‌کدام. هر مصرف‌کننده (گزارش‌ها، پیشنهادها، اطلاعیه‌ها، ایندکس جستجو و ...)
+با process فقط رویدادهای بعد از آخرین موقعیت خودش را به‌صورت دسته‌ای می‌خواند.
+
+شناسه‌ها به ترتیب تخصیص افزایش می‌یابند نه به ترتیب commit؛ برای این‌که رویداد
+یک تراکنش کندتر از قلم نیفتد، رویدادهای EVENT_SAFETY_LAG ثانیه اخیر هنوز خوانده نمی‌شوند.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CirculationEvent, ConsumerOffset
+
+
+def record(event_type, book_id=None, member_id=None, object_id=None, **data):
+    """ثبت یک رویداد؛ باید داخل تراکنش تغییر اصلی صدا زده شود"""
+    return CirculationEvent.objects.create(
+        event_type=event_type, book_id=book_id, member_id=member_id, object_id=object_id, data=data
+    )
+
+
+def record_many(event_type, rows):
+    """ثبت دسته‌ای رویدادها برای تغییرات گروهی با UPDATE؛ rows لیست dict فیلدهاست"""
+    return CirculationEvent.objects.bulk_create(
+        [CirculationEvent(event_type=event_type, **row) for row in rows], batch_size=1000
+    )
+
+
+def pending(after, limit=None):
+    """رویدادهای بعد از شناسه after به ترتیب شناسه"""
+    upper = timezone.now() - timedelta(seconds=settings.EVENT_SAFETY_LAG)
+    return (
+        CirculationEvent.objects
+        .filter(id__gt=after, created_at__lte=upper)
+        .order_by('id')[:limit or settings.EVENT_BATCH_SIZE]
+    )
+
+
+def position(consumer):
+    offset = ConsumerOffset.objects.filter(name=consumer).first()
+    return offset.position if offset else 0
+
+
+def seek(consumer, to=None):
+    """تنظیم موقعیت مصرف‌کننده (پیش‌فرض: آخرین رویداد، یعنی نادیده گرفتن گذشته)"""
+    if to is None:
+        last = CirculationEvent.objects.order_by('-id').values_list('id', flat=True).first()
+        to = last or 0
+    ConsumerOffset.objects.update_or_create(name=consumer, defaults={'position': to})
+
+
+def process(consumer, handler, batch_size=None, event_types=None, max_batches=None):
+    """
+    پردازش رویدادهای جدید با handler(events) به‌صورت دسته‌ای
+
+    هر دسته در یک تراکنش اجرا می‌شود: ردیف موقعیت قفل می‌شود تا دو اجرای همزمان
+    یک دسته را دوبار پردازش نکنند و موقعیت فقط پس از موفقیت handler جلو می‌رود.
+    تعداد رویدادهای پردازش‌شده را برمی‌گرداند.
+    """
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            offset, _ = ConsumerOffset.objects.select_for_update().get_or_create(name=consumer)
+            # رویدادهای فیلترنشده هم موقعیت را جلو می‌برند تا دوباره اسکن نشوند
+            events = list(pending(offset.position, batch_size))
+            if not events:
+                break
+            wanted = [event for event in events if not event_types or event.event_type in event_types]
+            if wanted:
+                handler(wanted)
+            offset.position = events[-1].id
+            offset.save(update_fields=['position', 'updated_at'])
+        processed += len(wanted)
+        batches += 1
+    return processed
+
+
+def book_saved(sender, instance, created, raw=False, **kwargs):
+    """گیرنده post_save کتاب"""
+    if raw:
+        return
+    record('book_created' if created else 'book_updated', book_id=instance.pk)
+
+
+def book_deleted(sender, instance, **kwargs):
+    """گیرنده post_delete کتاب"""
+    record('book_deleted', book_id=instance.pk)
+
+
+def reservation_saved(sender, instance, created, raw=False, **kwargs):
+    """گیرنده post_save رزرو"""
+    if raw:
+        return
+    record(
+        'reservation', book_id=instance.book_id, member_id=instance.member_id,
+        object_id=instance.pk, status=instance.status,
+    )
@@ -0,0 +1,115 @@
+"""
+بسط منابع API با ?expand=genre.parent,borrow_history,reservations
+
+هر سریالایزر بسط‌های مجازش را در expansions (مسیر -> Expansion) اعلام می‌کند و
+viewset با ExpandMixin از مسیرهای درخواستی یک برنامه بارگذاری می‌سازد: رابطه‌های
+تکی با select_related در همان کوئری والد و رابطه‌های چندتایی با یک Prefetch
+(حداکثر EXPAND_MAX_ITEMS سطر برای هر شیء). پس هر ترکیب بسط‌ها حداکثر یک کوئری
+به ازای هر بسط چندتایی اضافه می‌کند، مستقل از تعداد نتایج.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework.exceptions import ParseError
+
+
+class Expansion:
+    """
+    یک بسط: render(obj) خروجی هر شیء مرتبط است
+
+    select: نام رابطه تکی (ForeignKey) روی مدل والد
+    prefetch: (نام رابطه چندتایی، تابع queryset پایه)
+    annotate: تابعی که annotation های لازم را برمی‌گرداند (فقط بسط‌های سطح اول)
+    """
+
+    def __init__(self, render, select=None, prefetch=None, annotate=None):
+        self.render = render
+        self.select = select
+        self.prefetch = prefetch
+        self.annotate = annotate
+
+    def value(self, obj, key):
+        if self.prefetch:
+            return getattr(obj, f'expanded_{key}')
+        if self.select:
+            return getattr(obj, self.select)
+        return obj
+
+
+def parse(value, registry):
+    """درخت بسط‌ها از پارامتر expand؛ والد هر مسیر نقطه‌دار هم بسط داده می‌شود"""
+    tree = {}
+    for path in dict.fromkeys(part.strip() for part in (value or '').split(',') if part.strip()):
+        if path.count('.') >= settings.EXPAND_MAX_DEPTH:
+            raise ParseError(f'Expansion "{path}" is deeper than {settings.EXPAND_MAX_DEPTH} levels')
+        if path not in registry:
+            raise ParseError(f'Unknown expansion "{path}"')
+        node = tree
+        parts = path.split('.')
+        for depth, key in enumerate(parts, 1):
+            node = node.setdefault(key, (registry['.'.join(parts[:depth])], {}))[1]
+    return tree
+
+
+def apply(queryset, tree, prefix=''):
+    """افزودن select_related/Prefetch/annotate درخت بسط‌ها به queryset"""
+    for key, (expansion, children) in tree.items():
+        if expansion.prefetch:
+            lookup, base = expansion.prefetch
+            inner = apply(base(), children)[:settings.EXPAND_MAX_ITEMS]
+            queryset = queryset.prefetch_related(Prefetch(prefix + lookup, inner, to_attr=f'expanded_{key}'))
+            continue
+        if expansion.annotate and not prefix:
+            queryset = queryset.annotate(**expansion.annotate())
+        if expansion.select:
+            queryset = queryset.select_related(prefix + expansion.select)
+            queryset = apply(queryset, children, f'{prefix}{expansion.select}__')
+        else:
+            queryset = apply(queryset, children, prefix)
+    return queryset
+
+
+def render(obj, data, tree):
+    for key, (expansion, children) in tree.items():
+        value = expansion.value(obj, key)
+        if expansion.prefetch:
+            data[key] = [expansion.render(item) for item in value]
+            for item, item_data in zip(value, data[key]):
+                render(item, item_data, children)
+        elif value is None:
+            data[key] = None
+        else:
+            data[key] = expansion.render(value)
+            render(value, data[key], children)
+
+
+class ExpandableSerializerMixin:
+    """افزودن بسط‌های درخواستی (context['expand']) به خروجی سریالایزر"""
+    expansions = {}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        tree = self.context.get('expand')
+        if tree:
+            render(instance, data, tree)
+        return data
+
+
+class ExpandMixin:
+    """
+    پشتیبانی ?expand= در viewset
+
+    get_queryset باید خروجی نهایی را از expand_queryset بگذراند.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        registry = getattr(self.get_serializer_class(), 'expansions', {})
+        self.expand_tree = parse(request.query_params.get('expand'), registry)
+
+    def expand_queryset(self, queryset):
+        return apply(queryset, getattr(self, 'expand_tree', None) or {})
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = getattr(self, 'expand_tree', None)
+        return context
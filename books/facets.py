@@ -0,0 +1,139 @@
+"""
+جستجوی چندوجهی کتاب‌ها
+
+شمارش هر وجه (ژانر، دهه انتشار، وضعیت و وضعیت فیزیکی) روی همان نتایج فیلترشده
+و با یک کوئری GROUP BY روی ترکیب وجه‌ها انجام می‌شود؛ جمع هر وجه در پایتون از
+همین سطرها به دست می‌آید. تعداد ترکیب‌ها به تعداد ژانرها محدود است نه کتاب‌ها.
+
+نتیجه با کلید نسخه کاتالوگ و پارامترهای نرمال‌شده FACETS_CACHE_TIMEOUT ثانیه در کش می‌ماند.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, IntegerField, Q
+
+from . import catalog
+from .models import Book
+
+CACHE_PREFIX = 'facets'
+YEAR_BUCKET = 10
+
+
+def _year(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize(params):
+    """پارامترهای جستجو به شکل یکتا؛ مقدارهای خالی یا نامعتبر حذف می‌شوند"""
+    normalized = {
+        'q': ' '.join((params.get('q') or '').split()).lower(),
+        # پارامتر جستجوی API (SearchFilter)
+        'search': ' '.join((params.get('search') or '').split()).lower(),
+        'genre': ' '.join((params.get('genre') or '').split()).lower(),
+        'author': ' '.join((params.get('author') or '').split()).lower(),
+        'min_year': _year(params.get('min_year')),
+        'max_year': _year(params.get('max_year')),
+        'in_stock': params.get('in_stock') in ('true', 'True', '1', True),
+    }
+    return {key: value for key, value in normalized.items() if value}
+
+
+def search(params):
+    """queryset کتاب‌ها برای پارامترهای نرمال‌شده"""
+    books = Book.objects.all()
+    if 'q' in params:
+        query = params['q']
+        books = books.filter(
+            Q(title__icontains=query) |
+            Q(authors__icontains=query) |
+            Q(publisher__icontains=query) |
+            Q(description__icontains=query)
+        )
+    if 'genre' in params:
+        books = books.filter(genre__name__icontains=params['genre'])
+    if 'author' in params:
+        books = books.filter(authors__icontains=params['author'])
+    if 'min_year' in params:
+        books = books.filter(publication_year__gte=params['min_year'])
+    if 'max_year' in params:
+        books = books.filter(publication_year__lte=params['max_year'])
+    if params.get('in_stock'):
+        books = books.filter(available__gt=0)
+    return books
+
+
+def facet_counts(queryset):
+    """شمارش همه وجه‌ها برای queryset با یک کوئری"""
+    rows = (
+        queryset.order_by()
+        .values(
+            'genre_id', 'genre__name', 'status', 'physical_condition',
+            # تقسیم صحیح؛ سال نامعلوم NULL می‌ماند
+            decade=ExpressionWrapper(
+                F('publication_year') / YEAR_BUCKET * YEAR_BUCKET, output_field=IntegerField()
+            ),
+            in_stock=ExpressionWrapper(Q(available__gt=0), output_field=BooleanField()),
+        )
+        .annotate(count=Count('pk'))
+    )
+
+    total = available = 0
+    genres, years, statuses, conditions = {}, {}, {}, {}
+    for row in rows:
+        count = row['count']
+        total += count
+        if row['in_stock']:
+            available += count
+        if row['genre_id'] is not None:
+            genre = genres.setdefault(row['genre_id'], {'id': row['genre_id'], 'name': row['genre__name']})
+            genre['count'] = genre.get('count', 0) + count
+        years[row['decade']] = years.get(row['decade'], 0) + count
+        statuses[row['status']] = statuses.get(row['status'], 0) + count
+        conditions[row['physical_condition']] = conditions.get(row['physical_condition'], 0) + count
+
+    status_labels = dict(Book.STATUS_CHOICES)
+    condition_labels = dict(Book.PHYSICAL_CONDITION_CHOICES)
+    return {
+        'total': total,
+        'available': available,
+        'genres': sorted(genres.values(), key=lambda genre: (-genre['count'], genre['name'])),
+        'years': [
+            {'from': decade, 'to': decade + YEAR_BUCKET - 1, 'count': years[decade]}
+            for decade in sorted(decade for decade in years if decade is not None)
+        ],
+        'status': [
+            {'value': value, 'label': label, 'count': statuses[value]}
+            for value, label in status_labels.items() if value in statuses
+        ],
+        'condition': [
+            {'value': value, 'label': label, 'count': conditions[value]}
+            for value, label in condition_labels.items() if value in conditions
+        ],
+    }
+
+
+def digest(params):
+    """چکیده پارامترهای نرمال‌شده برای کلید کش"""
+    return hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def cached_facets(params, queryset=None, scope='search'):
+    """
+    وجه‌های نتایج جستجو با کش بر اساس پارامترهای نرمال‌شده
+
+    بدون queryset نتایج از search(params) می‌آیند؛ فراخواننده‌ای که queryset خودش را
+    می‌دهد باید همه پارامترهای مؤثر بر آن را در params و scope جداگانه بدهد.
+    """
+    params = normalize(params)
+    # با تغییر کاتالوگ کلید عوض می‌شود و شمارش‌های کهنه دیگر خوانده نمی‌شوند
+    key = f'{CACHE_PREFIX}:{scope}:{catalog.version()}:{digest(params)}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = facet_counts(search(params) if queryset is None else queryset)
+        cache.set(key, facets, settings.FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,150 @@
+"""
+دفتر جریمه اعضا
+
+هر جریمه، پرداخت یا بخشودگی یک سطر FineEntry است و Member.fine_balance در همان
+تراکنش با UPDATE اتمیک (F) جلو یا عقب می‌رود؛ پس مانده بدهی بدون جمع زدن تاریخچه
+با خواندن یک ستون معلوم است. پرداخت و بخشودگی با UPDATE شرطی بیشتر از مانده
+ثبت نمی‌شوند. reconcile_fines مانده‌ها را به‌صورت دسته‌ای با جمع دفتر مقایسه می‌کند.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import FineEntry, Member
+
+CREDITS = ('payment', 'waiver')
+# سطرهایی که به یک امانت مربوط‌اند؛ پرداخت‌ها به مانده کل عضو خورده می‌شوند
+RECORD_KINDS = ('charge', 'waiver')
+CENTS = Decimal('0.01')
+
+
+class FineError(Exception):
+    pass
+
+
+def _signed_amount():
+    return Case(When(kind__in=CREDITS, then=-F('amount')), default=F('amount'))
+
+
+def outstanding(member):
+    """آیا عضو بیش از FINE_BLOCK_THRESHOLD بدهی دارد (بدون کوئری)"""
+    return member.fine_balance > settings.FINE_BLOCK_THRESHOLD
+
+
+def post(member, kind, amount, record=None, note='', user=None):
+    """ثبت یک سطر دفتر و به‌روزرسانی مانده عضو در یک تراکنش"""
+    try:
+        amount = Decimal(str(amount))
+    except InvalidOperation:
+        raise FineError('Invalid amount')
+    if not amount.is_finite() or amount <= 0:
+        raise FineError('Amount must be positive')
+    amount = amount.quantize(CENTS)
+    with transaction.atomic():
+        members = Member.objects.filter(pk=member.pk)
+        if kind in CREDITS:
+            updated = members.filter(fine_balance__gte=amount).update(fine_balance=F('fine_balance') - amount)
+            if not updated:
+                raise FineError('Amount exceeds outstanding balance')
+        else:
+            members.update(fine_balance=F('fine_balance') + amount)
+        entry = FineEntry.objects.create(
+            member_id=member.pk, record_id=record.pk if record else None, kind=kind, amount=amount, note=note, created_by=user
+        )
+    member.refresh_from_db(fields=['fine_balance'])
+    return entry
+
+
+def settle(pairs, note='', user=None):
+    """
+    ثبت اختلاف fine_amount امانت‌ها با جمع سطرهای دفتر همان امانت
+
+    pairs زوج‌های (امانت، جریمه ذخیره‌شده قبلی) است و اختلاف به صورت جریمه یا
+    بخشودگی با post_many ثبت می‌شود؛ پس باید داخل تراکنش صدا زده شود. بخشودگی
+    بیشتر از مانده، مانده منفی (بستانکاری عضو) می‌سازد. جریمه‌هایی که پیش از دفتر
+    جریمه ثبت شده‌اند (جریمه قبلی دارند ولی سطری در دفتر ندارند) وارد دفتر نمی‌شوند.
+    """
+    records = {record.pk: (record, previous) for record, previous in pairs}
+    if not records:
+        return []
+    charged = dict(
+        FineEntry.objects.filter(record_id__in=records, kind__in=RECORD_KINDS).order_by()
+        .values('record_id').annotate(total=Sum(_signed_amount()))
+        .values_list('record_id', 'total')
+    )
+    entries = []
+    for pk, (record, previous) in records.items():
+        if pk not in charged and previous:
+            continue
+        delta = Decimal(record.fine_amount or 0) - charged.get(pk, 0)
+        if delta:
+            entries.append(FineEntry(
+                member_id=record.member_id, record_id=pk, kind='charge' if delta > 0 else 'waiver',
+                amount=abs(delta), note=note, created_by=user,
+            ))
+    return post_many(entries)
+
+
+def post_many(entries):
+    """
+    ثبت دسته‌ای سطرها (برای کارهای گروهی ادمین و محاسبه دوباره جریمه‌ها)
+
+    مانده همه اعضای درگیر با یک UPDATE و CASE به‌روز می‌شود؛ باید داخل تراکنش
+    صدا زده شود. این مسیر سقف مانده را بررسی نمی‌کند.
+    """
+    deltas = {}
+    for entry in entries:
+        sign = -1 if entry.kind in CREDITS else 1
+        deltas[entry.member_id] = deltas.get(entry.member_id, 0) + sign * entry.amount
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if deltas:
+        Member.objects.filter(pk__in=deltas).update(fine_balance=F('fine_balance') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+    return FineEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def ledger_balance():
+    """جمع علامت‌دار دفتر هر عضو به صورت زیرکوئری"""
+    totals = (
+        FineEntry.objects.filter(member=OuterRef('pk')).order_by().values('member')
+        .annotate(total=Sum(_signed_amount()))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals), Value(Decimal(0)), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def reconcile_fines(fix=False, chunk_size=None):
+    """
+    مقایسه fine_balance اعضا با جمع دفتر جریمه
+
+    لیست انحراف‌ها را به صورت dict برمی‌گرداند؛ با fix=True هر بازه در تراکنش
+    کوتاه خودش با یک UPDATE از روی دفتر اصلاح می‌شود.
+    """
+    chunk_size = chunk_size or settings.FINE_RECONCILE_CHUNK_SIZE
+    mismatches = []
+    last_pk = 0
+    while True:
+        ids = list(
+            Member.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        last_pk = ids[-1]
+        with transaction.atomic():
+            found = list(
+                Member.objects.filter(pk__gte=ids[0], pk__lte=last_pk)
+                .annotate(expected_balance=ledger_balance())
+                .exclude(fine_balance=F('expected_balance'))
+                .values('pk', 'member_id', 'fine_balance', 'expected_balance')
+            )
+            if found and fix:
+                # مانده در خود UPDATE دوباره از دفتر محاسبه می‌شود تا سطرهای تازه هم لحاظ شوند
+                Member.objects.filter(pk__in=[row['pk'] for row in found]).update(fine_balance=ledger_balance())
+        mismatches.extend(found)
+    return mismatches
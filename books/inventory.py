@@ -0,0 +1,182 @@
+"""
+موجودی کتاب‌ها: تغییر اتمی هنگام امانت/بازگشت و تطبیق با سوابق امانت
+
+مقدار درست available همیشه quantity منهای امانت‌های باز است؛ برای کتاب‌هایی که
+نسخه (Copy) ثبت‌شده دارند quantity و available از وضعیت نسخه‌ها به دست می‌آیند.
+تغییرات روزمره با UPDATE شرطی انجام می‌شوند و reconcile_inventory هر انحرافی را
+با یک کوئری مجموعه‌ای در بازه‌های کوچک شناسه پیدا (و در صورت درخواست اصلاح) می‌کند.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, CharField, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from . import events, trending
+from .models import Book, BorrowRecord, Copy
+
+logger = logging.getLogger(__name__)
+
+
+def checkout(book_id):
+    """کم کردن یک نسخه؛ اگر نسخه آزادی نباشد False برمی‌گرداند"""
+    return bool(
+        Book.objects.filter(pk=book_id, available__gt=0).update(
+            available=F('available') - 1,
+            # امتیاز پرطرفداری در همین UPDATE جلو می‌رود (books.trending)
+            trending_score=F('trending_score') + trending.weight(),
+            updated_at=timezone.now(),
+            status=Case(
+                When(available=1, status='available', then=Value('borrowed')),
+                default=F('status'),
+            ),
+        )
+    )
+
+
+def checkin(book_id):
+    """برگرداندن یک نسخه؛ هیچ‌وقت از quantity بیشتر نمی‌شود"""
+    return bool(
+        Book.objects.filter(pk=book_id, available__lt=F('quantity')).update(
+            available=F('available') + 1,
+            updated_at=timezone.now(),
+            status=Case(When(status='borrowed', then=Value('available')), default=F('status')),
+        )
+    )
+
+
+def _count(queryset):
+    """تعداد ردیف‌های مرتبط با هر کتاب به صورت زیرکوئری"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(book=OuterRef('pk'))
+            .order_by().values('book')
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _open_loans():
+    return _count(BorrowRecord.objects.filter(returned=False))
+
+
+def _has_copies():
+    return Exists(Copy.objects.filter(book=OuterRef('pk')))
+
+
+def _copies_in_stock():
+    """نسخه‌های غیرمفقود؛ با ایندکس (book, status) شمرده می‌شوند"""
+    return _count(Copy.objects.exclude(status='lost'))
+
+
+def _copies_available():
+    return _count(Copy.objects.filter(status='available'))
+
+
+def expected_quantity():
+    return Case(
+        When(_has_copies(), then=_copies_in_stock()),
+        default=F('quantity'),
+        output_field=IntegerField(),
+    )
+
+
+def expected_available():
+    return Case(
+        When(_has_copies(), then=_copies_available()),
+        default=Greatest(F('quantity') - _open_loans(), 0),
+        output_field=IntegerField(),
+    )
+
+
+def status_for(available):
+    """همان قواعد Book.save برای وضعیت بر اساس عبارت موجودی"""
+    return Case(
+        When(physical_condition='damaged', then=Value('damaged')),
+        When(Exact(available, 0), then=Value('borrowed')),
+        When(status='borrowed', then=Value('available')),
+        default=F('status'),
+        output_field=CharField(),
+    )
+
+
+def recount_copies(book_ids):
+    """محاسبه دوباره quantity/available کتاب‌ها از وضعیت نسخه‌هایشان با یک UPDATE"""
+    return Book.objects.filter(pk__in=book_ids).update(
+        quantity=_copies_in_stock(),
+        available=_copies_available(),
+        status=status_for(_copies_available()),
+        updated_at=timezone.now(),
+    )
+
+
+def copy_changed(sender, instance, raw=False, **kwargs):
+    """گیرنده post_save/post_delete نسخه"""
+    if raw:
+        return
+    recount_copies([instance.book_id])
+    # UPDATE سیگنال کتاب را نمی‌فرستد؛ مصرف‌کننده‌ها (مثل بیت‌مپ دسترس‌پذیری) از این رویداد باخبر می‌شوند
+    events.record('book_updated', book_id=instance.book_id)
+
+
+def reconcile_inventory(fix=False, chunk_size=None):
+    """
+    مقایسه available/status با مقدار محاسبه‌شده از سوابق امانت
+
+    لیست انحراف‌ها را به صورت dict برمی‌گرداند؛ با fix=True هر بازه در تراکنش
+    کوتاه خودش با یک UPDATE اصلاح می‌شود تا قفل‌ها طولانی نشوند.
+    """
+    chunk_size = chunk_size or settings.INVENTORY_RECONCILE_CHUNK_SIZE
+    mismatches = []
+    last_pk = 0
+    while True:
+        ids = list(
+            Book.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        last_pk = ids[-1]
+        with transaction.atomic():
+            chunk = (
+                Book.objects.filter(pk__gte=ids[0], pk__lte=last_pk)
+                .annotate(
+                    expected_quantity=expected_quantity(),
+                    expected_available=expected_available(),
+                    open_loans=_open_loans(),
+                )
+                .annotate(expected_status=status_for(F('expected_available')))
+                .filter(
+                    ~Q(quantity=F('expected_quantity'))
+                    | ~Q(available=F('expected_available'))
+                    | ~Q(status=F('expected_status'))
+                )
+                .values('pk', 'title', 'quantity', 'expected_quantity', 'available',
+                        'expected_available', 'status', 'expected_status', 'open_loans')
+            )
+            found = list(chunk)
+            if found and fix:
+                # مقدار درست در خود UPDATE دوباره محاسبه می‌شود تا امانتی که
+                # بین خواندن و نوشتن ثبت شده هم لحاظ شود
+                Book.objects.filter(pk__in=[row['pk'] for row in found]).update(
+                    quantity=expected_quantity(),
+                    available=expected_available(),
+                    status=status_for(expected_available()),
+                    updated_at=timezone.now(),
+                )
+                events.record_many('book_updated', [
+                    {'book_id': row['pk'], 'data': {'reason': 'reconcile'}} for row in found
+                ])
+        for row in found:
+            if row['open_loans'] > row['quantity']:
+                logger.warning('book %s has %s open loans for %s copies',
+                               row['pk'], row['open_loans'], row['quantity'])
+        mismatches.extend(found)
+    return mismatches
@@ -0,0 +1,32 @@
+"""
+نرمال‌سازی شابک برای جستجوی دسته‌ای
+
+شابک‌های ۱۰ و ۱۳ رقمی معتبر (با یا بدون خط تیره و فاصله) به شابک ۱۳ رقمی بدون
+جداکننده تبدیل می‌شوند؛ کدهای دیگر (کد داخلی کتابخانه) فقط trim و بزرگ می‌شوند.
+"""
+import re
+
+SEPARATORS = re.compile(r'[\s\-‐‑–]')
+
+
+def _isbn10_valid(value):
+    if not re.fullmatch(r'\d{9}[\dX]', value):
+        return False
+    digits = [10 if char == 'X' else int(char) for char in value]
+    return sum((10 - index) * digit for index, digit in enumerate(digits)) % 11 == 0
+
+
+def _isbn13_check(digits):
+    total = sum(int(char) * (3 if index % 2 else 1) for index, char in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    value = (value or '').strip().upper()
+    compact = SEPARATORS.sub('', value)
+    if len(compact) == 10 and _isbn10_valid(compact):
+        body = '978' + compact[:9]
+        return body + _isbn13_check(body)
+    if re.fullmatch(r'\d{13}', compact) and _isbn13_check(compact) == compact[12]:
+        return compact
+    return value
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from books.archive import archive_borrow_records
+
+
+class Command(BaseCommand):
+    help = 'Move returned borrow records older than the configured age to the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.BORROW_ARCHIVE_AFTER_DAYS,
+            help='Archive records returned more than this many days ago'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.BORROW_ARCHIVE_BATCH_SIZE,
+            help='Number of records moved per transaction'
+        )
+
+    def handle(self, *args, **options):
+        moved = archive_borrow_records(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} borrow records'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books.recommendations import build_recommendations, refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Compute "borrowed together" book similarities from borrow records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only recompute books affected by loans since the last run'
+        )
+        parser.add_argument('--top-k', type=int, help='Similar books stored per book')
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            count = refresh_recommendations(options['top_k'])
+        else:
+            count = build_recommendations(options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Updated similarities for {count} books'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from books.trending import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending scores from borrow records (after changing TRENDING_* settings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        count = rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated trending scores for {count} books'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from books.fines import reconcile_fines
+
+
+class Command(BaseCommand):
+    help = 'Check Member.fine_balance against the fine ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Reset mismatched balances from the ledger')
+        parser.add_argument('--chunk-size', type=int, help='Members checked per transaction')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_fines(fix=options['fix'], chunk_size=options['chunk_size'])
+        for row in mismatches:
+            self.stdout.write(f"{row['member_id']}: balance {row['fine_balance']} -> {row['expected_balance']}")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Fine balances are consistent'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} members'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} members mismatched (run with --fix)'))
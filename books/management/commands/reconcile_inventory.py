@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from books.inventory import reconcile_inventory
+
+
+class Command(BaseCommand):
+    help = 'Check Book.available and status against open borrow records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Correct mismatched books')
+        parser.add_argument('--chunk-size', type=int, help='Books checked per transaction')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_inventory(fix=options['fix'], chunk_size=options['chunk_size'])
+        for row in mismatches:
+            self.stdout.write(
+                f"#{row['pk']} {row['title']}: quantity {row['quantity']} -> {row['expected_quantity']}, "
+                f"available {row['available']} -> {row['expected_available']}, "
+                f"status {row['status']} -> {row['expected_status']}"
+            )
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Inventory is consistent'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} books'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} books mismatched (run with --fix)'))
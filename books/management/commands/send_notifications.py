@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from books.notifications import CANDIDATES, send_notifications
+
+
+class Command(BaseCommand):
+    help = 'Send batched overdue and hold-ready notifications to members'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', action='append', choices=sorted(CANDIDATES),
+            help='Notification kind to send (repeatable; default: all)'
+        )
+        parser.add_argument('--limit', type=int, help='Maximum notifications to claim in this run')
+
+    def handle(self, *args, **options):
+        sent, failed = send_notifications(options['kind'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} emails failed and will be retried'))
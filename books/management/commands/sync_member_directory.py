@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.directory import DirectoryError, sync_directory
+
+
+class Command(BaseCommand):
+    help = 'Sync members with a university directory CSV export keyed on student_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory CSV file')
+        parser.add_argument('--chunk-size', type=int, help='Rows compared per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+        parser.add_argument(
+            '--no-deactivate', action='store_false', dest='deactivate',
+            help='Keep members that are missing from the file active'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                summary = sync_directory(
+                    stream, chunk_size=options['chunk_size'],
+                    deactivate_missing=options['deactivate'], dry_run=options['dry_run'],
+                )
+        except (OSError, DirectoryError) as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']} ({error['student_id']}): {error['error']}")
+        self.stdout.write(
+            f"{summary['rows']} rows: {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged, {summary['deactivated']} deactivated, "
+            f"{len(summary['errors'])} errors"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run, nothing was written'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Member directory synced'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_alter_book_created_at_alter_book_genre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True, verbose_name='اثر انگشت')),
+                ('normalized_sql', models.TextField(verbose_name='کوئری نرمال‌شده')),
+                ('sample_sql', models.TextField(verbose_name='نمونه کوئری')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='تعداد اجرا')),
+                ('total_time', models.FloatField(default=0, verbose_name='مجموع زمان (ms)')),
+                ('max_time', models.FloatField(default=0, verbose_name='بیشترین زمان (ms)')),
+                ('last_origin', models.CharField(blank=True, max_length=255, verbose_name='آخرین محل فراخوانی')),
+                ('plan', models.TextField(blank=True, verbose_name='پلن اجرا')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='اولین مشاهده')),
+                ('last_seen', models.DateTimeField(verbose_name='آخرین مشاهده')),
+            ],
+            options={
+                'verbose_name': 'کوئری کند',
+                'verbose_name_plural': 'کوئری‌های کند',
+                'ordering': ['-total_time'],
+            },
+        ),
+    ]
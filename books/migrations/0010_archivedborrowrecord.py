@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 23:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_slowquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrowRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='شناسه سابقه اصلی')),
+                ('borrow_date', models.DateField(verbose_name='تاریخ امانت')),
+                ('due_date', models.DateField(verbose_name='موعد بازگشت')),
+                ('return_date', models.DateField(blank=True, null=True, verbose_name='تاریخ بازگشت')),
+                ('returned', models.BooleanField(default=True, verbose_name='برگشت داده شده؟')),
+                ('renewal_count', models.PositiveIntegerField(default=0, verbose_name='تعداد تمدید')),
+                ('fine_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='مبلغ جریمه')),
+                ('notes', models.TextField(blank=True, verbose_name='یادداشت‌ها')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrow_records', to='books.book', verbose_name='کتاب')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrow_records', to='books.member', verbose_name='عضو')),
+            ],
+            options={
+                'verbose_name': 'سابقه امانت بایگانی‌شده',
+                'verbose_name_plural': 'سوابق امانت بایگانی‌شده',
+                'ordering': ['-borrow_date'],
+                'indexes': [models.Index(fields=['member', '-borrow_date'], name='books_archi_member__02f9f6_idx'), models.Index(fields=['book', '-borrow_date'], name='books_archi_book_id_e32c65_idx')],
+            },
+        ),
+    ]
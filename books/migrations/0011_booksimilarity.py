@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_archivedborrowrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='رتبه')),
+                ('score', models.FloatField(verbose_name='امتیاز شباهت')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='books.book', verbose_name='کتاب')),
+                ('similar_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book', verbose_name='کتاب مشابه')),
+            ],
+            options={
+                'verbose_name': 'کتاب مشابه',
+                'verbose_name_plural': 'کتاب‌های مشابه',
+                'ordering': ['book', 'rank'],
+                'unique_together': {('book', 'rank')},
+            },
+        ),
+    ]
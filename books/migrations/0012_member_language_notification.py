@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_booksimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='language',
+            field=models.CharField(blank=True, max_length=10, verbose_name='زبان اطلاع‌رسانی'),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('overdue', 'تأخیر در بازگشت'), ('hold_ready', 'آماده شدن رزرو')], max_length=20, verbose_name='نوع')),
+                ('object_id', models.BigIntegerField(verbose_name='شناسه مورد')),
+                ('reference_date', models.DateField(verbose_name='تاریخ مرجع')),
+                ('status', models.CharField(choices=[('pending', 'در صف'), ('sending', 'در حال ارسال'), ('sent', 'ارسال شده'), ('failed', 'ناموفق')], default='pending', max_length=10, verbose_name='وضعیت')),
+                ('claim_token', models.CharField(blank=True, max_length=32, verbose_name='شناسه اجرای ارسال')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='تعداد تلاش')),
+                ('error', models.TextField(blank=True, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ ارسال')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='books.member', verbose_name='عضو')),
+            ],
+            options={
+                'verbose_name': 'اطلاعیه',
+                'verbose_name_plural': 'اطلاعیه‌ها',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'kind'], name='books_notif_status_10c5c5_idx')],
+                'unique_together': {('kind', 'object_id', 'reference_date')},
+            },
+        ),
+    ]
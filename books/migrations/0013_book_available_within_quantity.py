@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:20
+
+from django.db import migrations, models
+
+
+def clamp_available(apps, schema_editor):
+    # ردیف‌هایی که پیش از این قید از quantity بیشتر شده‌اند؛ بقیه را reconcile_inventory اصلاح می‌کند
+    Book = apps.get_model('books', 'Book')
+    Book.objects.filter(available__gt=models.F('quantity')).update(available=models.F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_member_language_notification'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_available, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.CheckConstraint(condition=models.Q(('available__gte', 0), ('available__lte', models.F('quantity'))), name='book_available_within_quantity'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_book_available_within_quantity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['status'], name='books_book_status_ea5e47_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['active', 'member_type'], name='books_membe_active_50c8f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['returned', 'due_date'], name='books_borro_returne_0e3ce0_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='تاریخ به‌روزرسانی'),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(choices=[('book', 'کتاب'), ('genre', 'ژانر')], max_length=20, verbose_name='نوع')),
+                ('object_id', models.BigIntegerField(verbose_name='شناسه')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ حذف')),
+            ],
+            options={
+                'verbose_name': 'رکورد حذف‌شده',
+                'verbose_name_plural': 'رکوردهای حذف‌شده',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['deleted_at'], name='books_tombs_deleted_6b1151_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at', 'id'], name='books_book_updated_f55511_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['updated_at', 'id'], name='books_genre_updated_359f12_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_genre_updated_at_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('checkout', 'امانت'), ('return', 'بازگشت'), ('renewal', 'تمدید'), ('reservation', 'تغییر رزرو'), ('book_created', 'ایجاد کتاب'), ('book_updated', 'ویرایش کتاب'), ('book_deleted', 'حذف کتاب')], max_length=20, verbose_name='نوع رویداد')),
+                ('book_id', models.BigIntegerField(blank=True, null=True, verbose_name='شناسه کتاب')),
+                ('member_id', models.BigIntegerField(blank=True, null=True, verbose_name='شناسه عضو')),
+                ('object_id', models.BigIntegerField(blank=True, null=True, verbose_name='شناسه امانت/رزرو')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='داده‌ها')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان')),
+            ],
+            options={
+                'verbose_name': 'رویداد',
+                'verbose_name_plural': 'رویدادها',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsumerOffset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='مصرف‌کننده')),
+                ('position', models.BigIntegerField(default=0, verbose_name='آخرین شناسه رویداد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به‌روزرسانی')),
+            ],
+            options={
+                'verbose_name': 'موقعیت مصرف‌کننده',
+                'verbose_name_plural': 'موقعیت مصرف‌کننده‌ها',
+                'ordering': ['name'],
+            },
+        ),
+    ]
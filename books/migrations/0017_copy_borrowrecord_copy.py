@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-19 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_circulationevent_consumeroffset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Copy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=32, unique=True, verbose_name='بارکد')),
+                ('status', models.CharField(choices=[('available', 'موجود'), ('borrowed', 'امانت داده شده'), ('maintenance', 'در حال تعمیر'), ('lost', 'مفقود')], default='available', max_length=15, verbose_name='وضعیت')),
+                ('condition', models.CharField(choices=[('excellent', 'عالی'), ('good', 'خوب'), ('fair', 'متوسط'), ('poor', 'ضعیف'), ('damaged', 'آسیب دیده')], default='good', max_length=15, verbose_name='وضعیت فیزیکی')),
+                ('location', models.CharField(blank=True, max_length=100, verbose_name='محل نگهداری')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ثبت')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به‌روزرسانی')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='books.book', verbose_name='کتاب')),
+            ],
+            options={
+                'verbose_name': 'نسخه',
+                'verbose_name_plural': 'نسخه‌ها',
+                'ordering': ['barcode'],
+                'indexes': [models.Index(fields=['book', 'status'], name='books_copy_book_id_364d3c_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrow_records', to='books.copy', verbose_name='نسخه'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-19 04:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# قواعد ثابتی که پیش از این در BorrowRecord.set_due_date و calculate_fine بودند
+DEFAULT_POLICIES = [
+    {'member_type': '', 'loan_days': 14},
+    {'member_type': 'professor', 'loan_days': 30},
+    {'member_type': 'staff', 'loan_days': 21},
+]
+
+
+def seed_policies(apps, schema_editor):
+    LoanPolicy = apps.get_model('books', 'LoanPolicy')
+    LoanPolicy.objects.bulk_create([LoanPolicy(**policy) for policy in DEFAULT_POLICIES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0017_copy_borrowrecord_copy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Closure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='تاریخ')),
+                ('reason', models.CharField(blank=True, max_length=200, verbose_name='مناسبت')),
+            ],
+            options={
+                'verbose_name': 'تعطیلی',
+                'verbose_name_plural': 'تعطیلی‌ها',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('member_type', models.CharField(blank=True, choices=[('student', 'دانشجو'), ('professor', 'استاد'), ('staff', 'کارمند'), ('guest', 'میهمان')], max_length=10, verbose_name='نوع عضو')),
+                ('loan_days', models.PositiveIntegerField(default=14, verbose_name='مدت امانت (روز)')),
+                ('max_loans', models.PositiveIntegerField(blank=True, help_text='خالی یعنی سقف تعریف‌شده برای خود عضو', null=True, verbose_name='سقف امانت')),
+                ('max_renewals', models.PositiveIntegerField(default=2, verbose_name='سقف تمدید')),
+                ('fine_per_day', models.DecimalField(decimal_places=2, default=5000, max_digits=10, verbose_name='جریمه روزانه')),
+                ('grace_days', models.PositiveIntegerField(default=0, verbose_name='روزهای بخشودگی')),
+                ('max_fine', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='سقف جریمه')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به‌روزرسانی')),
+                ('genre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='loan_policies', to='books.genre', verbose_name='ژانر')),
+            ],
+            options={
+                'verbose_name': 'سیاست امانت',
+                'verbose_name_plural': 'سیاست‌های امانت',
+                'ordering': ['member_type', 'genre'],
+                'constraints': [models.UniqueConstraint(fields=('member_type', 'genre'), name='loan_policy_unique_scope'), models.UniqueConstraint(condition=models.Q(('genre__isnull', True)), fields=('member_type',), name='loan_policy_unique_default')],
+            },
+        ),
+        migrations.RunPython(seed_policies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:10
+
+import re
+
+from django.db import migrations, models
+
+# همان منطق books.isbn.normalize_isbn در زمان این مهاجرت؛ ماژول‌های برنامه در مهاجرت import نمی‌شوند
+SEPARATORS = re.compile(r'[\s\-‐‑–]')
+BATCH_SIZE = 1000
+
+
+def _isbn13_check(digits):
+    total = sum(int(char) * (3 if index % 2 else 1) for index, char in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    value = (value or '').strip().upper()
+    compact = SEPARATORS.sub('', value)
+    if len(compact) == 10 and re.fullmatch(r'\d{9}[\dX]', compact):
+        digits = [10 if char == 'X' else int(char) for char in compact]
+        if sum((10 - index) * digit for index, digit in enumerate(digits)) % 11 == 0:
+            body = '978' + compact[:9]
+            return body + _isbn13_check(body)
+    if re.fullmatch(r'\d{13}', compact) and _isbn13_check(compact) == compact[12]:
+        return compact
+    return value
+
+
+def fill_normalized_isbn(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    batch = []
+    for pk, isbn in Book.objects.values_list('pk', 'isbn').order_by().iterator(chunk_size=BATCH_SIZE):
+        batch.append(Book(pk=pk, normalized_isbn=normalize_isbn(isbn)))
+        if len(batch) == BATCH_SIZE:
+            Book.objects.bulk_update(batch, ['normalized_isbn'])
+            batch = []
+    Book.objects.bulk_update(batch, ['normalized_isbn'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0018_loanpolicy_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='normalized_isbn',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='شابک نرمال‌شده'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['normalized_isbn'], name='books_book_normali_c60b8e_idx'),
+        ),
+        migrations.RunPython(fill_normalized_isbn, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0019_book_normalized_isbn'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='fine_balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='مانده جریمه'),
+        ),
+        migrations.CreateModel(
+            name='FineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('charge', 'جریمه'), ('payment', 'پرداخت'), ('waiver', 'بخشودگی')], max_length=10, verbose_name='نوع')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='مبلغ')),
+                ('note', models.CharField(blank=True, max_length=200, verbose_name='توضیح')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان ثبت')),
+                ('borrow_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fine_entries', to='books.borrowrecord', verbose_name='امانت')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='ثبت‌کننده')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fine_entries', to='books.member', verbose_name='عضو')),
+            ],
+            options={
+                'verbose_name': 'سطر دفتر جریمه',
+                'verbose_name_plural': 'دفتر جریمه',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['member', 'created_at'], name='books_finee_member__94d5c0_idx')],
+            },
+        ),
+    ]
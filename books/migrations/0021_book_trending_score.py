@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:15
+
+import math
+from datetime import datetime, time, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_trending_score(apps, schema_editor):
+    # همان فرمول books.trending.weight؛ ماژول‌های برنامه در مهاجرت import نمی‌شوند
+    rate = math.log(2) / (getattr(settings, 'TRENDING_HALF_LIFE_DAYS', 7) * 86400)
+    epoch = datetime.fromisoformat(getattr(settings, 'TRENDING_EPOCH', '2026-01-01')).replace(tzinfo=timezone.utc)
+    Book = apps.get_model('books', 'Book')
+    BorrowRecord = apps.get_model('books', 'BorrowRecord')
+    scores = {}
+    for book_id, borrow_date in BorrowRecord.objects.values_list('book_id', 'borrow_date').order_by().iterator(chunk_size=1000):
+        at = datetime.combine(borrow_date, time.min, tzinfo=timezone.utc)
+        scores[book_id] = scores.get(book_id, 0) + math.exp(rate * (at - epoch).total_seconds())
+    Book.objects.bulk_update(
+        [Book(pk=pk, trending_score=score) for pk, score in scores.items()], ['trending_score'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0020_member_fine_balance_fineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='امتیاز پرطرفداری'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-trending_score'], name='books_book_trendin_afec0f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', '-trending_score'], name='books_book_genre_i_1616e8_idx'),
+        ),
+        migrations.RunPython(fill_trending_score, migrations.RunPython.noop),
+    ]
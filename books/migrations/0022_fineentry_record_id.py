@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+def copy_record_ids(apps, schema_editor):
+    FineEntry = apps.get_model('books', 'FineEntry')
+    FineEntry.objects.filter(borrow_record__isnull=False).update(record_id=models.F('borrow_record_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0021_book_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fineentry',
+            name='record_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='شناسه امانت'),
+        ),
+        migrations.RunPython(copy_record_ids, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='fineentry',
+            name='borrow_record',
+        ),
+        migrations.AddIndex(
+            model_name='fineentry',
+            index=models.Index(fields=['record_id'], name='books_finee_record__73f163_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0023_notification_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedborrowrecord',
+            name='copy_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='شناسه نسخه'),
+        ),
+    ]
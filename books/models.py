@@ -1,10 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 import os
 from django.utils import timezone
 from django.urls import reverse
 
+from .isbn import normalize_isbn
+
 def book_cover_path(instance, filename):
     """تعیین مسیر ذخیره تصویر جلد کتاب"""
     return f'book_covers/{instance.title.replace(" ", "_")}{os.path.splitext(filename)[1]}'
@@ -19,11 +25,18 @@ class Genre(models.Model):
         blank=True, 
         verbose_name='ژانر والد'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='تاریخ به‌روزرسانی'
+    )
     
     class Meta:
         verbose_name = 'ژانر'
         verbose_name_plural = 'ژانرها'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
     
     def __str__(self):
         return self.name
@@ -50,6 +63,8 @@ class Book(models.Model):
     title = models.CharField(max_length=200, verbose_name='عنوان کتاب')
     authors = models.CharField(max_length=200, verbose_name='نویسنده/نویسندگان')
     isbn = models.CharField(max_length=20, unique=True, verbose_name='شابک/کد کتاب')
+    # شابک ۱۳ رقمی بدون خط تیره برای جستجو با هر دو قالب (books.isbn)
+    normalized_isbn = models.CharField(max_length=20, blank=True, editable=False, verbose_name='شابک نرمال‌شده')
     publisher = models.CharField(max_length=100, verbose_name='ناشر')
     publication_year = models.PositiveIntegerField(
         verbose_name='سال انتشار',
@@ -98,6 +113,12 @@ class Book(models.Model):
         default='available',
         verbose_name='وضعیت'
     )
+    # جمع وزن امانت‌ها نسبت به TRENDING_EPOCH (books.trending)؛ فقط برای مرتب‌سازی
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='امتیاز پرطرفداری'
+    )
     
     # اطلاعات اضافی
     description = models.TextField(blank=True, verbose_name='توضیحات')
@@ -118,29 +139,120 @@ class Book(models.Model):
             models.Index(fields=['title']),
             models.Index(fields=['isbn']),
             models.Index(fields=['publication_year']),
+            models.Index(fields=['status']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['normalized_isbn']),
+            models.Index(fields=['-trending_score']),
+            models.Index(fields=['genre', '-trending_score']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(available__gte=0) & models.Q(available__lte=models.F('quantity')),
+                name='book_available_within_quantity',
+            ),
         ]
 
     def __str__(self):
         return f"{self.title} - {self.authors}"
 
+    def clean(self):
+        super().clean()
+        if not self._state.adding and self.quantity is not None:
+            open_loans = self.borrow_records.filter(returned=False).count()
+            if self.quantity < open_loans:
+                raise ValidationError({'quantity': f'{open_loans} نسخه در امانت است؛ تعداد کل نمی‌تواند کمتر باشد'})
+
     def save(self, *args, **kwargs):
         """محاسبه خودکار موجودی و وضعیت"""
-        # محاسبه موجودی
-        if not self.available:
+        # موجودی هنگام ایجاد از تعداد کل گرفته می‌شود؛ بعد از آن امانت/بازگشت
+        # (books.inventory) و reconcile_inventory آن را تغییر می‌دهند
+        update_fields = kwargs.get('update_fields')
+        shift = (
+            not self._state.adding and isinstance(self.quantity, int)
+            and (update_fields is None or 'quantity' in update_fields)
+        )
+        if self._state.adding:
             self.available = self.quantity
-        
-        # به‌روزرسانی خودکار وضعیت
-        if self.available == 0:
-            self.status = 'borrowed'
-        elif self.physical_condition == 'damaged':
-            self.status = 'damaged'
+        elif shift:
+            # تغییر تعداد کل به همان اندازه به موجودی منتقل می‌شود (محدود به 0..quantity)؛
+            # با عبارت روی مقدار فعلی ردیف تا امانت همزمان از دست نرود
+            self.available = Greatest(
+                Least(F('available') + Value(self.quantity) - F('quantity'), Value(self.quantity)), Value(0)
+            )
+            if self.physical_condition == 'damaged':
+                self.status = 'damaged'
+            else:
+                self.status = Case(
+                    When(Exact(self.available, 0), then=Value('borrowed')),
+                    default=Value('available' if self.status == 'borrowed' else self.status),
+                    output_field=models.CharField(),
+                )
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'available', 'status'}
+        self.normalized_isbn = normalize_isbn(self.isbn)
+
+        # به‌روزرسانی خودکار وضعیت (وقتی available عبارت F نباشد)
+        if isinstance(self.available, int):
+            if self.physical_condition == 'damaged':
+                self.status = 'damaged'
+            elif self.available == 0:
+                self.status = 'borrowed'
+            elif self.status == 'borrowed':
+                self.status = 'available'
         
         super().save(*args, **kwargs)
+        if shift:
+            self.refresh_from_db(fields=['available', 'status'])
     
     def get_absolute_url(self):
         return reverse('book_detail', args=[str(self.id)])
 
 
+class Copy(models.Model):
+    """نسخه فیزیکی یک کتاب با بارکد یکتا برای امانت در میز امانت"""
+    STATUS_CHOICES = [
+        ('available', 'موجود'),
+        ('borrowed', 'امانت داده شده'),
+        ('maintenance', 'در حال تعمیر'),
+        ('lost', 'مفقود'),
+    ]
+
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        verbose_name='کتاب',
+        related_name='copies'
+    )
+    barcode = models.CharField(max_length=32, unique=True, verbose_name='بارکد')
+    status = models.CharField(
+        max_length=15,
+        choices=STATUS_CHOICES,
+        default='available',
+        verbose_name='وضعیت'
+    )
+    condition = models.CharField(
+        max_length=15,
+        choices=Book.PHYSICAL_CONDITION_CHOICES,
+        default='good',
+        verbose_name='وضعیت فیزیکی'
+    )
+    location = models.CharField(max_length=100, blank=True, verbose_name='محل نگهداری')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ثبت')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ به‌روزرسانی')
+
+    class Meta:
+        verbose_name = 'نسخه'
+        verbose_name_plural = 'نسخه‌ها'
+        ordering = ['barcode']
+        indexes = [
+            # شمارش نسخه‌های موجود هر کتاب بدون خواندن جدول
+            models.Index(fields=['book', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.barcode} ({self.get_status_display()})"
+
+
 class Member(models.Model):
     """مدل جامع اعضا با قابلیت اتصال به سیستم احراز هویت"""
     MEMBER_TYPE_CHOICES = [
@@ -212,6 +324,19 @@ class Member(models.Model):
         default=3,
         verbose_name='حداکثر تعداد امانت'
     )
+    # مانده بدهی جریمه؛ فقط books.fines آن را همراه ثبت در دفتر جریمه تغییر می‌دهد
+    fine_balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name='مانده جریمه'
+    )
+    language = models.CharField(
+        max_length=10,
+        blank=True,
+        verbose_name='زبان اطلاع‌رسانی'
+    )
     
     # اطلاعات اضافی
     notes = models.TextField(
@@ -226,6 +351,7 @@ class Member(models.Model):
         indexes = [
             models.Index(fields=['member_id']),
             models.Index(fields=['last_name', 'first_name']),
+            models.Index(fields=['active', 'member_type']),
         ]
 
     def __str__(self):
@@ -261,6 +387,14 @@ class BorrowRecord(models.Model):
         verbose_name='عضو',
         related_name='borrow_records'
     )
+    copy = models.ForeignKey(
+        Copy,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='نسخه',
+        related_name='borrow_records'
+    )
     
     # اطلاعات امانت
     borrow_date = models.DateField(
@@ -308,6 +442,7 @@ class BorrowRecord(models.Model):
         indexes = [
             models.Index(fields=['borrow_date']),
             models.Index(fields=['due_date']),
+            models.Index(fields=['returned', 'due_date']),
         ]
 
     def __str__(self):
@@ -321,34 +456,63 @@ class BorrowRecord(models.Model):
             self.return_date = timezone.now().date()
         
         # محاسبه موعد برگشت برای امانت جدید
-        if not self.pk:
+        if not self.pk and not self.due_date:
             self.set_due_date()
         
         # محاسبه جریمه
         self.calculate_fine()
-        
-        super().save(*args, **kwargs)
+
+        if not self.returned and self._saved_fine == 0:
+            super().save(*args, **kwargs)
+        else:
+            from .fines import settle
+
+            # هر تغییر جریمه (بازگشت، ویرایش موعد در API یا ادمین) همراه با اختلافش در دفتر جریمه ثبت می‌شود
+            previous = self._saved_fine
+            if previous is None:
+                previous = BorrowRecord.objects.filter(pk=self.pk).values_list('fine_amount', flat=True).first() or 0
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                settle([(self, previous)])
+        self._saved_fine = self.fine_amount
+
+    # جریمه ذخیره‌شده در پایگاه داده؛ None یعنی بارگذاری نشده (فیلد deferred)
+    _saved_fine = 0
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_fine = instance.__dict__.get('fine_amount')
+        return instance
     
+    # قواعد از جدول کامپایل‌شده policies خوانده می‌شوند؛ عضو و کتاب باید از قبل
+    # بارگذاری شده باشند (select_related) تا کوئری اضافه‌ای اجرا نشود
     def set_due_date(self):
-        """تعیین تاریخ برگشت بر اساس نوع عضو"""
-        base_days = 14  # پیش‌فرض برای دانشجویان و مهمانان
-        
-        if self.member.member_type == 'professor':
-            base_days = 30
-        elif self.member.member_type == 'staff':
-            base_days = 21
-            
-        self.due_date = self.borrow_date + timezone.timedelta(days=base_days)
+        """تعیین تاریخ برگشت بر اساس سیاست امانت نوع عضو و ژانر کتاب"""
+        from .policies import due_date
+
+        start = self.borrow_date or timezone.now().date()
+        self.due_date = due_date(self.member.member_type, self.book.genre_id, start)
     
     def calculate_fine(self):
         """محاسبه جریمه تأخیر"""
+        from .policies import fine
+
         if not self.returned or not self.return_date:
             self.fine_amount = 0
             return
         
-        if self.return_date > self.due_date:
-            days_late = (self.return_date - self.due_date).days
-            self.fine_amount = days_late * 5000  # 5000 تومان برای هر روز تأخیر
+        self.fine_amount = fine(self.member.member_type, self.book.genre_id, self.due_date, self.return_date)
+
+    def renew(self):
+        """تمدید از موعد فعلی؛ اگر سقف تمدید پر شده باشد False برمی‌گرداند"""
+        from .policies import due_date, rule_for
+
+        if self.renewal_count >= rule_for(self.member.member_type, self.book.genre_id).max_renewals:
+            return False
+        self.due_date = due_date(self.member.member_type, self.book.genre_id, self.due_date)
+        self.renewal_count += 1
+        return True
 
 
 class Reservation(models.Model):
@@ -411,4 +575,351 @@ class Reservation(models.Model):
     
     def is_active(self):
         """بررسی فعال بودن رزرو"""
-        return self.status == 'approved' and timezone.now() < self.expiration_date
\ No newline at end of file
+        return self.status == 'approved' and timezone.now() < self.expiration_date
+
+class SlowQuery(models.Model):
+    """آمار تجمعی کوئری‌های کند بر اساس fingerprint"""
+    fingerprint = models.CharField(
+        max_length=32,
+        unique=True,
+        verbose_name='اثر انگشت'
+    )
+    normalized_sql = models.TextField(verbose_name='کوئری نرمال‌شده')
+    sample_sql = models.TextField(verbose_name='نمونه کوئری')
+    calls = models.PositiveIntegerField(default=0, verbose_name='تعداد اجرا')
+    total_time = models.FloatField(default=0, verbose_name='مجموع زمان (ms)')
+    max_time = models.FloatField(default=0, verbose_name='بیشترین زمان (ms)')
+    last_origin = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='آخرین محل فراخوانی'
+    )
+    plan = models.TextField(blank=True, verbose_name='پلن اجرا')
+    first_seen = models.DateTimeField(auto_now_add=True, verbose_name='اولین مشاهده')
+    last_seen = models.DateTimeField(verbose_name='آخرین مشاهده')
+
+    class Meta:
+        verbose_name = 'کوئری کند'
+        verbose_name_plural = 'کوئری‌های کند'
+        ordering = ['-total_time']
+
+    def __str__(self):
+        return f"{self.fingerprint} ({self.calls})"
+
+    @property
+    def mean_time(self):
+        """میانگین زمان اجرا"""
+        return self.total_time / self.calls if self.calls else 0
+
+
+class ArchivedBorrowRecord(models.Model):
+    """سوابق امانت قدیمی و برگشت‌داده‌شده که از جدول اصلی منتقل شده‌اند"""
+    original_id = models.BigIntegerField(
+        unique=True,
+        verbose_name='شناسه سابقه اصلی'
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        verbose_name='کتاب',
+        related_name='archived_borrow_records'
+    )
+    member = models.ForeignKey(
+        Member,
+        on_delete=models.CASCADE,
+        verbose_name='عضو',
+        related_name='archived_borrow_records'
+    )
+    # شناسه بدون کلید خارجی؛ نسخه ممکن است پس از بایگانی حذف شود
+    copy_id = models.BigIntegerField(null=True, blank=True, verbose_name='شناسه نسخه')
+    borrow_date = models.DateField(verbose_name='تاریخ امانت')
+    due_date = models.DateField(verbose_name='موعد بازگشت')
+    return_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='تاریخ بازگشت'
+    )
+    returned = models.BooleanField(default=True, verbose_name='برگشت داده شده؟')
+    renewal_count = models.PositiveIntegerField(default=0, verbose_name='تعداد تمدید')
+    fine_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        verbose_name='مبلغ جریمه'
+    )
+    notes = models.TextField(blank=True, verbose_name='یادداشت‌ها')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')
+
+    class Meta:
+        verbose_name = 'سابقه امانت بایگانی‌شده'
+        verbose_name_plural = 'سوابق امانت بایگانی‌شده'
+        ordering = ['-borrow_date']
+        indexes = [
+            models.Index(fields=['member', '-borrow_date']),
+            models.Index(fields=['book', '-borrow_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} - {self.member_id} ({self.borrow_date})"
+
+
+class BookSimilarity(models.Model):
+    """کتاب‌های مشابه بر اساس هم‌امانتی (خروجی محاسبه آفلاین)"""
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        verbose_name='کتاب',
+        related_name='similarities'
+    )
+    similar_book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        verbose_name='کتاب مشابه',
+        related_name='+'
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='رتبه')
+    score = models.FloatField(verbose_name='امتیاز شباهت')
+
+    class Meta:
+        verbose_name = 'کتاب مشابه'
+        verbose_name_plural = 'کتاب‌های مشابه'
+        ordering = ['book', 'rank']
+        unique_together = ['book', 'rank']
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.similar_book_id} ({self.score:.2f})"
+
+
+class Notification(models.Model):
+    """وضعیت ارسال اطلاعیه‌ها برای جلوگیری از ارسال تکراری"""
+    KIND_CHOICES = [
+        ('overdue', 'تأخیر در بازگشت'),
+        ('hold_ready', 'آماده شدن رزرو'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'در صف'),
+        ('sending', 'در حال ارسال'),
+        ('sent', 'ارسال شده'),
+        ('failed', 'ناموفق'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='نوع')
+    member = models.ForeignKey(
+        Member,
+        on_delete=models.CASCADE,
+        verbose_name='عضو',
+        related_name='notifications'
+    )
+    # شناسه سابقه امانت یا رزرو مرتبط
+    object_id = models.BigIntegerField(verbose_name='شناسه مورد')
+    # موعد بازگشت یا تاریخ انقضای رزرو؛ با تغییر آن (مثلاً تمدید) اطلاعیه جدید لازم است
+    reference_date = models.DateField(verbose_name='تاریخ مرجع')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='وضعیت'
+    )
+    claim_token = models.CharField(max_length=32, blank=True, verbose_name='شناسه اجرای ارسال')
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='زمان تخصیص')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='تعداد تلاش')
+    error = models.TextField(blank=True, verbose_name='خطا')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='تاریخ ارسال')
+
+    class Meta:
+        verbose_name = 'اطلاعیه'
+        verbose_name_plural = 'اطلاعیه‌ها'
+        ordering = ['-created_at']
+        unique_together = ['kind', 'object_id', 'reference_date']
+        indexes = [
+            models.Index(fields=['status', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.member_id} ({self.get_status_display()})"
+
+
+class Tombstone(models.Model):
+    """ثبت حذف کتاب/ژانر برای همگام‌سازی تدریجی کلاینت‌ها (books.sync)"""
+    MODEL_CHOICES = [
+        ('book', 'کتاب'),
+        ('genre', 'ژانر'),
+    ]
+
+    model_name = models.CharField(max_length=20, choices=MODEL_CHOICES, verbose_name='نوع')
+    object_id = models.BigIntegerField(verbose_name='شناسه')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ حذف')
+
+    class Meta:
+        verbose_name = 'رکورد حذف‌شده'
+        verbose_name_plural = 'رکوردهای حذف‌شده'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} #{self.object_id}"
+
+
+class CirculationEvent(models.Model):
+    """لاگ فقط‌افزودنی تغییرات امانت، رزرو و کتاب برای مصرف‌کننده‌های پایین‌دستی"""
+    EVENT_CHOICES = [
+        ('checkout', 'امانت'),
+        ('return', 'بازگشت'),
+        ('renewal', 'تمدید'),
+        ('reservation', 'تغییر رزرو'),
+        ('book_created', 'ایجاد کتاب'),
+        ('book_updated', 'ویرایش کتاب'),
+        ('book_deleted', 'حذف کتاب'),
+    ]
+
+    event_type = models.CharField(max_length=20, choices=EVENT_CHOICES, verbose_name='نوع رویداد')
+    # شناسه‌ها بدون کلید خارجی تا حذف کتاب/عضو تاریخچه رویدادها را پاک نکند
+    book_id = models.BigIntegerField(null=True, blank=True, verbose_name='شناسه کتاب')
+    member_id = models.BigIntegerField(null=True, blank=True, verbose_name='شناسه عضو')
+    object_id = models.BigIntegerField(null=True, blank=True, verbose_name='شناسه امانت/رزرو')
+    data = models.JSONField(default=dict, blank=True, verbose_name='داده‌ها')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='زمان')
+
+    class Meta:
+        verbose_name = 'رویداد'
+        verbose_name_plural = 'رویدادها'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.pk} {self.event_type}"
+
+
+class ConsumerOffset(models.Model):
+    """آخرین رویداد پردازش‌شده توسط هر مصرف‌کننده"""
+    name = models.CharField(max_length=100, unique=True, verbose_name='مصرف‌کننده')
+    position = models.BigIntegerField(default=0, verbose_name='آخرین شناسه رویداد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ به‌روزرسانی')
+
+    class Meta:
+        verbose_name = 'موقعیت مصرف‌کننده'
+        verbose_name_plural = 'موقعیت مصرف‌کننده‌ها'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class LoanPolicy(models.Model):
+    """قواعد امانت برای هر نوع عضو و/یا ژانر؛ فیلد خالی یعنی «همه»"""
+    member_type = models.CharField(
+        max_length=10,
+        choices=Member.MEMBER_TYPE_CHOICES,
+        blank=True,
+        verbose_name='نوع عضو'
+    )
+    genre = models.ForeignKey(
+        Genre,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name='ژانر',
+        related_name='loan_policies'
+    )
+    loan_days = models.PositiveIntegerField(default=14, verbose_name='مدت امانت (روز)')
+    max_loans = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='سقف امانت',
+        help_text='خالی یعنی سقف تعریف‌شده برای خود عضو'
+    )
+    max_renewals = models.PositiveIntegerField(default=2, verbose_name='سقف تمدید')
+    fine_per_day = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=5000,
+        verbose_name='جریمه روزانه'
+    )
+    grace_days = models.PositiveIntegerField(default=0, verbose_name='روزهای بخشودگی')
+    max_fine = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='سقف جریمه'
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ به‌روزرسانی')
+
+    class Meta:
+        verbose_name = 'سیاست امانت'
+        verbose_name_plural = 'سیاست‌های امانت'
+        ordering = ['member_type', 'genre']
+        constraints = [
+            models.UniqueConstraint(fields=['member_type', 'genre'], name='loan_policy_unique_scope'),
+            # NULL ها در UNIQUE یکتا حساب نمی‌شوند
+            models.UniqueConstraint(
+                fields=['member_type'], condition=models.Q(genre__isnull=True), name='loan_policy_unique_default'
+            ),
+        ]
+
+    def __str__(self):
+        member_type = self.get_member_type_display() or 'همه اعضا'
+        genre = self.genre.name if self.genre_id else 'همه ژانرها'
+        return f"{member_type} / {genre}: {self.loan_days} روز"
+
+
+class Closure(models.Model):
+    """روزهای تعطیل کتابخانه؛ موعد بازگشت به اولین روز کاری بعد منتقل می‌شود"""
+    date = models.DateField(unique=True, verbose_name='تاریخ')
+    reason = models.CharField(max_length=200, blank=True, verbose_name='مناسبت')
+
+    class Meta:
+        verbose_name = 'تعطیلی'
+        verbose_name_plural = 'تعطیلی‌ها'
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date} {self.reason}".strip()
+
+
+class FineEntry(models.Model):
+    """سطر دفتر جریمه؛ مبلغ همیشه مثبت است و جهت آن از نوع سطر می‌آید"""
+    KIND_CHOICES = [
+        ('charge', 'جریمه'),
+        ('payment', 'پرداخت'),
+        ('waiver', 'بخشودگی'),
+    ]
+
+    member = models.ForeignKey(
+        Member,
+        on_delete=models.CASCADE,
+        related_name='fine_entries',
+        verbose_name='عضو'
+    )
+    # شناسه بدون کلید خارجی تا با بایگانی امانت‌ها (archive_borrows) ارتباط سطر از بین نرود
+    record_id = models.BigIntegerField(null=True, blank=True, verbose_name='شناسه امانت')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='نوع')
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        verbose_name='مبلغ'
+    )
+    note = models.CharField(max_length=200, blank=True, verbose_name='توضیح')
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='ثبت‌کننده'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='زمان ثبت')
+
+    class Meta:
+        verbose_name = 'سطر دفتر جریمه'
+        verbose_name_plural = 'دفتر جریمه'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['member', 'created_at']),
+            models.Index(fields=['record_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} - {self.member_id}"
@@ -0,0 +1,203 @@
+"""
+ارسال دسته‌ای اطلاعیه‌های تأخیر و آماده شدن رزرو
+
+- گیرندگان با یک کوئری مجموعه‌ای انتخاب و به‌صورت ردیف‌های Notification ثبت می‌شوند
+- ردیف‌ها با یک UPDATE به اجرای جاری تخصیص داده می‌شوند تا اجرای همزمان دوباره نفرستد؛
+  ردیف‌هایی که بیش از NOTIFICATION_CLAIM_TIMEOUT در حال ارسال مانده‌اند (اجرای قطع‌شده)
+  دوباره تخصیص می‌یابند
+- برای هر عضو یک ایمیل ساخته می‌شود؛ قالب برای هر (نوع، زبان) یک بار بارگذاری می‌شود
+- ایمیل‌ها در دسته‌هایی روی یک اتصال مشترک و با همزمانی محدود ارسال می‌شوند
+- وضعیت ارسال ذخیره می‌شود، پس اجرای دوباره فقط موارد ارسال‌نشده را می‌فرستد
+"""
+import logging
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, F, OuterRef, Q
+from django.template.loader import select_template
+from django.utils import timezone, translation
+
+from .models import BorrowRecord, Notification, Reservation
+
+logger = logging.getLogger(__name__)
+
+
+def _overdue_candidates(today):
+    already = Notification.objects.filter(
+        kind='overdue', object_id=OuterRef('pk'), reference_date=OuterRef('due_date')
+    )
+    return (
+        BorrowRecord.objects
+        .filter(returned=False, due_date__lt=today, member__active=True)
+        .exclude(member__email='')
+        .filter(~Exists(already))
+        .values_list('pk', 'member_id', 'due_date')
+    )
+
+
+def _hold_candidates(today):
+    already = Notification.objects.filter(
+        kind='hold_ready', object_id=OuterRef('pk'), reference_date=OuterRef('expiration_date__date')
+    )
+    return (
+        Reservation.objects
+        .filter(status='approved', expiration_date__gt=timezone.now(), member__active=True)
+        .exclude(member__email='')
+        .filter(~Exists(already))
+        .values_list('pk', 'member_id', 'expiration_date__date')
+    )
+
+
+CANDIDATES = {
+    'overdue': _overdue_candidates,
+    'hold_ready': _hold_candidates,
+}
+
+
+def queue_notifications(kinds=None, today=None):
+    """ثبت ردیف pending برای موارد جدید؛ تعداد ردیف‌های ثبت‌شده را برمی‌گرداند"""
+    today = today or timezone.now().date()
+    created = 0
+    for kind in kinds or CANDIDATES:
+        rows = [
+            Notification(kind=kind, object_id=object_id, member_id=member_id, reference_date=reference_date)
+            for object_id, member_id, reference_date in CANDIDATES[kind](today).iterator(chunk_size=2000)
+        ]
+        # ردیف‌های تکراری (اجرای همزمان) با قید یکتایی نادیده گرفته می‌شوند
+        Notification.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        created += len(rows)
+    return created
+
+
+def _abandoned(now):
+    """ردیف‌های در حال ارسالی که اجرای تخصیص‌دهنده‌شان در زمان مقرر تمام نشده است"""
+    timeout = now - timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT)
+    return Q(status='sending') & (Q(claimed_at__lt=timeout) | Q(claimed_at__isnull=True))
+
+
+def _claimable(now):
+    retry = Q(attempts__lt=settings.NOTIFICATION_MAX_ATTEMPTS)
+    return Q(status='pending') | ((Q(status='failed') | _abandoned(now)) & retry)
+
+
+def claim(limit=None):
+    """تخصیص ردیف‌های در صف، ناموفق یا رهاشده در حال ارسال به این اجرا با یک UPDATE"""
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    # ردیف رهاشده‌ای که تلاش‌هایش تمام شده ناموفق ثبت می‌شود تا در حال ارسال نماند
+    Notification.objects.filter(_abandoned(now), attempts__gte=settings.NOTIFICATION_MAX_ATTEMPTS).update(
+        status='failed', error='Claim timed out'
+    )
+    ids = Notification.objects.filter(_claimable(now)).order_by('pk').values('pk')
+    if limit:
+        ids = ids[:limit]
+    # شرط تخصیص در خود UPDATE تکرار می‌شود تا ردیفی که اجرای دیگری گرفته دوباره تخصیص نیابد
+    Notification.objects.filter(_claimable(now), pk__in=list(ids.values_list('pk', flat=True))).update(
+        status='sending', claim_token=token, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return Notification.objects.filter(claim_token=token, status='sending').select_related('member')
+
+
+def _items(notifications):
+    """اشیای مرتبط هر نوع که هنوز به اطلاعیه نیاز دارند، با یک کوئری برای هر نوع"""
+    ids = defaultdict(list)
+    for notification in notifications:
+        ids[notification.kind].append(notification.object_id)
+    return {
+        'overdue': BorrowRecord.objects.filter(returned=False).select_related('book').in_bulk(ids['overdue']),
+        'hold_ready': Reservation.objects.filter(status='approved').select_related('book').in_bulk(ids['hold_ready']),
+    }
+
+
+def build_messages(notifications):
+    """
+    یک ایمیل برای هر (عضو، نوع) به همراه شناسه اطلاعیه‌های پوشش‌داده‌شده
+
+    پیام‌ها بر اساس زبان گروه‌بندی می‌شوند تا قالب و ترجمه هر زبان یک بار فعال شود.
+    """
+    items = _items(notifications)
+    groups = defaultdict(lambda: defaultdict(list))
+    members = {}
+    for notification in notifications:
+        member = notification.member
+        members[member.pk] = member
+        language = member.language or settings.LANGUAGE_CODE
+        groups[(notification.kind, language)][member.pk].append(notification)
+
+    messages = []
+    orphaned = []
+    for (kind, language), by_member in groups.items():
+        with translation.override(language):
+            template = select_template([
+                f'books/emails/{kind}.{language}.txt',
+                f'books/emails/{kind}.txt',
+            ])
+            for member_id, member_notifications in by_member.items():
+                related = [items[kind].get(n.object_id) for n in member_notifications]
+                if not any(related):
+                    orphaned.extend(n.pk for n in member_notifications)
+                    continue
+                member = members[member_id]
+                subject, _, body = template.render({
+                    'member': member,
+                    'items': [item for item in related if item is not None],
+                }).strip().partition('\n')
+                messages.append((
+                    [n.pk for n in member_notifications],
+                    EmailMessage(subject.strip(), body.strip(), settings.DEFAULT_FROM_EMAIL, [member.email]),
+                ))
+    return messages, orphaned
+
+
+def _send_batch(batch):
+    """ارسال یک دسته روی یک اتصال؛ [(شناسه‌ها، خطا یا None)] را برمی‌گرداند"""
+    results = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        return [(ids, str(exc)) for ids, _ in batch]
+    try:
+        for ids, message in batch:
+            message.connection = connection
+            try:
+                message.send()
+            except Exception as exc:
+                logger.warning('notification to %s failed: %s', message.to, exc)
+                results.append((ids, str(exc)))
+            else:
+                results.append((ids, None))
+    finally:
+        connection.close()
+    return results
+
+
+def send_notifications(kinds=None, limit=None):
+    """اجرای کامل: ثبت، تخصیص، ساخت و ارسال؛ (تعداد موفق، تعداد ناموفق) ایمیل‌ها"""
+    queue_notifications(kinds)
+    notifications = list(claim(limit))
+    if not notifications:
+        return 0, 0
+
+    messages, orphaned = build_messages(notifications)
+    # امانت برگشت‌داده یا رزرو حذف‌شده دیگر اطلاعیه لازم ندارد
+    Notification.objects.filter(pk__in=orphaned).update(status='sent', error='skipped')
+
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    batches = [messages[i:i + batch_size] for i in range(0, len(messages), batch_size)]
+    with ThreadPoolExecutor(max_workers=settings.NOTIFICATION_CONCURRENCY) as executor:
+        results = [result for batch in executor.map(_send_batch, batches) for result in batch]
+
+    # ثبت نتایج در thread اصلی با تعداد کمی کوئری
+    sent = [pk for ids, error in results if error is None for pk in ids]
+    Notification.objects.filter(pk__in=sent).update(status='sent', sent_at=timezone.now(), error='')
+    failed = [
+        Notification(pk=pk, status='failed', error=error)
+        for ids, error in results if error is not None for pk in ids
+    ]
+    Notification.objects.bulk_update(failed, ['status', 'error'], batch_size=500)
+    return sum(1 for _, error in results if error is None), sum(1 for _, error in results if error)
@@ -0,0 +1,83 @@
+"""
+شمارش تقریبی برای صفحه‌بندی لیست‌های بزرگ
+
+COUNT(*) روی جدول‌های میلیونی (به‌خصوص با annotate) یک اسکن کامل است. بالای
+ESTIMATED_COUNT_THRESHOLD برای queryset بدون فیلتر از pg_class.reltuples در
+PostgreSQL استفاده می‌شود. برآورد planner برای شرط‌ها (EXPLAIN) می‌تواند چند برابر
+خطا داشته باشد، پس queryset فیلترشده، لیست‌های کوچک و سایر پایگاه‌ها دقیق شمرده
+می‌شوند. در صفحه‌های تقریبی وجود صفحه بعد با خواندن یک ردیف اضافه معلوم می‌شود.
+"""
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """برآورد تعداد ردیف‌های جدول برای queryset بدون فیلتر؛ در غیر این صورت None"""
+    if queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    # -1 یعنی جدول هنوز ANALYZE نشده است
+    return row[0] if row and row[0] >= 0 else None
+
+
+def count_rows(queryset):
+    """(تعداد، تقریبی است؟)؛ برای لیست‌های کوچک همیشه دقیق"""
+    estimate = estimated_count(queryset)
+    if estimate is None or estimate < settings.ESTIMATED_COUNT_THRESHOLD:
+        return queryset.count(), False
+    return estimate, True
+
+
+class EstimatedPage(Page):
+    """صفحه با count تقریبی؛ object_list یک ردیف بیشتر از per_page خوانده شده است"""
+
+    def __init__(self, object_list, number, paginator):
+        rows = list(object_list)
+        self.more = len(rows) > paginator.per_page
+        super().__init__(rows[:paginator.per_page], number, paginator)
+
+    def has_next(self):
+        return self.more
+
+    def next_page_number(self):
+        # شماره صفحه به برآورد num_pages محدود نیست
+        return self.number + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator جنگو با count تقریبی (changelist ادمین و StandardPagination)"""
+    estimated = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        count, self.estimated = count_rows(self.object_list)
+        return count
+
+    def page(self, number):
+        if not self.count or not self.estimated:
+            return super().page(number)
+        # تعداد تقریبی است، پس صفحه‌ها به برآورد محدود نمی‌شوند
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        bottom = (number - 1) * self.per_page
+        return EstimatedPage(self.object_list[bottom:bottom + self.per_page + 1], number, self)
@@ -0,0 +1,152 @@
+"""
+سیاست‌های امانت: مدت امانت، سقف امانت و تمدید، جریمه و تعطیلی‌ها
+
+جدول LoanPolicy و Closure در هر پروسه یک بار به یک جدول درون‌حافظه‌ای کامپایل
+می‌شوند: برای هر (نوع عضو، ژانر) قاعده نهایی از قبل انتخاب شده است، پس موعد
+بازگشت و جریمه بدون هیچ کوئری اضافه (حتی در کارهای گروهی) محاسبه می‌شوند.
+
+اولویت قواعد: ژانر کتاب و سپس ژانرهای والد آن، و در آخر قاعده بدون ژانر؛ در هر
+سطح قاعده نوع عضو بر قاعده «همه اعضا» مقدم است. ویرایش سیاست‌ها جدول این پروسه
+را باطل می‌کند و پروسه‌های دیگر با شمارنده نسل در کش متوجه تغییر می‌شوند.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'loan_policies:generation'
+
+
+class Rule:
+    def __init__(self, loan_days=14, max_loans=None, max_renewals=2, fine_per_day=Decimal(5000),
+                 grace_days=0, max_fine=None):
+        self.loan_days = loan_days
+        self.max_loans = max_loans
+        self.max_renewals = max_renewals
+        self.fine_per_day = fine_per_day
+        self.grace_days = grace_days
+        self.max_fine = max_fine
+
+
+# وقتی برای نوع عضو هیچ قاعده‌ای (حتی پیش‌فرض) تعریف نشده باشد؛ همان مقادیر مهاجرت 0018
+FALLBACK = Rule()
+FALLBACKS = {'professor': Rule(loan_days=30), 'staff': Rule(loan_days=21)}
+
+
+class PolicyTable:
+    def __init__(self):
+        # ((member_type, genre_id) -> Rule, تاریخ‌های تعطیل)
+        self._compiled = None
+        self._lock = threading.Lock()
+        self.generation = None
+        self._last_check = 0.0
+
+    def compile(self):
+        """ساخت جدول از سه کوئری: سیاست‌ها، درخت ژانرها و تعطیلی‌ها"""
+        from .models import Closure, Genre, LoanPolicy, Member
+
+        generation = cache.get(GENERATION_KEY)
+        scoped = {
+            (policy.member_type, policy.genre_id): Rule(
+                policy.loan_days, policy.max_loans, policy.max_renewals,
+                policy.fine_per_day, policy.grace_days, policy.max_fine,
+            )
+            for policy in LoanPolicy.objects.all()
+        }
+        parents = dict(Genre.objects.values_list('id', 'parent_id'))
+        member_types = [choice for choice, _ in Member.MEMBER_TYPE_CHOICES]
+
+        rules = {}
+        for genre_id in [None, *parents]:
+            # ژانر و والدهایش به ترتیب و در آخر «بدون ژانر»
+            chain = []
+            current = genre_id
+            while current is not None and current not in chain:
+                chain.append(current)
+                current = parents.get(current)
+            chain.append(None)
+            for member_type in member_types:
+                rules[(member_type, genre_id)] = next(
+                    (
+                        scoped[key]
+                        for genre in chain
+                        for key in ((member_type, genre), ('', genre))
+                        if key in scoped
+                    ),
+                    FALLBACKS.get(member_type, FALLBACK),
+                )
+
+        compiled = (rules, frozenset(Closure.objects.values_list('date', flat=True)))
+        with self._lock:
+            self._compiled = compiled
+            self.generation = generation
+            self._last_check = time.monotonic()
+        return compiled
+
+    def invalidate(self):
+        self._compiled = None
+
+    def _current(self):
+        """جدول فعلی؛ نسل کش حداکثر هر LOAN_POLICY_SYNC_INTERVAL ثانیه بررسی می‌شود"""
+        compiled = self._compiled
+        if compiled is None:
+            return self.compile()
+        now = time.monotonic()
+        if now - self._last_check >= settings.LOAN_POLICY_SYNC_INTERVAL:
+            self._last_check = now
+            if cache.get(GENERATION_KEY) != self.generation:
+                return self.compile()
+        return compiled
+
+    def rule(self, member_type, genre_id=None):
+        rules = self._current()[0]
+        # ژانری که بعد از ساخت جدول اضافه شده تا بررسی بعدی مثل کتاب بدون ژانر است
+        return rules.get((member_type, genre_id)) or rules.get((member_type, None), FALLBACK)
+
+    def next_open_day(self, day):
+        closures = self._current()[1]
+        while day in closures:
+            day += timedelta(days=1)
+        return day
+
+
+table = PolicyTable()
+
+
+def rule_for(member_type, genre_id=None):
+    return table.rule(member_type, genre_id)
+
+
+def due_date(member_type, genre_id, start):
+    """موعد بازگشت امانتی که در start شروع (یا تا start تمدید) شده است"""
+    return table.next_open_day(start + timedelta(days=rule_for(member_type, genre_id).loan_days))
+
+
+def fine(member_type, genre_id, due, returned_on):
+    """جریمه تأخیر پس از کسر روزهای بخشودگی و با رعایت سقف جریمه"""
+    rule = rule_for(member_type, genre_id)
+    days_late = (returned_on - due).days - rule.grace_days
+    if days_late <= 0:
+        return Decimal(0)
+    amount = rule.fine_per_day * days_late
+    if rule.max_fine is not None:
+        amount = min(amount, rule.max_fine)
+    return amount
+
+
+def max_loans(member, genre_id=None):
+    """سقف امانت‌های باز عضو؛ اگر سیاست سقفی نداشته باشد سقف خود عضو"""
+    limit = rule_for(member.member_type, genre_id).max_loans
+    return member.max_borrow_limit if limit is None else limit
+
+
+def policy_changed(sender, **kwargs):
+    """گیرنده post_save/post_delete سیاست‌ها، تعطیلی‌ها و ژانرها"""
+    table.invalidate()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, None)
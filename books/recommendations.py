@@ -0,0 +1,154 @@
+"""
+پیشنهاد «اعضایی که این کتاب را امانت گرفتند، این‌ها را هم گرفتند»
+
+از سوابق امانت (جاری و بایگانی) یک ماتریس اسپارس کتاب×عضو ساخته می‌شود و
+شباهت کسینوسی هر کتاب با بقیه به‌صورت برداری محاسبه می‌شود. فقط K کتاب
+برتر هر کتاب در BookSimilarity ذخیره می‌شود تا سرو کردن آن یک lookup ایندکس‌شده باشد.
+
+برای به‌روزرسانی تدریجی، شناسه آخرین امانت پردازش‌شده در کش نگه داشته می‌شود و
+فقط سطرهای کتاب‌هایی که امانت جدید روی شباهتشان اثر گذاشته دوباره محاسبه می‌شوند؛
+ماتریس هم فقط برای همسایه‌های همین کتاب‌ها بارگذاری می‌شود.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import ArchivedBorrowRecord, BookSimilarity, BorrowRecord
+
+WATERMARK_KEY = 'recommendations:last_borrow_id'
+ROW_CHUNK_SIZE = 1000
+
+
+def load_matrix(**filters):
+    """ماتریس دودویی کتاب×عضو و آرایه شناسه کتاب‌ها برای هر سطر؛ filters روی امانت‌ها اعمال می‌شود"""
+    import numpy as np
+    from scipy import sparse
+
+    pairs = []
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        pairs.extend(
+            model.objects.filter(**filters).order_by().values_list('book_id', 'member_id').iterator(chunk_size=10000)
+        )
+    if not pairs:
+        return np.array([], dtype=np.int64), sparse.csr_matrix((0, 0))
+
+    pairs = np.array(pairs, dtype=np.int64)
+    book_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    _, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(book_ids), columns.max() + 1),
+    )
+    # چند امانت یک عضو از یک کتاب فقط یک بار حساب می‌شود
+    matrix.data[:] = 1
+    return book_ids, matrix
+
+
+def _related(field, lookup, values):
+    """مقادیر field در امانت‌های جاری و بایگانی که lookup آن‌ها در values است"""
+    result = set()
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        result.update(
+            model.objects.filter(**{f'{lookup}__in': values}).order_by().values_list(field, flat=True).distinct()
+        )
+    return result
+
+
+def _co_borrowed(book_ids):
+    """کتاب‌هایی که دست‌کم یک امانت‌گیرنده مشترک با یکی از book_ids دارند (شامل خودشان)"""
+    return _related('book_id', 'member_id', _related('member_id', 'book_id', book_ids))
+
+
+def top_k_similar(matrix, rows, top_k):
+    """{سطر: [(سطر مشابه، امتیاز), ...]} برای سطرهای خواسته‌شده"""
+    import numpy as np
+
+    norms = np.sqrt(np.asarray(matrix.getnnz(axis=1), dtype=np.float32))
+    transposed = matrix.T.tocsr()
+    result = {}
+    for start in range(0, len(rows), ROW_CHUNK_SIZE):
+        chunk = rows[start:start + ROW_CHUNK_SIZE]
+        co_counts = (matrix[chunk] @ transposed).tocsr()
+        for offset, row in enumerate(chunk):
+            begin, end = co_counts.indptr[offset], co_counts.indptr[offset + 1]
+            others = co_counts.indices[begin:end]
+            scores = co_counts.data[begin:end] / (norms[row] * norms[others])
+            keep = others != row
+            others, scores = others[keep], scores[keep]
+            if len(others) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                others, scores = others[best], scores[best]
+            order = np.lexsort((others, -scores))
+            result[row] = list(zip(others[order].tolist(), scores[order].tolist()))
+    return result
+
+
+def _store(book_ids, similar):
+    with transaction.atomic():
+        BookSimilarity.objects.filter(book_id__in=[int(book_ids[row]) for row in similar]).delete()
+        BookSimilarity.objects.bulk_create(
+            [
+                BookSimilarity(
+                    book_id=int(book_ids[row]),
+                    similar_book_id=int(book_ids[other]),
+                    rank=rank,
+                    score=score,
+                )
+                for row, neighbours in similar.items()
+                for rank, (other, score) in enumerate(neighbours, 1)
+            ],
+            batch_size=5000,
+        )
+
+
+def build_recommendations(top_k=None):
+    """محاسبه کامل برای همه کتاب‌ها؛ تعداد کتاب‌های پردازش‌شده را برمی‌گرداند"""
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    watermark = BorrowRecord.objects.aggregate(last=Max('pk'))['last'] or 0
+    book_ids, matrix = load_matrix()
+    similar = top_k_similar(matrix, list(range(len(book_ids))), top_k)
+    with transaction.atomic():
+        BookSimilarity.objects.exclude(book_id__in=book_ids.tolist()).delete()
+        _store(book_ids, similar)
+    cache.set(WATERMARK_KEY, watermark, None)
+    return len(similar)
+
+
+def refresh_recommendations(top_k=None):
+    """
+    به‌روزرسانی فقط کتاب‌هایی که از آخرین اجرا امانت جدید بر شباهتشان اثر گذاشته است
+
+    امانت جدید عضو m از کتاب b شباهت b را با همه کتاب‌های قبلی m و با تغییر نرم b
+    امتیاز هر کتاب هم‌امانت با b را تغییر می‌دهد؛ پس سطر همه کتاب‌های هم‌امانت با
+    کتاب‌های جدید دوباره محاسبه می‌شود. برای شمارش هم‌امانتی و نرم دقیق این سطرها
+    فقط امانت‌های کتاب‌های هم‌امانت با آن‌ها خوانده می‌شود، نه کل سوابق.
+    """
+    import numpy as np
+
+    watermark = cache.get(WATERMARK_KEY)
+    if watermark is None:
+        return build_recommendations(top_k)
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+
+    new_loans = BorrowRecord.objects.filter(pk__gt=watermark)
+    last = new_loans.aggregate(last=Max('pk'))['last']
+    if last is None:
+        return 0
+    affected = _co_borrowed(set(new_loans.values_list('book_id', flat=True)))
+
+    book_ids, matrix = load_matrix(book_id__in=_co_borrowed(affected))
+    rows = np.flatnonzero(np.isin(book_ids, list(affected))).tolist()
+    _store(book_ids, top_k_similar(matrix, rows, top_k))
+    cache.set(WATERMARK_KEY, last, None)
+    return len(rows)
+
+
+def similar_books(book_id):
+    """کتاب‌های مشابه ذخیره‌شده با یک کوئری روی ایندکس (book, rank)"""
+    return (
+        BookSimilarity.objects
+        .filter(book_id=book_id)
+        .select_related('similar_book')
+        .order_by('rank')
+    )
@@ -1,10 +1,7 @@
-from django.db.models import Count
-from .models import Book
+from .archive import with_total_borrow_count
 
 def get_popular_books(limit=10):
     """
-    لیست پرامانت‌ترین کتاب‌ها را برمی‌گرداند
+    لیست پرامانت‌ترین کتاب‌ها را برمی‌گرداند (شامل سوابق بایگانی‌شده)
     """
-    return Book.objects.annotate(
-        borrow_count=Count('borrowrecord')
-    ).order_by('-borrow_count')[:limit]
\ No newline at end of file
+    return with_total_borrow_count().order_by('-borrow_count')[:limit]
\ No newline at end of file
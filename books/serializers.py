@@ -1,38 +1,138 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from .models import Book, Member, BorrowRecord, Genre
+from .models import Book, Member, BorrowRecord, Copy, FineEntry, Genre, BookSimilarity, Reservation
+from . import trending
+from .expand import Expansion, ExpandableSerializerMixin
+from .archive import borrow_history
+from .recommendations import similar_books
 from django.utils import timezone
 
 class GenreSerializer(serializers.ModelSerializer):
+    # فقط در GenreViewSet annotate می‌شود؛ در ژانر تودرتوی کتاب حذف می‌شود
+    book_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Genre
         fields = ['id', 'name', 'parent', 'book_count']
         read_only_fields = ['book_count']
 
-class BookSerializer(serializers.ModelSerializer):
+ACTIVE_RESERVATIONS = ['pending', 'approved']
+
+
+def _member_summary(member):
+    return {'id': member.pk, 'member_id': member.member_id, 'full_name': f"{member.first_name} {member.last_name}"}
+
+
+def _book_summary(book):
+    return {'id': book.pk, 'title': book.title, 'authors': book.authors, 'isbn': book.isbn, 'available': book.available}
+
+
+def _reservation_summary(reservation):
+    return {
+        'id': reservation.pk, 'book': reservation.book_id, 'member': reservation.member_id,
+        'status': reservation.status, 'reservation_date': reservation.reservation_date,
+        'expiration_date': reservation.expiration_date,
+    }
+
+
+def _forecast_annotations():
+    """نزدیک‌ترین موعد بازگشت و طول صف رزرو با زیرکوئری (بدون ضرب سطرها در join)"""
+    waiting = (
+        Reservation.objects.filter(book=OuterRef('pk'), status__in=ACTIVE_RESERVATIONS)
+        .order_by().values('book').annotate(count=Count('pk')).values('count')
+    )
+    return {
+        'expanded_next_return': Subquery(
+            BorrowRecord.objects.filter(book=OuterRef('pk'), returned=False)
+            .order_by('due_date').values('due_date')[:1]
+        ),
+        'expanded_waiting': Coalesce(Subquery(waiting), 0),
+    }
+
+
+def _forecast(book):
+    return {'available': book.available, 'next_return': book.expanded_next_return, 'waiting': book.expanded_waiting}
+
+
+class BookSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
     genre = GenreSerializer(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    trending = serializers.SerializerMethodField()
     
     class Meta:
         model = Book
         fields = [
-            'id', 'title', 'author', 'isbn', 'genre', 'quantity', 'available',
-            'status', 'status_display', 'description', 'publisher', 'publish_year',
-            'cover', 'pages', 'created_at', 'updated_at'
+            'id', 'title', 'authors', 'isbn', 'genre', 'quantity', 'available',
+            'status', 'status_display', 'description', 'publisher', 'publication_year',
+            'cover', 'pages', 'trending', 'created_at', 'updated_at'
         ]
         read_only_fields = ['available', 'created_at', 'updated_at']
 
+    def validate_quantity(self, value):
+        book = self.instance
+        if book is None or value == book.quantity:
+            return value
+        # برای کتاب‌های دارای نسخه، تعداد کل از نسخه‌ها محاسبه می‌شود (recount_copies)
+        if book.copies.exists():
+            raise serializers.ValidationError('Quantity is derived from copies; add or remove copies instead')
+        open_loans = book.borrow_records.filter(returned=False).count()
+        if value < open_loans:
+            raise serializers.ValidationError(f'Quantity cannot be below the {open_loans} open loans')
+        return value
+
+    def get_trending(self, obj):
+        # امتیاز زوال‌یافته تا اکنون؛ تقریباً تعداد امانت‌های یک نیمه‌عمر اخیر
+        return round(trending.current(obj.trending_score), 3)
+
+    expansions = {
+        'genre': Expansion(lambda genre: GenreSerializer(genre).data, select='genre'),
+        'genre.parent': Expansion(lambda genre: GenreSerializer(genre).data, select='parent'),
+        'borrow_history': Expansion(
+            lambda record: BorrowRecordSerializer(record).data,
+            prefetch=('borrow_records', lambda: BorrowRecord.objects.select_related('member').order_by('-borrow_date', '-pk')),
+        ),
+        'borrow_history.member': Expansion(_member_summary, select='member'),
+        'reservations': Expansion(
+            _reservation_summary,
+            prefetch=('reservations', lambda: Reservation.objects.filter(status__in=ACTIVE_RESERVATIONS).order_by('reservation_date')),
+        ),
+        'reservations.member': Expansion(_member_summary, select='member'),
+        'copies': Expansion(
+            lambda copy: {'barcode': copy.barcode, 'status': copy.status, 'location': copy.location},
+            prefetch=('copies', lambda: Copy.objects.order_by('barcode')),
+        ),
+        'forecast': Expansion(_forecast, annotate=_forecast_annotations),
+    }
+
+class SimilarBookSerializer(serializers.ModelSerializer):
+    """نمایش فشرده کتاب مشابه به‌همراه امتیاز شباهت"""
+    id = serializers.IntegerField(source='similar_book.id')
+    title = serializers.CharField(source='similar_book.title')
+    authors = serializers.CharField(source='similar_book.authors')
+    available = serializers.IntegerField(source='similar_book.available')
+
+    class Meta:
+        model = BookSimilarity
+        fields = ['id', 'title', 'authors', 'available', 'score']
+
 class BookDetailSerializer(BookSerializer):
     borrow_history = serializers.SerializerMethodField()
+    also_borrowed = serializers.SerializerMethodField()
     
     class Meta(BookSerializer.Meta):
-        fields = BookSerializer.Meta.fields + ['borrow_history']
+        fields = BookSerializer.Meta.fields + ['borrow_history', 'also_borrowed']
     
     def get_borrow_history(self, obj):
         # نمایش 5 امانت آخر
         borrows = obj.borrow_records.order_by('-borrow_date')[:5]
         return BorrowRecordSerializer(borrows, many=True).data
 
-class MemberSerializer(serializers.ModelSerializer):
+    def get_also_borrowed(self, obj):
+        # اعضایی که این کتاب را گرفتند، این‌ها را هم گرفتند
+        return SimilarBookSerializer(similar_books(obj.pk)[:5], many=True).data
+
+class MemberSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     
     class Meta:
@@ -40,8 +140,21 @@ class MemberSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'first_name', 'last_name', 'full_name', 'member_id', 'student_id',
             'member_type', 'phone', 'email', 'membership_start', 'membership_end',
-            'active', 'max_borrow_limit', 'notes'
+            'active', 'max_borrow_limit', 'fine_balance', 'notes'
         ]
+
+    expansions = {
+        'loans': Expansion(
+            lambda record: BorrowRecordSerializer(record).data,
+            prefetch=('borrow_records', lambda: BorrowRecord.objects.filter(returned=False).select_related('book').order_by('due_date')),
+        ),
+        'loans.book': Expansion(_book_summary, select='book'),
+        'reservations': Expansion(
+            _reservation_summary,
+            prefetch=('reservations', lambda: Reservation.objects.filter(status__in=ACTIVE_RESERVATIONS).order_by('reservation_date')),
+        ),
+        'reservations.book': Expansion(_book_summary, select='book'),
+    }
     
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
@@ -53,8 +166,9 @@ class MemberBorrowHistorySerializer(MemberSerializer):
         fields = MemberSerializer.Meta.fields + ['borrow_records']
     
     def get_borrow_records(self, obj):
-        borrows = obj.borrow_records.order_by('-borrow_date')
-        return BorrowRecordSerializer(borrows, many=True).data
+        # سوابق جاری و بایگانی‌شده با هم
+        borrows = borrow_history(member=obj)
+        return BorrowHistorySerializer(borrows, many=True).data
 
 class BorrowRecordSerializer(serializers.ModelSerializer):
     book_title = serializers.CharField(source='book.title', read_only=True)
@@ -66,9 +180,9 @@ class BorrowRecordSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'book', 'book_title', 'member', 'member_name',
             'borrow_date', 'due_date', 'returned', 'return_date',
-            'fine', 'renewal_count', 'notes', 'days_overdue'
+            'fine_amount', 'renewal_count', 'notes', 'days_overdue'
         ]
-        read_only_fields = ['fine', 'days_overdue']
+        read_only_fields = ['fine_amount', 'days_overdue']
     
     def get_member_name(self, obj):
         return f"{obj.member.first_name} {obj.member.last_name}"
@@ -78,4 +192,32 @@ class BorrowRecordSerializer(serializers.ModelSerializer):
             return (obj.return_date - obj.due_date).days
         elif not obj.returned and timezone.now().date() > obj.due_date:
             return (timezone.now().date() - obj.due_date).days
-        return 0
\ No newline at end of file
+        return 0
+
+class FineEntrySerializer(serializers.ModelSerializer):
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+
+    class Meta:
+        model = FineEntry
+        fields = ['id', 'kind', 'kind_display', 'amount', 'record_id', 'note', 'created_at']
+
+class BorrowHistorySerializer(serializers.Serializer):
+    """سطرهای تاریخچه امانت از هر دو جدول جاری و بایگانی (خروجی borrow_history)"""
+    id = serializers.IntegerField(source='record_id')
+    book = serializers.IntegerField(source='book_id')
+    book_title = serializers.CharField()
+    member = serializers.IntegerField(source='member_id')
+    member_name = serializers.SerializerMethodField()
+    copy = serializers.IntegerField(source='copy_id', allow_null=True)
+    borrow_date = serializers.DateField()
+    due_date = serializers.DateField()
+    returned = serializers.BooleanField()
+    return_date = serializers.DateField()
+    fine_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    renewal_count = serializers.IntegerField()
+    notes = serializers.CharField()
+    archived = serializers.BooleanField()
+
+    def get_member_name(self, obj):
+        return f"{obj['member_first_name']} {obj['member_last_name']}"
+
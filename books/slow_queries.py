@@ -0,0 +1,202 @@
+"""
+ثبت کوئری‌های کند همراه با fingerprint و پلن اجرای EXPLAIN
+
+یک execute wrapper روی هر اتصال پایگاه داده نصب می‌شود. کوئری‌هایی که از
+SLOW_QUERY_THRESHOLD_MS کندتر باشند لاگ می‌شوند و برای گرفتن EXPLAIN و
+به‌روزرسانی آمار تجمعی در یک صف به thread پس‌زمینه سپرده می‌شوند تا
+درخواست منتظر آن نماند.
+"""
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+_EXPLAINABLE = ('select', 'update', 'delete', 'insert', 'with')
+
+
+def normalize_sql(sql):
+    """حذف مقادیر ثابت تا کوئری‌های هم‌شکل یکی شوند"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_LIST_RE.sub('(?)', sql.replace('%s', '?'))
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize_sql(sql).encode('utf-8')).hexdigest()
+
+
+def find_origin():
+    """نزدیک‌ترین فریم از کد پروژه (view یا تابع فراخواننده) به‌همراه شماره خط"""
+    base_dir = str(settings.BASE_DIR)
+    this_file = os.path.abspath(__file__)
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename.startswith(base_dir)
+            and filename != this_file
+            and 'site-packages' not in filename
+        ):
+            relative = os.path.relpath(filename, base_dir)
+            return f'{relative}:{frame.lineno} in {frame.name}'
+    return ''
+
+
+def explain(alias, sql, params):
+    """گرفتن پلن اجرای کوئری بدون اجرای واقعی آن"""
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE off) '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(
+            ' '.join(str(column) for column in row) for row in cursor.fetchall()
+        )
+
+
+def record(entry):
+    """به‌روزرسانی آمار تجمعی بر اساس fingerprint (در thread پس‌زمینه اجرا می‌شود)"""
+    from .models import SlowQuery
+
+    plan = ''
+    if entry['explain']:
+        try:
+            plan = explain(entry['alias'], entry['sql'], entry['params'])
+        except Exception as e:
+            plan = f'EXPLAIN failed: {e}'
+
+    slow_query, created = SlowQuery.objects.get_or_create(
+        fingerprint=entry['fingerprint'],
+        defaults={
+            'normalized_sql': entry['normalized_sql'],
+            'sample_sql': entry['sql'],
+            'calls': 1,
+            'total_time': entry['duration'],
+            'max_time': entry['duration'],
+            'last_origin': entry['origin'],
+            'last_seen': entry['timestamp'],
+            'plan': plan,
+        }
+    )
+    if created:
+        return
+
+    updates = {
+        'calls': F('calls') + 1,
+        'total_time': F('total_time') + entry['duration'],
+        'max_time': Greatest('max_time', entry['duration']),
+        'last_origin': entry['origin'],
+        'last_seen': entry['timestamp'],
+        'sample_sql': entry['sql'],
+    }
+    if plan:
+        updates['plan'] = plan
+    SlowQuery.objects.filter(pk=slow_query.pk).update(**updates)
+
+
+class SlowQueryWorker:
+    """صف و thread پس‌زمینه برای EXPLAIN و ذخیره آمار"""
+
+    def __init__(self):
+        self._queue = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry):
+        if self._queue is None:
+            self._start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.debug('slow query queue full, dropping %s', entry['fingerprint'])
+
+    def _start(self):
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.Queue(maxsize=getattr(settings, 'SLOW_QUERY_QUEUE_SIZE', 1000))
+            thread = threading.Thread(target=self._run, name='slow-query-worker', daemon=True)
+            thread.start()
+
+    def _run(self):
+        _local.disabled = True
+        while True:
+            entry = self._queue.get()
+            try:
+                record(entry)
+            except Exception:
+                logger.exception('failed to record slow query %s', entry['fingerprint'])
+            finally:
+                connections.close_all()
+
+
+worker = SlowQueryWorker()
+
+
+class SlowQueryLogger:
+    """execute wrapper که کوئری‌های کندتر از آستانه را ثبت می‌کند"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if (
+                duration >= getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200)
+                and not getattr(_local, 'disabled', False)
+            ):
+                self.log(sql, params, many, duration)
+
+    def log(self, sql, params, many, duration):
+        normalized = normalize_sql(sql)
+        entry = {
+            'alias': self.alias,
+            'sql': sql,
+            'params': params,
+            'normalized_sql': normalized,
+            'fingerprint': fingerprint(sql),
+            'duration': duration,
+            'origin': find_origin(),
+            'timestamp': timezone.now(),
+            'explain': (
+                not many
+                and getattr(settings, 'SLOW_QUERY_EXPLAIN', True)
+                and sql.lstrip().lower().startswith(_EXPLAINABLE)
+            ),
+        }
+        logger.warning(
+            'slow query %.1fms [%s] %s: %s',
+            duration, entry['fingerprint'], entry['origin'], normalized
+        )
+        worker.submit(entry)
+
+
+def install(sender, connection, **kwargs):
+    """نصب wrapper روی اتصال تازه (گیرنده سیگنال connection_created)"""
+    if not any(isinstance(w, SlowQueryLogger) for w in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger(connection.alias))
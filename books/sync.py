@@ -0,0 +1,115 @@
+"""
+همگام‌سازی تدریجی کاتالوگ برای کیوسک‌های شعب و کلاینت‌های آفلاین
+
+کلاینت توکن همگام‌سازی را نگه می‌دارد و فقط تغییرات پس از آن را می‌گیرد:
+کتاب‌ها و ژانرهای تغییر کرده (بر اساس updated_at) و حذف‌ها (جدول Tombstone).
+هر جریان با مکان‌نمای (updated_at, id) به ترتیب پایدار صفحه‌بندی می‌شود.
+
+ردیف‌هایی که در SYNC_SAFETY_LAG ثانیه اخیر تغییر کرده‌اند هنوز برگردانده نمی‌شوند
+تا تراکنشی که زودتر شروع شده ولی دیرتر commit می‌شود از قلم نیفتد.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Book, Genre, Tombstone
+
+TOKEN_SALT = 'books.sync'
+
+BOOK_FIELDS = [
+    'id', 'title', 'authors', 'isbn', 'genre_id', 'publisher', 'publication_year',
+    'quantity', 'available', 'status', 'updated_at',
+]
+GENRE_FIELDS = ['id', 'name', 'parent_id', 'updated_at']
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(InvalidToken):
+    pass
+
+
+def encode_token(cursors):
+    return signing.dumps({'c': cursors, 'at': timezone.now().timestamp()}, salt=TOKEN_SALT, compress=True)
+
+
+def decode_token(token):
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidToken('Invalid sync token')
+    issued = datetime.fromtimestamp(data['at'], tz=timezone.get_current_timezone())
+    # توکن قدیمی‌تر از نگهداری tombstone ها ممکن است حذف‌هایی را از دست بدهد
+    if issued < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise ExpiredToken('Sync token expired, full resync required')
+    return data['c']
+
+
+def initial_cursors():
+    """مکان‌نمای شروع؛ همگام‌سازی کامل حذف‌های گذشته را لازم ندارد"""
+    return {
+        'books': None,
+        'genres': None,
+        'deleted': Tombstone.objects.aggregate(last=Max('id'))['last'] or 0,
+    }
+
+
+def _page(queryset, fields, cursor, upper, limit):
+    if cursor is not None:
+        after = datetime.fromisoformat(cursor[0])
+        queryset = queryset.filter(Q(updated_at__gt=after) | Q(updated_at=after, id__gt=cursor[1]))
+    rows = list(
+        queryset.filter(updated_at__lte=upper)
+        .order_by('updated_at', 'id')
+        .values(*fields)[:limit]
+    )
+    if rows:
+        cursor = [rows[-1]['updated_at'].isoformat(), rows[-1]['id']]
+    return rows, cursor
+
+
+def changes(token=None, limit=None):
+    """
+    تغییرات پس از token
+
+    {'books', 'genres', 'deleted', 'next_token', 'has_more'} را برمی‌گرداند؛
+    کلاینت تا وقتی has_more برقرار است با next_token ادامه می‌دهد.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    cursors = decode_token(token) if token else initial_cursors()
+    upper = timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_LAG)
+
+    books, cursors['books'] = _page(Book.objects.all(), BOOK_FIELDS, cursors['books'], upper, limit)
+    genres, cursors['genres'] = _page(Genre.objects.all(), GENRE_FIELDS, cursors['genres'], upper, limit)
+    deleted = list(
+        Tombstone.objects
+        .filter(id__gt=cursors['deleted'], deleted_at__lte=upper)
+        .order_by('id')
+        .values('id', 'model_name', 'object_id')[:limit]
+    )
+    if deleted:
+        cursors['deleted'] = deleted[-1]['id']
+
+    return {
+        'books': books,
+        'genres': genres,
+        'deleted': [{'type': row['model_name'], 'id': row['object_id']} for row in deleted],
+        'next_token': encode_token(cursors),
+        'has_more': limit in (len(books), len(genres), len(deleted)),
+    }
+
+
+def record_deletion(sender, instance, **kwargs):
+    """گیرنده post_delete کتاب و ژانر"""
+    Tombstone.objects.create(model_name=sender._meta.model_name, object_id=instance.pk)
+
+
+def purge_tombstones():
+    """حذف tombstone های قدیمی‌تر از دوره نگهداری توکن‌ها"""
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    return Tombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
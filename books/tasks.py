@@ -0,0 +1,152 @@
+"""
+تسک‌های پس‌زمینه Celery
+
+کارهای سنگین (بک‌آپ، محاسبه جریمه، پردازش جلد، گزارش‌ها، ایمیل و ...) از
+چرخه درخواست خارج شده و این‌جا اجرا می‌شوند. از view ها با enqueue صدا زده
+می‌شوند تا فقط پس از commit تراکنش در صف قرار بگیرند.
+"""
+import logging
+from io import BytesIO
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+POPULAR_REPORT_KEY = 'reports:popular_books'
+
+
+def enqueue(task, *args, **kwargs):
+    """ارسال تسک به صف پس از commit تراکنش جاری"""
+    transaction.on_commit(lambda: task.delay(*args, **kwargs))
+
+
+@shared_task
+def backup_database():
+    """بک‌آپ JSON همه مدل‌ها (دستور backup)"""
+    call_command('backup')
+
+
+@shared_task
+def recompute_fines(batch_size=1000):
+    """
+    محاسبه دوباره جریمه سوابق برگشت‌داده‌شده با تأخیر
+
+    اختلاف جریمه هر سابقه با جمع سطرهای دفتر همان سابقه به‌صورت جریمه یا بخشودگی
+    ثبت می‌شود تا مانده اعضا درست بماند (fines.settle).
+    """
+    from django.db.models import F
+    from . import fines
+    from .models import BorrowRecord
+
+    def flush(batch):
+        with transaction.atomic():
+            count = BorrowRecord.objects.bulk_update([record for record, _ in batch], ['fine_amount'])
+            fines.settle(batch, note='محاسبه دوباره جریمه')
+        return count
+
+    updated = 0
+    batch = []
+    # نوع عضو و ژانر کتاب برای قواعد سیاست امانت با همان کوئری خوانده می‌شوند
+    records = BorrowRecord.objects.filter(
+        returned=True, return_date__gt=F('due_date')
+    ).select_related('member', 'book').only(
+        'pk', 'returned', 'return_date', 'due_date', 'fine_amount', 'member__member_type', 'book__genre'
+    )
+    for record in records.iterator(chunk_size=batch_size):
+        previous = record.fine_amount
+        record.calculate_fine()
+        if record.fine_amount != previous:
+            batch.append((record, previous))
+        if len(batch) >= batch_size:
+            updated += flush(batch)
+            batch = []
+    if batch:
+        updated += flush(batch)
+    return updated
+
+
+@shared_task
+def process_cover(book_id):
+    """کوچک‌کردن تصویر جلد به حداکثر ابعاد مجاز و ذخیره به‌صورت JPEG"""
+    from PIL import Image
+    from .models import Book
+
+    book = Book.objects.filter(pk=book_id).only('pk', 'title', 'cover').first()
+    if book is None or not book.cover:
+        return
+    max_size = settings.COVER_MAX_SIZE
+    with book.cover.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    if image.width <= max_size[0] and image.height <= max_size[1]:
+        return
+    image.thumbnail(max_size)
+    output = BytesIO()
+    image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+    old_name = book.cover.name
+    book.cover.save(f'{book.pk}.jpg', ContentFile(output.getvalue()), save=False)
+    # فقط ستون cover به‌روزرسانی می‌شود تا موجودی و وضعیت دست نخورند
+    Book.objects.filter(pk=book.pk).update(cover=book.cover.name, updated_at=timezone.now())
+    if old_name != book.cover.name:
+        book.cover.storage.delete(old_name)
+
+
+@shared_task
+def generate_popular_report(limit=50):
+    """محاسبه گزارش کتاب‌های پرامانت و نگهداری آن در کش"""
+    from .reports import get_popular_books
+
+    report = [
+        {'id': book.pk, 'title': book.title, 'authors': book.authors, 'borrow_count': book.borrow_count}
+        for book in get_popular_books(limit)
+    ]
+    cache.set(POPULAR_REPORT_KEY, report, None)
+    return len(report)
+
+
+@shared_task
+def archive_borrow_records():
+    from .archive import archive_borrow_records as archive
+
+    return archive()
+
+
+@shared_task
+def refresh_recommendations():
+    from .recommendations import refresh_recommendations as refresh
+
+    return refresh()
+
+
+@shared_task
+def reconcile_inventory(fix=True):
+    from .inventory import reconcile_inventory as reconcile
+
+    return len(reconcile(fix=fix))
+
+
+@shared_task
+def reconcile_fines(fix=True):
+    from .fines import reconcile_fines as reconcile
+
+    return len(reconcile(fix=fix))
+
+
+@shared_task
+def purge_tombstones():
+    from .sync import purge_tombstones as purge
+
+    return purge()
+
+
+@shared_task
+def send_notifications():
+    from .notifications import send_notifications as send
+
+    return send()
@@ -1,7 +1,51 @@
-from django.test import TestCase
+import io
+import time
+from unittest import mock
 
 from django.test import TestCase
-from .models import Book
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from library import db_router, log, metrics, throttling
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.core import mail
+from django.core.cache import cache
+from . import (
+    admin as books_admin, archive, autocomplete, availability, circulation, directory, events, facets, fines, inventory,
+    notifications, pagination, policies, recommendations, slow_queries, sync, tasks, trending,
+)
+from .views import BookViewSet
+from .models import (
+    ArchivedBorrowRecord, Book, BookSimilarity, BorrowRecord, CirculationEvent, Closure, ConsumerOffset, Copy, FineEntry, Genre,
+    LoanPolicy, Member, Notification, Reservation, SlowQuery,
+)
+
+
+def make_book(**kwargs):
+    defaults = {
+        'title': 'کتاب تست', 'authors': 'نویسنده تست', 'publisher': 'ناشر تست',
+        'publication_year': 2000, 'pages': 100,
+    }
+    defaults.update(kwargs)
+    defaults.setdefault('isbn', f"isbn-{Book.objects.count() + 1}")
+    return Book.objects.create(**defaults)
+
+
+def make_member(**kwargs):
+    defaults = {
+        'first_name': 'علی', 'last_name': 'رضایی', 'email': 'member@example.com',
+        'membership_end': timezone.now().date() + timezone.timedelta(days=365),
+    }
+    defaults.update(kwargs)
+    defaults.setdefault('member_id', f"M{Member.objects.count() + 1}")
+    return Member.objects.create(**defaults)
+
+
+def make_borrow(book, member, **kwargs):
+    return BorrowRecord.objects.create(
+        book=book, member=member, borrow_date=timezone.now().date(), **kwargs
+    )
 
 class BookTestCase(TestCase):
     def setUp(self):
@@ -10,3 +54,1073 @@ class BookTestCase(TestCase):
     def test_book_creation(self):
         book = Book.objects.get(title="کتاب تست")
         self.assertEqual(book.author, "نویسنده تست")
+
+
+class MetricsTestCase(TestCase):
+    def test_histogram_exposition(self):
+        registry = metrics.Registry()
+        latency = registry.histogram('test_latency_seconds', 'test', ['route'], buckets=(0.1, 1.0))
+        latency.observe(0.05, route='books/')
+        latency.observe(0.5, route='books/')
+        text = registry.render()
+        self.assertIn('test_latency_seconds_bucket{route="books/",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{route="books/",le="+Inf"} 2', text)
+        self.assertIn('test_latency_seconds_count{route="books/"} 2', text)
+
+    def test_multiprocess_snapshots_are_merged(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            registry = metrics.Registry()
+            counter = registry.counter('test_total', 'test', ['event'])
+            counter.inc(event='checkout')
+            with open(f'{directory}/metrics-other-worker.json', 'w') as f:
+                f.write('{"test_total": {"[\\"checkout\\"]": 2}}')
+            self.assertIn('test_total{event="checkout"} 3', registry.render())
+
+    def test_endpoint_is_local_only(self):
+        request = RequestFactory().get('/metrics/', REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(metrics.metrics_view(request).status_code, 403)
+        request = RequestFactory().get('/metrics/', REMOTE_ADDR='127.0.0.1')
+        self.assertIn(b'# TYPE http_request_duration_seconds histogram', metrics.metrics_view(request).content)
+
+
+class SlowQueryTestCase(TestCase):
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            slow_queries.fingerprint("SELECT * FROM books_book WHERE id IN (%s, %s, %s) AND title = 'a'"),
+            slow_queries.fingerprint("SELECT * FROM books_book WHERE id IN (%s)  AND title = 'bb'"),
+        )
+
+    def test_record_aggregates_by_fingerprint(self):
+        sql = 'SELECT "books_book"."id" FROM "books_book" WHERE "books_book"."title" LIKE %s'
+        for duration in (300.0, 500.0):
+            slow_queries.record({
+                'alias': 'default',
+                'sql': sql,
+                'params': ['%x%'],
+                'normalized_sql': slow_queries.normalize_sql(sql),
+                'fingerprint': slow_queries.fingerprint(sql),
+                'duration': duration,
+                'origin': 'books/views.py:1 in book_search',
+                'timestamp': timezone.now(),
+                'explain': True,
+            })
+        stat = SlowQuery.objects.get()
+        self.assertEqual(stat.calls, 2)
+        self.assertEqual(stat.max_time, 500.0)
+        self.assertEqual(stat.mean_time, 400.0)
+        self.assertTrue(stat.plan)
+
+
+class QueueLoggingTestCase(TestCase):
+    def test_records_are_written_as_json_off_thread(self):
+        import json, logging, os, tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            handler = log.QueueFileHandler(os.path.join(directory, 'test.log'))
+            logger = logging.getLogger('books.tests.queue')
+            logger.addHandler(handler)
+            try:
+                logger.warning('borrowed %s', 'x', extra={'member_id': 7})
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(os.path.join(directory, 'test.log'), encoding='utf-8') as f:
+                record = json.loads(f.readline())
+        self.assertEqual(record['message'], 'borrowed x')
+        self.assertEqual(record['member_id'], 7)
+        self.assertEqual(record['level'], 'WARNING')
+
+    def test_debug_sampling(self):
+        import logging
+        sampler = log.DebugSamplingFilter(rate=0)
+        debug = logging.LogRecord('books', logging.DEBUG, '', 0, 'x', None, None)
+        info = logging.LogRecord('books', logging.INFO, '', 0, 'x', None, None)
+        self.assertFalse(sampler.filter(debug))
+        self.assertTrue(sampler.filter(info))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRouterTestCase(SimpleTestCase):
+    def route(self, request, write=False):
+        router = db_router.ReplicaRouter()
+
+        def view(request):
+            if write:
+                router.db_for_write(Book)
+            return HttpResponse(router.db_for_read(Book))
+
+        return db_router.ReplicaRoutingMiddleware(view)(request)
+
+    def test_safe_methods_read_from_replica(self):
+        response = self.route(RequestFactory().get('/api/v1/books/'))
+        self.assertEqual(response.content, b'replica')
+
+    def test_unsafe_methods_use_primary(self):
+        response = self.route(RequestFactory().post('/api/v1/books/1/borrow/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_reads_stick_to_primary_after_write(self):
+        response = self.route(RequestFactory().post('/api/v1/books/1/borrow/'), write=True)
+        cookie = response.cookies[db_router.STICKY_COOKIE].value
+        request = RequestFactory().get('/api/v1/books/')
+        request.COOKIES[db_router.STICKY_COOKIE] = cookie
+        self.assertEqual(self.route(request).content, b'default')
+
+    def test_reads_after_write_in_same_request_use_primary(self):
+        response = self.route(RequestFactory().get('/api/v1/books/'), write=True)
+        self.assertEqual(response.content, b'default')
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(Book), 'default')
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.book = make_book()
+        self.member = make_member()
+        self.old = make_borrow(self.book, self.member, returned=True)
+        self.recent = make_borrow(self.book, self.member, returned=True)
+        self.open = make_borrow(self.book, self.member)
+        long_ago = timezone.now().date() - timezone.timedelta(days=800)
+        BorrowRecord.objects.filter(pk=self.old.pk).update(
+            borrow_date=long_ago, return_date=long_ago
+        )
+
+    def test_only_old_returned_records_are_archived(self):
+        copy = Copy.objects.create(book=self.book, barcode='A-1')
+        BorrowRecord.objects.filter(pk=self.old.pk).update(copy=copy)
+        self.assertEqual(archive.archive_borrow_records(older_than_days=365, batch_size=1), 1)
+        self.assertFalse(BorrowRecord.objects.filter(pk=self.old.pk).exists())
+        archived = ArchivedBorrowRecord.objects.get()
+        self.assertEqual((archived.original_id, archived.copy_id), (self.old.pk, copy.pk))
+        self.assertEqual(BorrowRecord.objects.count(), 2)
+
+    def test_history_reads_both_tiers(self):
+        archive.archive_borrow_records(older_than_days=365)
+        history = list(archive.borrow_history(member=self.member))
+        self.assertEqual(
+            [row['record_id'] for row in history][-1], self.old.pk
+        )
+        self.assertEqual([row['archived'] for row in history], [False, False, True])
+        self.assertEqual(archive.with_total_borrow_count().get(pk=self.book.pk).borrow_count, 3)
+
+
+class AutocompleteTestCase(TestCase):
+    def setUp(self):
+        self.index = autocomplete.AutocompleteIndex()
+        self.index.load([
+            (1, 'شازده كوچولو', 'آنتوان دو سنت‌اگزوپری', 'نشر الف', 3),
+            (2, 'شاهنامه', 'فردوسی', 'نشر ب', 10),
+            (3, 'Clean Code', 'Robert Martin', 'Prentice Hall', 1),
+        ])
+
+    def test_prefix_matches_any_word_and_ranks_by_popularity(self):
+        self.assertEqual([s['id'] for s in self.index.search('شا')], [2, 1])
+        self.assertEqual([s['id'] for s in self.index.search('کوچ')], [1])
+        self.assertEqual([s['id'] for s in self.index.search('MART')], [3])
+
+    def test_incremental_update_and_remove(self):
+        book = Book(pk=3, title='Refactoring', authors='Martin Fowler', publisher='AW')
+        self.index.update(book)
+        self.assertEqual(self.index.search('clean'), [])
+        self.assertEqual([s['id'] for s in self.index.search('refac')], [3])
+        self.index.remove(3)
+        self.assertEqual(self.index.search('fowler'), [])
+
+    def test_endpoint_does_not_query_database(self):
+        make_book(title='شاهنامه فردوسی')
+        autocomplete.index.rebuild()
+        view = BookViewSet.as_view({'get': 'autocomplete'})
+        request = APIRequestFactory().get('/api/v1/books/autocomplete/', {'q': 'شاه'})
+        with self.assertNumQueries(0):
+            response = view(request)
+        self.assertEqual(response.data[0]['title'], 'شاهنامه فردوسی')
+
+
+class RecommendationTestCase(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c = make_book(), make_book(), make_book()
+        self.m1, self.m2 = make_member(), make_member()
+        make_borrow(self.a, self.m1)
+        make_borrow(self.b, self.m1)
+        make_borrow(self.a, self.m2)
+
+    def test_build_and_incremental_refresh(self):
+        recommendations.build_recommendations(top_k=5)
+        self.assertEqual(
+            [s.similar_book_id for s in recommendations.similar_books(self.a.pk)], [self.b.pk]
+        )
+        self.assertFalse(BookSimilarity.objects.filter(book=self.c).exists())
+
+        make_borrow(self.c, self.m2)
+        recommendations.refresh_recommendations(top_k=5)
+        self.assertEqual(
+            [s.similar_book_id for s in recommendations.similar_books(self.c.pk)], [self.a.pk]
+        )
+        self.assertEqual(
+            {s.similar_book_id for s in recommendations.similar_books(self.a.pk)},
+            {self.b.pk, self.c.pk},
+        )
+
+    def test_refresh_matches_full_build_and_loads_neighbours_only(self):
+        other = make_book()
+        make_borrow(other, make_member())
+        recommendations.build_recommendations(top_k=5)
+        # عضو تازه فقط b را می‌گیرد؛ نرم b عوض می‌شود و امتیاز a با b هم باید تغییر کند
+        make_borrow(self.b, make_member())
+        with mock.patch.object(recommendations, 'load_matrix', wraps=recommendations.load_matrix) as load:
+            recommendations.refresh_recommendations(top_k=5)
+        self.assertNotIn(other.pk, load.call_args.kwargs['book_id__in'])
+        refreshed = set(BookSimilarity.objects.values_list('book_id', 'similar_book_id', 'rank', 'score'))
+        recommendations.build_recommendations(top_k=5)
+        self.assertEqual(
+            refreshed, set(BookSimilarity.objects.values_list('book_id', 'similar_book_id', 'rank', 'score'))
+        )
+
+
+class TaskTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_popular_report_is_cached(self):
+        book = make_book()
+        make_borrow(book, make_member())
+        self.assertEqual(tasks.generate_popular_report.apply(kwargs={'limit': 5}).get(), 1)
+        self.assertEqual(cache.get(tasks.POPULAR_REPORT_KEY)[0]['borrow_count'], 1)
+
+    def test_popular_is_served_from_report(self):
+        first, second = make_book(), make_book()
+        make_borrow(first, make_member())
+        view = BookViewSet.as_view({'get': 'popular'})
+        request = APIRequestFactory().get('/api/books/popular/')
+        self.assertEqual(view(request).data[0]['id'], first.pk)
+        # گزارش کش‌شده ترتیب را تعیین می‌کند و کتاب حذف‌شده نادیده گرفته می‌شود
+        cache.set(tasks.POPULAR_REPORT_KEY, [{'id': second.pk}, {'id': 0}, {'id': first.pk}])
+        request = APIRequestFactory().get('/api/books/popular/')
+        self.assertEqual([book['id'] for book in view(request).data], [second.pk, first.pk])
+
+    def test_recompute_fines(self):
+        record = make_borrow(make_book(), make_member(), returned=True)
+        BorrowRecord.objects.filter(pk=record.pk).update(
+            due_date=record.return_date - timezone.timedelta(days=2), fine_amount=0
+        )
+        self.assertEqual(tasks.recompute_fines.apply().get(), 1)
+        record.refresh_from_db()
+        self.assertEqual(record.fine_amount, 10000)
+
+    def test_enqueue_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tasks.enqueue(tasks.generate_popular_report, limit=1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNotNone(cache.get(tasks.POPULAR_REPORT_KEY))
+
+
+class NotificationTestCase(TestCase):
+    def setUp(self):
+        self.member = make_member()
+        past = timezone.now().date() - timezone.timedelta(days=30)
+        self.records = [make_borrow(make_book(), self.member) for _ in range(2)]
+        BorrowRecord.objects.filter(pk__in=[r.pk for r in self.records]).update(
+            borrow_date=past, due_date=past + timezone.timedelta(days=14)
+        )
+
+    def test_one_email_per_member_and_idempotent(self):
+        self.assertEqual(notifications.send_notifications(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.records[0].book.title, mail.outbox[0].body)
+        self.assertEqual(Notification.objects.filter(status='sent').count(), 2)
+
+        self.assertEqual(notifications.send_notifications(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_locale_template_and_hold(self):
+        member = make_member(language='en', email='en@example.com')
+        Reservation.objects.create(book=make_book(), member=member, status='approved')
+        notifications.send_notifications(kinds=['hold_ready'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Your reservation is ready for pickup')
+
+    def test_failed_send_is_retried(self):
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('down')):
+            self.assertEqual(notifications.send_notifications(), (0, 1))
+        self.assertEqual(Notification.objects.filter(status='failed', attempts=1).count(), 2)
+        self.assertEqual(notifications.send_notifications(), (1, 0))
+
+    def test_abandoned_claims_are_reclaimed(self):
+        notifications.queue_notifications()
+        self.assertEqual(len(notifications.claim()), 2)
+        # اجرای قبلی پس از تخصیص متوقف شده است
+        self.assertEqual(len(notifications.claim()), 0)
+        Notification.objects.update(claimed_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(notifications.send_notifications(), (1, 0))
+        self.assertEqual(Notification.objects.filter(status='sent', attempts=2).count(), 2)
+
+
+class ThrottlingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'anon': '10/min'}})
+    def test_bucket_cost_and_refill(self):
+        bucket = throttling.Bucket('anon', 'ip:1.2.3.4', 10, 60)
+        self.assertTrue(throttling.take([bucket], cost=8))
+        self.assertFalse(throttling.take([bucket], cost=5))
+        self.assertEqual(int(bucket.tokens), 2)
+        with mock.patch('library.throttling.time.time', return_value=time.time() + 30):
+            self.assertTrue(throttling.take([bucket], cost=5))
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'anon': '100/min', 'books': '4/min'}})
+    def test_view_scope_cost_and_headers(self):
+        view = BookViewSet.as_view({'get': 'list'})
+        # وزن list برابر ۲ است
+        with mock.patch.object(BookViewSet, 'throttle_classes', [throttling.TokenBucketThrottle]):
+            first = view(self.factory.get('/api/v1/books/'))
+            second = view(self.factory.get('/api/v1/books/'))
+            third = view(self.factory.get('/api/v1/books/'))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(third.status_code, 429)
+        self.assertIn('Retry-After', third)
+
+        middleware = throttling.RateLimitHeadersMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/api/v1/books/')
+        request.rate_limit_headers = {'RateLimit-Remaining': '0'}
+        self.assertEqual(middleware(request)['RateLimit-Remaining'], '0')
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {
+        'anon': '100/day', 'books': '300/min', 'autocomplete': '120/min',
+    }})
+    def test_browsing_session_is_not_throttled(self):
+        # تایپ فقط از سطل autocomplete کم می‌کند و وزن لیست فقط از سطل books؛
+        # سطل روزانه anon هر درخواست لیست را یک بار می‌شمارد
+        list_view = BookViewSet.as_view({'get': 'list'})
+        # مثل router، تنظیمات خود action (سطل autocomplete) اعمال می‌شود
+        autocomplete_view = BookViewSet.as_view({'get': 'autocomplete'}, **BookViewSet.autocomplete.kwargs)
+        clock = [time.time()]
+        words = ['شاهنامه فردوسی', 'بوف کور', 'کلیدر', 'سمفونی مردگان', 'جای خالی سلوچ'] * 10
+        with mock.patch.object(BookViewSet, 'throttle_classes', [throttling.TokenBucketThrottle]), \
+                mock.patch('library.throttling.time.time', side_effect=lambda: clock[0]):
+            # ۵۰ جستجو و بیش از ۵۰۰ کلید با سرعت تایپ معمولی (سه کلید در ثانیه) و چند ثانیه
+            # مکث برای دیدن نتایج؛ بیش از سطل روزانه anon
+            for word in words:
+                for end in range(1, len(word) + 1):
+                    response = autocomplete_view(self.factory.get('/api/v1/books/autocomplete/', {'q': word[:end]}))
+                    self.assertEqual(response.status_code, 200)
+                    clock[0] += 0.3
+                clock[0] += 5
+            for _ in range(60):
+                self.assertEqual(list_view(self.factory.get('/api/v1/books/', {'page': 1})).status_code, 200)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'anon': '2/day', 'kiosk': '4/min'}})
+    def test_kiosk_endpoints_have_their_own_bucket(self):
+        from .views import book_availability
+        statuses = [book_availability(self.factory.get('/api/v1/availability/')).status_code for _ in range(5)]
+        self.assertEqual(statuses, [200, 200, 200, 200, 429])
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'search': '5/min'}})
+    def test_plain_view_decorator(self):
+        view = throttling.throttle('search', cost=5)(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/search/')
+        request.user = mock.Mock(is_authenticated=False)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['RateLimit-Remaining'], '0')
+        self.assertEqual(view(request).status_code, 429)
+
+
+class InventoryTestCase(TestCase):
+    def test_save_keeps_available_after_creation(self):
+        book = make_book(quantity=2)
+        self.assertEqual(book.available, 2)
+        Book.objects.filter(pk=book.pk).update(available=0)
+        book.refresh_from_db()
+        book.save()
+        book.refresh_from_db()
+        self.assertEqual((book.available, book.status), (0, 'borrowed'))
+
+    def test_checkout_never_goes_negative(self):
+        book = make_book(quantity=1)
+        self.assertTrue(inventory.checkout(book.pk))
+        self.assertFalse(inventory.checkout(book.pk))
+        book.refresh_from_db()
+        self.assertEqual((book.available, book.status), (0, 'borrowed'))
+        self.assertTrue(inventory.checkin(book.pk))
+        self.assertFalse(inventory.checkin(book.pk))
+        book.refresh_from_db()
+        self.assertEqual((book.available, book.status), (1, 'available'))
+
+    def test_reconcile_reports_and_fixes(self):
+        member = make_member()
+        drifted = make_book(quantity=3)
+        make_borrow(drifted, member)
+        consistent = make_book(quantity=1)
+        make_borrow(consistent, member)
+        Book.objects.filter(pk=consistent.pk).update(available=0, status='borrowed')
+
+        mismatches = inventory.reconcile_inventory(chunk_size=1)
+        self.assertEqual([row['pk'] for row in mismatches], [drifted.pk])
+        self.assertEqual(mismatches[0]['expected_available'], 2)
+
+        inventory.reconcile_inventory(fix=True, chunk_size=1)
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.available, 2)
+        self.assertEqual(inventory.reconcile_inventory(), [])
+
+
+class AdminActionTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.admin.sites import AdminSite
+        self.site = AdminSite()
+        from django.contrib.auth.models import User
+        self.request = RequestFactory().get('/admin/')
+        self.request.user = User.objects.create_user('admin')
+        self.member = make_member()
+
+    def test_mark_returned_updates_inventory(self):
+        book = make_book(quantity=2)
+        records = [make_borrow(book, self.member) for _ in range(2)]
+        Book.objects.filter(pk=book.pk).update(available=0, status='borrowed')
+        BorrowRecord.objects.filter(pk=records[0].pk).update(
+            due_date=timezone.now().date() - timezone.timedelta(days=3)
+        )
+        admin = books_admin.BorrowRecordAdmin(BorrowRecord, self.site)
+        with mock.patch.object(admin, 'message_user'):
+            admin.mark_returned(self.request, BorrowRecord.objects.all())
+        book.refresh_from_db()
+        self.assertEqual((book.available, book.status), (2, 'available'))
+        self.assertEqual(BorrowRecord.objects.get(pk=records[0].pk).fine_amount, 15000)
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.fine_balance, 15000)
+
+    def test_renew_is_set_based(self):
+        record = make_borrow(make_book(), self.member)
+        make_borrow(make_book(), self.member)
+        admin = books_admin.BorrowRecordAdmin(BorrowRecord, self.site)
+        # savepoint، خواندن امانت‌ها با عضو و کتاب، یک UPDATE، ثبت دسته‌ای رویدادها، release
+        with mock.patch.object(admin, 'message_user'), self.assertNumQueries(5):
+            admin.renew(self.request, BorrowRecord.objects.all())
+        renewed = BorrowRecord.objects.get(pk=record.pk)
+        self.assertEqual(renewed.due_date, record.due_date + timezone.timedelta(days=14))
+        self.assertEqual(renewed.renewal_count, 1)
+
+    def test_reservation_status_keeps_unique_rows(self):
+        book = make_book()
+        old = Reservation.objects.create(book=book, member=self.member, status='canceled')
+        approved = Reservation.objects.create(book=book, member=self.member, status='approved')
+        pending = Reservation.objects.create(book=book, member=self.member, status='pending')
+        admin = books_admin.ReservationAdmin(Reservation, self.site)
+        with mock.patch.object(admin, 'message_user') as message_user:
+            admin.approve(self.request, Reservation.objects.all())
+            admin.cancel(self.request, Reservation.objects.all())
+        # تایید و لغو هر دو رد شدند و سابقه قبلی حذف نشد
+        self.assertEqual(message_user.call_count, 4)
+        self.assertEqual(
+            dict(Reservation.objects.values_list('pk', 'status')),
+            {old.pk: 'canceled', approved.pk: 'approved', pending.pk: 'pending'},
+        )
+        # بدون سابقه لغو، از دو رزرو باز فقط تازه‌ترین لغو می‌شود
+        old.delete()
+        with mock.patch.object(admin, 'message_user'):
+            admin.cancel(self.request, Reservation.objects.all())
+        self.assertEqual(
+            dict(Reservation.objects.values_list('pk', 'status')),
+            {approved.pk: 'approved', pending.pk: 'canceled'},
+        )
+
+    def test_changelist_uses_estimated_paginator(self):
+        make_book()
+        paginator = books_admin.BookAdmin(Book, self.site).get_paginator(self.request, Book.objects.all(), 50)
+        self.assertEqual(paginator.count, 1)
+        self.assertFalse(paginator.estimated)
+
+
+class EstimatedPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        for _ in range(3):
+            make_book()
+        self.view = BookViewSet.as_view({'get': 'list'})
+        self.factory = APIRequestFactory()
+
+    def test_small_lists_use_exact_count(self):
+        response = self.view(self.factory.get('/api/v1/books/', {'page_size': 2}))
+        self.assertEqual(response.data['count'], 3)
+        self.assertFalse(response.data['count_estimated'])
+        self.assertEqual(response.data['total_pages'], 2)
+
+    def test_large_lists_use_planner_estimate(self):
+        with mock.patch('books.pagination.estimated_count', return_value=50000) as estimate:
+            response = self.view(self.factory.get('/api/v1/books/', {'page_size': 2, 'page': 2}))
+        estimate.assert_called_once()
+        self.assertEqual(response.data['count'], 50000)
+        self.assertTrue(response.data['count_estimated'])
+        self.assertEqual(len(response.data['results']), 1)
+        # صفحه بعد از خود ردیف‌ها معلوم می‌شود، نه از برآورد
+        self.assertIsNone(response.data['links']['next'])
+
+    def test_filtered_lists_are_counted_exactly(self):
+        self.assertIsNone(pagination.estimated_count(Book.objects.filter(title__icontains='x')))
+        with mock.patch('books.pagination.connections') as connections:
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            response = self.view(self.factory.get('/api/v1/books/', {'page_size': 2, 'search': 'تست'}))
+        connections.__getitem__.return_value.cursor.assert_not_called()
+        self.assertEqual(response.data['count'], 3)
+        self.assertFalse(response.data['count_estimated'])
+
+
+@override_settings(SYNC_SAFETY_LAG=0)
+class SyncTestCase(TestCase):
+    def test_changes_since_token(self):
+        first = make_book()
+        second = make_book()
+        initial = sync.changes(limit=1)
+        self.assertEqual([row['id'] for row in initial['books']], [first.pk])
+        self.assertTrue(initial['has_more'])
+        page = sync.changes(initial['next_token'], limit=1)
+        self.assertEqual([row['id'] for row in page['books']], [second.pk])
+
+        done = sync.changes(page['next_token'])
+        self.assertEqual((done['books'], done['deleted'], done['has_more']), ([], [], False))
+
+        inventory.checkout(first.pk)
+        deleted_pk = second.pk
+        second.delete()
+        update = sync.changes(done['next_token'])
+        self.assertEqual([(row['id'], row['available']) for row in update['books']], [(first.pk, 0)])
+        self.assertEqual(update['deleted'], [{'type': 'book', 'id': deleted_pk}])
+
+    def test_invalid_and_expired_tokens(self):
+        from .views import sync_changes
+        cache.clear()
+        response = sync_changes(APIRequestFactory().get('/api/v1/sync/', {'since': 'garbage'}))
+        self.assertEqual(response.status_code, 400)
+        token = sync.changes()['next_token']
+        later = timezone.now() + timezone.timedelta(days=31)
+        with mock.patch('books.sync.timezone.now', return_value=later), self.assertRaises(sync.ExpiredToken):
+            sync.changes(token)
+
+
+@override_settings(EVENT_SAFETY_LAG=0)
+class EventLogTestCase(TestCase):
+    def test_book_and_reservation_changes_are_recorded(self):
+        book = make_book()
+        book.save()
+        Reservation.objects.create(book=book, member=make_member(), status='approved')
+        self.assertEqual(
+            list(CirculationEvent.objects.values_list('event_type', flat=True)),
+            ['book_created', 'book_updated', 'reservation'],
+        )
+        self.assertEqual(CirculationEvent.objects.last().data, {'status': 'approved'})
+
+    def test_consumers_track_their_own_offsets(self):
+        for _ in range(3):
+            make_book()
+        seen = []
+        self.assertEqual(events.process('search', seen.extend, batch_size=2), 3)
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(events.process('search', seen.extend), 0)
+        self.assertEqual(events.position('search'), CirculationEvent.objects.last().pk)
+
+        make_book()
+        created = []
+        self.assertEqual(events.process('reports', created.extend, event_types=['book_created']), 4)
+        self.assertEqual(events.process('search', seen.extend), 1)
+
+    def test_failed_handler_does_not_advance(self):
+        make_book()
+
+        def fail(batch):
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            events.process('broken', fail)
+        self.assertEqual(events.position('broken'), 0)
+
+
+class CopyCirculationTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group, User
+        cache.clear()
+        self.user = User.objects.create_user('desk')
+        self.user.groups.add(Group.objects.create(name='Librarians'))
+        self.member = make_member()
+        self.book = make_book(quantity=5)
+        for barcode in ['B-1', 'B-2']:
+            Copy.objects.create(book=self.book, barcode=barcode)
+
+    def post(self, action, data):
+        from .views import CirculationViewSet
+        request = APIRequestFactory().post(f'/api/v1/circulation/{action}/', data, format='json')
+        force_authenticate(request, self.user)
+        view = CirculationViewSet.as_view({'post': 'return_copy' if action == 'return' else action})
+        return view(request)
+
+    def test_available_is_derived_from_copies(self):
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.quantity, self.book.available), (2, 2))
+        Copy.objects.filter(barcode='B-2').get().delete()
+        Copy.objects.create(book=self.book, barcode='B-3', status='maintenance')
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.quantity, self.book.available), (2, 1))
+        self.assertEqual(inventory.reconcile_inventory(), [])
+
+    def test_checkout_and_return_by_barcode(self):
+        response = self.post('checkout', {'barcode': 'B-1', 'member_id': self.member.member_id})
+        self.assertEqual(response.status_code, 201)
+        record = BorrowRecord.objects.get(pk=response.data['borrow_id'])
+        self.assertEqual(record.copy.status, 'borrowed')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available, 1)
+        self.assertEqual(self.post('checkout', {'barcode': 'B-1', 'member_id': self.member.member_id}).status_code, 400)
+
+        response = self.post('return', {'barcode': 'B-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Copy.objects.get(barcode='B-1').status, 'available')
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available, self.book.status), (2, 'available'))
+        self.assertEqual(self.post('return', {'barcode': 'B-1'}).status_code, 404)
+
+    def test_checkout_by_book_picks_a_free_copy(self):
+        first = circulation.checkout(self.member, self.book)
+        second = circulation.checkout(self.member, self.book)
+        self.assertEqual({first.copy.barcode, second.copy.barcode}, {'B-1', 'B-2'})
+        with self.assertRaises(circulation.Unavailable):
+            circulation.checkout(self.member, self.book)
+
+    def test_concurrent_return_is_applied_once(self):
+        record = circulation.checkout(self.member, self.book)
+        stale = BorrowRecord.objects.select_related('book', 'member').get(pk=record.pk)
+        circulation.checkin(record)
+        with self.assertRaises(circulation.AlreadyReturned):
+            circulation.checkin(stale)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available, 2)
+        self.assertEqual(CirculationEvent.objects.filter(event_type='return').count(), 1)
+
+
+class DirectorySyncTestCase(TestCase):
+    HEADER = 'student_id,first_name,last_name,email,member_type,membership_end\n'
+
+    def test_sync_creates_updates_and_deactivates(self):
+        kept = make_member(student_id='S1', membership_end=timezone.now().date())
+        gone = make_member(student_id='S2')
+        guest = make_member(member_type='guest')
+        linked = make_member(member_id='S4')
+        stream = io.StringIO(
+            self.HEADER
+            + 'S1,Ali,Rezaei,a@example.com,student,2030-01-31\n'
+            + 'S3,Sara,Karimi,s@example.com,professor,2030-01-31\n'
+            + 'S4,Reza,Ahmadi,r@example.com,staff,2030-01-31\n'
+            + 'S5,Bad,Row,b@example.com,alien,2030-01-31\n'
+            + 'S3,Sara,Karimi,s@example.com,professor,2030-01-31\n'
+        )
+        summary = directory.sync_directory(stream, chunk_size=2)
+        self.assertEqual(
+            {key: value for key, value in summary.items() if key != 'errors'},
+            {'rows': 5, 'created': 1, 'updated': 2, 'unchanged': 0, 'deactivated': 1},
+        )
+        self.assertEqual([error['line'] for error in summary['errors']], [5, 6])
+
+        kept.refresh_from_db()
+        self.assertEqual(kept.membership_end.isoformat(), '2030-01-31')
+        self.assertFalse(Member.objects.get(pk=gone.pk).active)
+        self.assertTrue(Member.objects.get(pk=guest.pk).active)
+        self.assertEqual(Member.objects.get(pk=linked.pk).student_id, 'S4')
+        self.assertEqual(Member.objects.get(student_id='S3').member_type, 'professor')
+
+        stream.seek(0)
+        summary = directory.sync_directory(stream, dry_run=True)
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (0, 0, 3))
+
+    def test_invalid_rows_are_reported_not_raised(self):
+        stream = io.StringIO(
+            self.HEADER
+            + f"{'S' * 21},Long,Id,l@example.com,student,2030-01-31\n"
+            + 'S2,Bad,Email,not-an-email,student,2030-01-31\n'
+            + 'S3,,Karimi,s@example.com,student,2030-01-31\n'
+            + f"S4,{'x' * 101},Ahmadi,r@example.com,staff,2030-01-31\n"
+            + 'S5,Ali,Rezaei,a@example.com,student,2030-01-31\n'
+        )
+        summary = directory.sync_directory(stream, chunk_size=2)
+        self.assertEqual(
+            [(error['line'], error['error']) for error in summary['errors']],
+            [
+                (2, 'member_id must be at most 20 characters'),
+                (3, 'Invalid email'),
+                (4, 'first_name is required'),
+                (5, 'first_name must be at most 100 characters'),
+            ],
+        )
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(list(Member.objects.values_list('student_id', flat=True)), ['S5'])
+
+    def test_endpoint_rejects_missing_columns(self):
+        from django.contrib.auth.models import User
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .views import MemberViewSet
+        request = APIRequestFactory().post(
+            '/api/v1/members/directory-sync/',
+            {'file': SimpleUploadedFile('directory.csv', b'student_id,email\nS1,a@example.com\n')},
+            format='multipart',
+        )
+        force_authenticate(request, User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        response = MemberViewSet.as_view({'post': 'directory_sync'})(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('member_type', response.data['error'])
+
+
+class LoanPolicyTestCase(TestCase):
+    def setUp(self):
+        # جدول کامپایل‌شده بین تست‌ها مشترک است ولی تراکنش هر تست برگردانده می‌شود
+        policies.table.invalidate()
+        self.addCleanup(policies.table.invalidate)
+        self.parent = Genre.objects.create(name='مرجع')
+        self.child = Genre.objects.create(name='لغت‌نامه', parent=self.parent)
+        LoanPolicy.objects.create(
+            genre=self.parent, loan_days=3, max_loans=1, fine_per_day=10000, grace_days=1, max_fine=25000,
+        )
+
+    def test_rules_by_member_type_genre_and_closures(self):
+        start = timezone.now().date()
+        self.assertEqual(policies.due_date('professor', None, start), start + timezone.timedelta(days=30))
+        self.assertEqual(policies.due_date('professor', self.child.pk, start), start + timezone.timedelta(days=3))
+        Closure.objects.create(date=start + timezone.timedelta(days=3))
+        self.assertEqual(policies.due_date('guest', self.child.pk, start), start + timezone.timedelta(days=4))
+
+        self.assertEqual(policies.fine('student', self.child.pk, start, start + timezone.timedelta(days=2)), 10000)
+        self.assertEqual(policies.fine('student', self.child.pk, start, start + timezone.timedelta(days=9)), 25000)
+        self.assertEqual(policies.fine('student', None, start, start + timezone.timedelta(days=2)), 10000)
+        self.assertEqual(policies.max_loans(make_member(max_borrow_limit=4), self.child.pk), 1)
+
+    def test_due_date_and_fine_need_no_queries(self):
+        member = make_member(member_type='staff')
+        book = make_book(genre=self.child)
+        policies.rule_for('staff')
+        record = BorrowRecord(book=book, member=member, borrow_date=timezone.now().date())
+        with self.assertNumQueries(0):
+            record.set_due_date()
+            record.returned = True
+            record.return_date = record.due_date + timezone.timedelta(days=3)
+            record.calculate_fine()
+        self.assertEqual(record.fine_amount, 20000)
+
+        LoanPolicy.objects.filter(genre=self.parent).get().delete()
+        self.assertEqual(policies.rule_for('staff', self.child.pk).loan_days, 21)
+
+
+class FacetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.novel = Genre.objects.create(name='رمان')
+        self.poetry = Genre.objects.create(name='شعر')
+        make_book(title='Old Story', genre=self.novel, publication_year=1995)
+        make_book(title='New Story', genre=self.novel, publication_year=2012, physical_condition='fair')
+        make_book(title='Story Poems', genre=self.poetry, publication_year=2018, quantity=0)
+        make_book(title='Other', genre=self.poetry, publication_year=2018)
+
+    def test_facets_follow_filters_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = facets.facet_counts(facets.search(facets.normalize({'q': '  STORY ', 'min_year': '2000'})))
+        self.assertEqual((result['total'], result['available']), (2, 1))
+        self.assertEqual([(genre['name'], genre['count']) for genre in result['genres']], [('رمان', 1), ('شعر', 1)])
+        self.assertEqual(result['years'], [{'from': 2010, 'to': 2019, 'count': 2}])
+        self.assertEqual({item['value']: item['count'] for item in result['status']}, {'available': 1, 'borrowed': 1})
+        self.assertEqual({item['value']: item['count'] for item in result['condition']}, {'good': 1, 'fair': 1})
+
+    def test_endpoint_caches_by_normalized_query(self):
+        view = BookViewSet.as_view({'get': 'facets'})
+        factory = APIRequestFactory()
+        response = view(factory.get('/api/v1/books/facets/', {'search': 'story'}))
+        self.assertEqual(response.data['total'], 3)
+        with self.assertNumQueries(0):
+            response = view(factory.get('/api/v1/books/facets/', {'search': ' Story', 'genre': ''}))
+        self.assertEqual(response.data['total'], 3)
+        # تغییر کاتالوگ نسخه کلید کش را عوض می‌کند
+        make_book(title='Story Four')
+        self.assertEqual(view(factory.get('/api/v1/books/facets/', {'search': 'story'})).data['total'], 4)
+
+    def test_endpoint_counts_match_the_list(self):
+        factory = APIRequestFactory()
+        # جستجوی لیست نام ژانر را هم در بر می‌گیرد و فیلترهای BookFilter را می‌پذیرد
+        for params in [{'search': 'شعر'}, {'search': 'story', 'in_stock': 'true', 'min_year': '2000'}]:
+            listed = BookViewSet.as_view({'get': 'list'})(factory.get('/api/v1/books/', params))
+            counted = BookViewSet.as_view({'get': 'facets'})(factory.get('/api/v1/books/facets/', params))
+            self.assertEqual(counted.data['total'], listed.data['count'])
+        self.assertEqual(counted.data['total'], 1)
+
+
+@override_settings(CATALOG_PAGE_SIZE=2)
+class CatalogPageTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = [make_book(title=f'کتاب {index}') for index in range(3)]
+
+    def test_list_fragments_are_cached_until_books_change(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('catalog'), {'page': 2})
+        self.assertContains(response, 'کتاب 2')
+        self.assertNotContains(response, 'کتاب 0')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('catalog'), {'page': 2})
+
+        self.books[2].title = 'کتاب ویرایش‌شده'
+        self.books[2].save()
+        self.assertContains(self.client.get(reverse('catalog'), {'page': 2}), 'کتاب ویرایش‌شده')
+
+    def test_partial_results_skip_the_layout(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('book-search-results'), {'q': 'کتاب'})
+        self.assertContains(response, 'کتاب 1')
+        self.assertContains(response, '3 کتاب')
+        self.assertNotContains(response, '<html')
+        detail = self.client.get(reverse('book_detail', args=[self.books[0].pk]))
+        self.assertContains(detail, '<html')
+
+
+@override_settings(EVENT_SAFETY_LAG=0)
+class AvailabilityBitmapTestCase(TestCase):
+    def setUp(self):
+        import base64
+        import zlib
+        cache.clear()
+        self.decode = lambda data: zlib.decompress(base64.b64decode(data))
+        self.member = make_member()
+        self.books = [make_book(quantity=1) for _ in range(3)]
+        self.books[1].status = 'maintenance'
+        self.books[1].save()
+
+    def available(self, bits):
+        return {pk for pk in range(len(bits) * 8) if bits[pk >> 3] >> (pk & 7) & 1}
+
+    def test_bitmap_follows_checkouts_incrementally(self):
+        from .views import book_availability
+        factory = APIRequestFactory()
+        first = book_availability(factory.get('/api/v1/availability/')).data
+        self.assertTrue(first['full'])
+        self.assertEqual(self.available(self.decode(first['bitmap'])), {self.books[0].pk, self.books[2].pk})
+
+        circulation.checkout(self.member, self.books[0])
+        diff = book_availability(factory.get('/api/v1/availability/', {'since': first['version']})).data
+        self.assertEqual((diff['full'], diff['available'], diff['unavailable']), (False, [], [self.books[0].pk]))
+        # بیت‌مپ کش‌شده فقط با کتاب‌های رویدادهای جدید به‌روز می‌شود
+        with self.assertNumQueries(2):
+            snap = availability.snapshot()
+        self.assertEqual(snap['version'], diff['version'])
+        self.assertEqual(self.available(snap['bits']), {self.books[2].pk})
+
+    @override_settings(AVAILABILITY_DIFF_LIMIT=1)
+    def test_large_diff_falls_back_to_full_bitmap(self):
+        from .views import book_availability
+        response = book_availability(APIRequestFactory().get('/api/v1/availability/', {'since': 0}))
+        self.assertTrue(response.data['full'])
+
+
+class BatchLookupTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user('integration')
+        self.genre = Genre.objects.create(name='رمان')
+        self.book = make_book(isbn='0-306-40615-2', genre=self.genre)
+        self.other = make_book(isbn='9781861972712')
+
+    def test_books_by_id_and_isbn_in_one_query(self):
+        view = BookViewSet.as_view({'post': 'batch'})
+        request = APIRequestFactory().post('/api/v1/books/batch/', {
+            'ids': [self.other.pk, 999999],
+            'isbns': ['978-0-306-40615-7', '1861972717', 'unknown'],
+        }, format='json')
+        with self.assertNumQueries(1):
+            response = view(request)
+        self.assertEqual(response.data['ids'][str(self.other.pk)]['id'], self.other.pk)
+        self.assertIsNone(response.data['ids']['999999'])
+        self.assertEqual(response.data['isbns']['978-0-306-40615-7']['genre']['name'], 'رمان')
+        self.assertEqual(response.data['isbns']['1861972717']['id'], self.other.pk)
+        self.assertIsNone(response.data['isbns']['unknown'])
+
+    @override_settings(BATCH_LOOKUP_MAX_SIZE=2)
+    def test_members_by_member_id_and_size_limit(self):
+        from .views import MemberViewSet
+        member = make_member(member_id='S-100')
+        view = MemberViewSet.as_view({'get': 'batch'})
+        request = APIRequestFactory().get('/api/v1/members/batch/', {'member_ids': 'S-100,S-404'})
+        force_authenticate(request, self.user)
+        response = view(request)
+        self.assertEqual(response.data['member_ids']['S-100']['id'], member.pk)
+        self.assertIsNone(response.data['member_ids']['S-404'])
+
+        request = APIRequestFactory().get('/api/v1/members/batch/', {'ids': '1,2', 'member_ids': 'S-100'})
+        force_authenticate(request, self.user)
+        self.assertEqual(view(request).status_code, 400)
+
+
+class ExpandTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        parent = Genre.objects.create(name='ادبیات')
+        genre = Genre.objects.create(name='رمان', parent=parent)
+        member = make_member()
+        self.books = [make_book(genre=genre, quantity=2) for _ in range(3)]
+        for book in self.books:
+            make_borrow(book, member)
+            Copy.objects.create(book=book, barcode=f'C-{book.pk}')
+            Reservation.objects.create(
+                book=book, member=member, expiration_date=timezone.now() + timezone.timedelta(days=3)
+            )
+
+    def get(self, **params):
+        view = BookViewSet.as_view({'get': 'list'})
+        return view(APIRequestFactory().get('/api/v1/books/', params))
+
+    def test_expansions_run_in_bounded_queries(self):
+        expand = 'genre.parent,borrow_history.member,reservations.member,copies,forecast'
+        # شمارش صفحه‌بندی + کتاب‌ها + یک Prefetch برای هر بسط چندتایی
+        with self.assertNumQueries(5):
+            response = self.get(expand=expand)
+        book = response.data['results'][0]
+        self.assertEqual(book['genre']['parent']['name'], 'ادبیات')
+        self.assertEqual(book['borrow_history'][0]['member']['member_id'], 'M1')
+        self.assertEqual(book['reservations'][0]['member']['full_name'], 'علی رضایی')
+        self.assertEqual(book['copies'][0]['barcode'], f"C-{book['id']}")
+        self.assertEqual(book['forecast']['waiting'], 1)
+        self.assertIsNotNone(book['forecast']['next_return'])
+        self.assertNotIn('borrow_history', self.get().data['results'][0])
+
+    def test_unknown_or_too_deep_expansions_are_rejected(self):
+        self.assertEqual(self.get(expand='secrets').status_code, 400)
+        with override_settings(EXPAND_MAX_DEPTH=1):
+            self.assertEqual(self.get(expand='genre.parent').status_code, 400)
+
+
+class FineLedgerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.member = make_member()
+        self.book = make_book(quantity=2)
+
+    def late_return(self, days=3):
+        record = make_borrow(self.book, self.member)
+        BorrowRecord.objects.filter(pk=record.pk).update(due_date=timezone.now().date() - timezone.timedelta(days=days))
+        record.refresh_from_db()
+        return circulation.checkin(record)
+
+    def test_return_charges_and_blocks_checkout_until_paid(self):
+        record = self.late_return()
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.fine_balance, record.fine_amount)
+        self.assertGreater(record.fine_amount, 0)
+        with self.assertRaises(circulation.FinesOutstanding):
+            circulation.checkout(self.member, self.book)
+
+        with self.assertRaises(fines.FineError):
+            fines.post(self.member, 'payment', record.fine_amount + 1)
+        fines.post(self.member, 'payment', record.fine_amount - 1000)
+        fines.post(self.member, 'waiver', 1000)
+        self.assertEqual(self.member.fine_balance, 0)
+        self.assertEqual(list(FineEntry.objects.values_list('kind', flat=True)), ['waiver', 'payment', 'charge'])
+        circulation.checkout(self.member, self.book)
+
+    def test_reconcile_fixes_drifted_balances(self):
+        self.late_return()
+        Member.objects.filter(pk=self.member.pk).update(fine_balance=0)
+        [row] = fines.reconcile_fines(fix=True)
+        self.assertEqual(row['fine_balance'], 0)
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.fine_balance, row['expected_balance'])
+        self.assertEqual(fines.reconcile_fines(), [])
+
+    def test_fine_changes_are_posted_against_the_ledger(self):
+        record = self.late_return()
+        charged = record.fine_amount
+        # ویرایش موعد پس از بازگشت (API یا ادمین) جریمه را بخشوده می‌کند
+        record = BorrowRecord.objects.get(pk=record.pk)
+        record.due_date = record.return_date
+        record.save()
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.fine_balance, 0)
+        self.assertEqual(FineEntry.objects.get(kind='waiver').amount, charged)
+        self.assertEqual(set(FineEntry.objects.values_list('record_id', flat=True)), {record.pk})
+
+        # جریمه ثبت‌شده پیش از دفتر با محاسبه دوباره به بخشودگی تبدیل نمی‌شود
+        legacy = make_borrow(self.book, self.member)
+        BorrowRecord.objects.filter(pk=legacy.pk).update(
+            returned=True, return_date=timezone.now().date(),
+            due_date=timezone.now().date() - timezone.timedelta(days=2), fine_amount=50000,
+        )
+        self.assertEqual(tasks.recompute_fines.apply().get(), 1)
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.fine_balance, 0)
+        self.assertFalse(FineEntry.objects.filter(record_id=legacy.pk).exists())
+
+
+class TrendingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.member = make_member(max_borrow_limit=10)
+        self.genre = Genre.objects.create(name='رمان')
+        self.old, self.new = make_book(quantity=5, genre=self.genre), make_book(quantity=5)
+
+    def test_recent_checkouts_outrank_older_ones(self):
+        month_ago = timezone.now().date() - timezone.timedelta(days=28)
+        for _ in range(3):
+            make_borrow(self.old, self.member)
+        # borrow_date با auto_now_add همیشه امروز ثبت می‌شود
+        BorrowRecord.objects.update(borrow_date=month_ago)
+        self.assertEqual(trending.rebuild(), 1)
+        circulation.checkout(self.member, self.new)
+
+        self.old.refresh_from_db()
+        # چهار نیمه‌عمر؛ تاریخ امانت روز است نه لحظه
+        self.assertAlmostEqual(trending.current(self.old.trending_score), 3 / 16, delta=0.03)
+        self.assertEqual(list(trending.trending()), [self.new, self.old])
+        response = BookViewSet.as_view({'get': 'trending'})(APIRequestFactory().get('/api/v1/books/trending/'))
+        self.assertAlmostEqual(response.data[0]['trending'], 1, places=2)
+
+    def test_trending_per_genre_in_one_query(self):
+        circulation.checkout(self.member, self.old)
+        view = BookViewSet.as_view({'get': 'trending_genres'})
+        with self.assertNumQueries(1):
+            response = view(APIRequestFactory().get('/api/v1/books/trending/genres/'))
+        self.assertEqual(response.data[0]['genre']['name'], 'رمان')
+        self.assertEqual([book['id'] for book in response.data[0]['books']], [self.old.pk])
+
+
+class QuantityChangeTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'x')
+        self.book = make_book(quantity=5)
+        member = make_member()
+        for _ in range(2):
+            make_borrow(self.book, member)
+            inventory.checkout(self.book.pk)
+
+    def patch(self, book, quantity):
+        request = APIRequestFactory().patch(f'/api/v1/books/{book.pk}/', {'quantity': quantity}, format='json')
+        force_authenticate(request, self.admin)
+        return BookViewSet.as_view({'patch': 'partial_update'})(request, pk=book.pk)
+
+    def test_quantity_change_shifts_available(self):
+        self.assertEqual(self.patch(self.book, 3).status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.quantity, self.book.available), (3, 1))
+        self.assertEqual(self.patch(self.book, 8).status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.quantity, self.book.available), (8, 6))
+        self.assertEqual(inventory.reconcile_inventory(), [])
+
+    def test_marking_damaged_sets_status(self):
+        # مثل فرم تغییر ادمین: ذخیره کامل همراه با quantity
+        self.book.refresh_from_db()
+        self.book.physical_condition = 'damaged'
+        self.book.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available, self.book.status), (3, 'damaged'))
+
+    def test_quantity_below_open_loans_or_with_copies_is_rejected(self):
+        response = self.patch(self.book, 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('open loans', str(response.data['quantity']))
+        other = make_book()
+        Copy.objects.create(book=other, barcode='Q-1')
+        self.assertEqual(self.patch(other, 4).status_code, 400)
@@ -0,0 +1,81 @@
+"""
+کتاب‌های پرطرفدار اخیر با زوال نمایی
+
+امتیاز واقعی هر کتاب جمع 2^(-(now - t)/half_life) روی امانت‌های آن است. چون همه
+امتیازها با یک نرخ زوال می‌کنند، به جای کم کردن همه امتیازها با گذر زمان هر امانت
+وزن exp(rate * (t - TRENDING_EPOCH)) را به Book.trending_score اضافه می‌کند؛ ترتیب
+این ستون (با ایندکس) همان ترتیب امتیاز واقعی است و امتیاز فعلی با current به دست
+می‌آید. پس هر امانت فقط یک جمع اتمی است و تاریخچه هرگز دوباره اسکن نمی‌شود.
+
+وزن‌ها هر half_life دو برابر می‌شوند و float تا حدود ۱۰۰۰ نیمه‌عمر پس از epoch جا
+دارد؛ با تغییر TRENDING_HALF_LIFE_DAYS یا TRENDING_EPOCH دستور rebuild_trending لازم است.
+"""
+import math
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Book, BorrowRecord
+
+
+def _rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_DAYS * 86400)
+
+
+def _epoch():
+    return datetime.fromisoformat(settings.TRENDING_EPOCH).replace(tzinfo=dt_timezone.utc)
+
+
+def weight(at=None):
+    """وزن یک امانت در زمان at (پیش‌فرض: اکنون)"""
+    if at is None:
+        at = timezone.now()
+    elif not isinstance(at, datetime):
+        at = datetime.combine(at, time.min, tzinfo=dt_timezone.utc)
+    return math.exp(_rate() * (at - _epoch()).total_seconds())
+
+
+def current(score, now=None):
+    """امتیاز ذخیره‌شده به صورت زوال‌یافته تا now (معادل تعداد امانت‌های «تازه»)"""
+    return score / weight(now)
+
+
+def bump(book_ids, at=None):
+    """افزودن وزن یک امانت به امتیاز کتاب‌ها با یک UPDATE"""
+    return Book.objects.filter(pk__in=book_ids).update(trending_score=F('trending_score') + weight(at))
+
+
+def trending(genre_id=None):
+    """queryset کتاب‌های پرطرفدار اخیر به ترتیب امتیاز (ایندکس trending_score / genre, trending_score)"""
+    books = Book.objects.filter(trending_score__gt=0)
+    if genre_id is not None:
+        books = books.filter(genre_id=genre_id)
+    return books.order_by('-trending_score', 'pk')
+
+
+def trending_by_genre(limit=None):
+    """limit کتاب اول هر ژانر با یک کوئری (ROW_NUMBER روی هر ژانر)"""
+    return (
+        Book.objects.filter(trending_score__gt=0, genre__isnull=False)
+        .select_related('genre')
+        .annotate(genre_rank=Window(RowNumber(), partition_by=F('genre_id'), order_by=F('trending_score').desc()))
+        .filter(genre_rank__lte=limit or settings.TRENDING_TOP_K)
+        .order_by('genre__name', 'genre_rank')
+    )
+
+
+def rebuild(batch_size=1000):
+    """محاسبه دوباره همه امتیازها از سوابق امانت (پس از تغییر تنظیمات)"""
+    scores = {}
+    records = BorrowRecord.objects.values_list('book_id', 'borrow_date').order_by()
+    for book_id, borrow_date in records.iterator(chunk_size=batch_size):
+        scores[book_id] = scores.get(book_id, 0) + weight(borrow_date)
+    with transaction.atomic():
+        Book.objects.exclude(trending_score=0).update(trending_score=0)
+        books = [Book(pk=pk, trending_score=score) for pk, score in scores.items()]
+        Book.objects.bulk_update(books, ['trending_score'], batch_size=batch_size)
+    return len(books)
@@ -5,7 +5,14 @@ from . import views
 router = DefaultRouter()
 router.register(r'books', views.BookViewSet)
 router.register(r'members', views.MemberViewSet)
+router.register(r'circulation', views.CirculationViewSet, basename='circulation')
 
 urlpatterns = [
     path('search/', views.book_search, name='book-search'),
+    path('search/results/', views.book_search, {'partial': True}, name='book-search-results'),
+    path('catalog/', views.book_list, name='catalog'),
+    path('catalog/results/', views.book_list, {'partial': True}, name='catalog-results'),
+    path('catalog/<int:pk>/', views.book_detail, name='book_detail'),
+    path('sync/', views.sync_changes, name='sync-changes'),
+    path('availability/', views.book_availability, name='book-availability'),
 ] + router.urls
\ No newline at end of file
@@ -1,6 +1,10 @@
 import datetime
+import io
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 from django.db.models import Q, Count, F, ExpressionWrapper, DurationField
 from django.db import transaction
 from django.utils import timezone
@@ -15,18 +19,31 @@ from django_filters.rest_framework import (
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny, BasePermission
 from rest_framework.response import Response
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from datetime import timedelta
-from .models import Book, Member, BorrowRecord, Genre
+from library.throttling import TokenBucketThrottle, throttle
+from .models import Book, Copy, Member, BorrowRecord, Genre
 from .serializers import (
     BookSerializer, 
     MemberSerializer, 
     BorrowRecordSerializer,
     GenreSerializer,
     BookDetailSerializer,
-    MemberBorrowHistorySerializer
+    MemberBorrowHistorySerializer,
+    BorrowHistorySerializer,
+    FineEntrySerializer,
+    SimilarBookSerializer
 )
+from . import availability, catalog, circulation, directory, facets, fines, sync, trending
+from .archive import borrow_history
+from .pagination import EstimatedCountPaginator
+from .autocomplete import index as autocomplete_index
+from .expand import ExpandMixin
+from .isbn import normalize_isbn
+from .recommendations import similar_books
+from .tasks import POPULAR_REPORT_KEY, enqueue, process_cover
 
 
 class StandardPagination(PageNumberPagination):
@@ -37,6 +54,8 @@ class StandardPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
     last_page_strings = ('last',)
+    # برای لیست‌های بزرگ تعداد کل از برآورد planner گرفته می‌شود
+    django_paginator_class = EstimatedCountPaginator
 
     def get_paginated_response(self, data):
         return Response({
@@ -45,6 +64,7 @@ class StandardPagination(PageNumberPagination):
                 'previous': self.get_previous_link()
             },
             'count': self.page.paginator.count,
+            'count_estimated': self.page.paginator.estimated,
             'page_size': self.get_page_size(self.request),
             'total_pages': self.page.paginator.num_pages,
             'current_page': self.page.number,
@@ -64,10 +84,10 @@ class BookFilter(FilterSet):
     """
     فیلترهای پیشرفته برای کتاب‌ها
     """
-    min_year = NumberFilter(field_name='publish_year', lookup_expr='gte')
-    max_year = NumberFilter(field_name='publish_year', lookup_expr='lte')
+    min_year = NumberFilter(field_name='publication_year', lookup_expr='gte')
+    max_year = NumberFilter(field_name='publication_year', lookup_expr='lte')
     genre = CharFilter(field_name='genre__name', lookup_expr='icontains')
-    author = CharFilter(field_name='author', lookup_expr='icontains')
+    author = CharFilter(field_name='authors', lookup_expr='icontains')
     in_stock = BooleanFilter(method='filter_in_stock')
 
     class Meta:
@@ -79,11 +99,36 @@ class BookFilter(FilterSet):
             return queryset.filter(available__gt=0)
         return queryset
 
-class BookViewSet(viewsets.ModelViewSet):
+def _batch_values(request, name):
+    """
+    شناسه‌های ورودی دسته‌ای: لیست JSON در بدنه POST یا مقادیر جداشده با کاما در GET
+    """
+    if request.method == 'POST':
+        values = request.data.get(name) or []
+        if not isinstance(values, list):
+            values = [values]
+    else:
+        values = ','.join(request.query_params.getlist(name)).split(',')
+    # ترتیب و یکتایی ورودی‌ها برای کلیدهای پاسخ حفظ می‌شود
+    return list(dict.fromkeys(str(value).strip() for value in values if str(value).strip()))
+
+
+def _batch_ids(values):
+    return {value: int(value) for value in values if value.isdigit()}
+
+
+class AutocompleteThrottle(TokenBucketThrottle):
+    # یک درخواست برای هر کلید؛ سهم جداگانه تا سطل روزانه anon با تایپ خالی نشود
+    scope = 'autocomplete'
+    shared = False
+
+
+class BookViewSet(ExpandMixin, viewsets.ModelViewSet):
     """
     مدیریت کامل کتاب‌ها با امکانات پیشرفته
     """
-    queryset = Book.objects.annotate(
+    # ژانر همیشه در BookSerializer تودرتو است
+    queryset = Book.objects.select_related('genre').annotate(
         borrow_count=Count('borrow_records')
     ).order_by('-borrow_count', 'title')
     serializer_class = BookSerializer
@@ -94,11 +139,23 @@ class BookViewSet(viewsets.ModelViewSet):
         drf_filters.OrderingFilter  # استفاده از نام مستعار
     ]
     filterset_class = BookFilter
-    search_fields = ['title', 'author', 'publisher', 'description', 'genre__name']
-    ordering_fields = ['title', 'author', 'publish_year', 'created_at', 'borrow_count']
+    search_fields = ['title', 'authors', 'publisher', 'description', 'genre__name']
+    ordering_fields = ['title', 'authors', 'publication_year', 'created_at', 'borrow_count', 'trending_score']
     ordering = ['-created_at']
+    throttle_scope = 'books'
+    # وزن هر action در سطل توکن؛ جستجو و لیست از جزئیات گران‌ترند
+    throttle_costs = {'list': 2, 'recent': 2, 'popular': 2, 'similar': 2, 'facets': 2, 'batch': 5,
+                      'trending': 2, 'trending_genres': 2}
 
 
+    def get_queryset(self):
+        if self.action in ('borrow', 'facets'):
+            # امانت و شمارش وجه‌ها فقط کتاب را لازم دارند، نه شمارش امانت‌هایش
+            return Book.objects.all()
+        if self.action == 'batch':
+            return self.expand_queryset(Book.objects.select_related('genre'))
+        return self.expand_queryset(super().get_queryset())
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return BookDetailSerializer
@@ -106,26 +163,125 @@ class BookViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
-            return [IsAdminUser() | IsLibrarian()]
+            return [(IsAdminUser | IsLibrarian)()]
         return [AllowAny()]
 
+    # رویداد book_created/book_updated (سیگنال) در همان تراکنش ذخیره ثبت می‌شود
+    @transaction.atomic
+    def perform_create(self, serializer):
+        book = serializer.save()
+        if book.cover:
+            enqueue(process_cover, book.pk)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        book = serializer.save()
+        if 'cover' in serializer.validated_data and book.cover:
+            enqueue(process_cover, book.pk)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """کتاب‌های منتشر شده در 6 ماه اخیر"""
         six_months_ago = timezone.now().date() - timedelta(days=180)
         recent_books = self.get_queryset().filter(
-            publish_year__gte=six_months_ago.year
+            publication_year__gte=six_months_ago.year
         )[:10]
         serializer = self.get_serializer(recent_books, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
-        """10 کتاب پرطرفدار"""
-        popular_books = self.get_queryset()[:10]
+        """10 کتاب پرطرفدار؛ از گزارش کش‌شده generate_popular_report و در نبود آن محاسبه مستقیم"""
+        report = cache.get(POPULAR_REPORT_KEY)
+        if report is None:
+            popular_books = self.get_queryset()[:10]
+        else:
+            ids = [row['id'] for row in report[:10]]
+            books = self.get_queryset().in_bulk(ids)
+            popular_books = [books[pk] for pk in ids if pk in books]
         serializer = self.get_serializer(popular_books, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """کتاب‌های پرطرفدار اخیر با زوال نمایی امانت‌ها؛ با genre فقط همان ژانر"""
+        genre = request.query_params.get('genre')
+        if genre is not None and not genre.isdigit():
+            return Response({'error': 'genre must be a genre id'}, status=status.HTTP_400_BAD_REQUEST)
+        books = self.expand_queryset(trending.trending(genre).select_related('genre'))
+        serializer = self.get_serializer(books[:settings.TRENDING_TOP_K], many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='trending/genres')
+    def trending_genres(self, request):
+        """پرطرفدارترین کتاب‌های هر ژانر با یک کوئری"""
+        try:
+            limit = min(int(request.query_params.get('limit', 5)), settings.TRENDING_TOP_K)
+        except ValueError:
+            limit = 5
+        genres = {}
+        for book in trending.trending_by_genre(max(limit, 1)):
+            entry = genres.setdefault(book.genre_id, {'genre': {'id': book.genre_id, 'name': book.genre.name}, 'books': []})
+            entry['books'].append(BookSerializer(book).data)
+        return Response(list(genres.values()))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """تعداد نتایج به تفکیک ژانر، دهه انتشار، وضعیت و وضعیت فیزیکی"""
+        # همان فیلترهای لیست (search و BookFilter) تا شمارش‌ها با نتایج لیست یکی باشند
+        queryset = self.get_queryset()
+        for backend in self.filter_backends:
+            if backend is not drf_filters.OrderingFilter:
+                queryset = backend().filter_queryset(request, queryset, self)
+        params = {name: request.query_params.get(name) for name in ['search', *BookFilter.Meta.fields]}
+        return Response(facets.cached_facets(params, queryset, scope='books'))
+
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        """دریافت چند کتاب با شناسه (ids) یا شابک (isbns) در یک کوئری؛ پاسخ بر اساس ورودی"""
+        ids = _batch_ids(_batch_values(request, 'ids'))
+        isbns = {value: normalize_isbn(value) for value in _batch_values(request, 'isbns')}
+        if len(ids) + len(isbns) > settings.BATCH_LOOKUP_MAX_SIZE:
+            return Response(
+                {'error': f'At most {settings.BATCH_LOOKUP_MAX_SIZE} identifiers per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        books = self.get_queryset().filter(
+            Q(pk__in=ids.values()) | Q(normalized_isbn__in=isbns.values())
+        ).order_by('pk') if ids or isbns else []
+        by_id, by_isbn = {}, {}
+        for data in self.get_serializer(books, many=True).data:
+            by_id[data['id']] = data
+            by_isbn.setdefault(normalize_isbn(data['isbn']), data)
+        return Response({
+            'ids': {value: by_id.get(pk) for value, pk in ids.items()},
+            'isbns': {value: by_isbn.get(key) for value, key in isbns.items()},
+        })
+
+    @action(
+        detail=False, methods=['get'], authentication_classes=[], permission_classes=[AllowAny],
+        throttle_classes=[AutocompleteThrottle], throttle_scope='autocomplete',
+    )
+    def autocomplete(self, request):
+        """پیشنهاد عنوان/نویسنده/ناشر از ایندکس درون‌حافظه‌ای (بدون کوئری)"""
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+        return Response(autocomplete_index.search(request.query_params.get('q', ''), limit))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """اعضایی که این کتاب را امانت گرفتند، این کتاب‌ها را هم گرفتند"""
+        if not str(pk).isdigit():
+            return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = SimilarBookSerializer(similar_books(pk), many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'], permission_classes=[IsLibrarian])
     def borrow(self, request, pk=None):
         """امانت گرفتن کتاب"""
@@ -140,32 +296,10 @@ class BookViewSet(viewsets.ModelViewSet):
         except Member.DoesNotExist:
             return Response({'error': 'Member not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # بررسی موجودیت کتاب
-        if book.available <= 0:
-            return Response({'error': 'Book not available'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # بررسی سقف امانت عضو
-        active_borrows = BorrowRecord.objects.filter(
-            member=member, 
-            returned=False
-        ).count()
-        
-        max_borrow = 5  # سقف امانت
-        if active_borrows >= max_borrow:
-            return Response({'error': 'Member has reached borrow limit'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # ثبت امانت
-        with transaction.atomic():
-            borrow_record = BorrowRecord.objects.create(
-                book=book,
-                member=member,
-                borrow_date=timezone.now().date(),
-                due_date=timezone.now().date() + timedelta(days=14)
-            )
-            
-            # کاهش موجودی کتاب
-            book.available = F('available') - 1
-            book.save()
+        try:
+            borrow_record = circulation.checkout(member, book)
+        except circulation.CirculationError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
@@ -174,7 +308,7 @@ class BookViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_201_CREATED)
 
 
-class MemberViewSet(viewsets.ModelViewSet):
+class MemberViewSet(ExpandMixin, viewsets.ModelViewSet):
     """
     مدیریت اعضا با امکانات پیشرفته
     """
@@ -191,14 +325,22 @@ class MemberViewSet(viewsets.ModelViewSet):
     ordering = ['-active', 'last_name']
     filterset_fields = ['member_type', 'active']
 
+    def get_queryset(self):
+        if self.action == 'batch':
+            # سریالایزر فهرست شمارش امانت‌ها را نمایش نمی‌دهد
+            return self.expand_queryset(Member.objects.all())
+        return self.expand_queryset(super().get_queryset())
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return MemberBorrowHistorySerializer
         return MemberSerializer
 
     def get_permissions(self):
-        if self.action in ['create', 'destroy', 'borrow_history']:
+        if self.action in ['create', 'destroy', 'borrow_history', 'directory_sync']:
             return [IsAdminUser()]
+        if self.action in ['pay', 'waive']:
+            return [(IsAdminUser | IsLibrarian)()]
         return [IsAuthenticated()]
 
     def perform_destroy(self, instance):
@@ -210,22 +352,98 @@ class MemberViewSet(viewsets.ModelViewSet):
     def borrow_history(self, request, pk=None):
         """تاریخچه امانت‌های عضو"""
         member = self.get_object()
-        borrows = BorrowRecord.objects.filter(member=member).order_by('-borrow_date')
+        # سوابق جاری و بایگانی‌شده با هم
+        borrows = borrow_history(member=member)
         
         page = self.paginate_queryset(borrows)
         if page is not None:
-            serializer = BorrowRecordSerializer(page, many=True)
+            serializer = BorrowHistorySerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = BorrowRecordSerializer(borrows, many=True)
+        serializer = BorrowHistorySerializer(borrows, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        """دریافت چند عضو با شناسه (ids) یا شماره عضویت (member_ids) در یک کوئری"""
+        ids = _batch_ids(_batch_values(request, 'ids'))
+        member_ids = _batch_values(request, 'member_ids')
+        if len(ids) + len(member_ids) > settings.BATCH_LOOKUP_MAX_SIZE:
+            return Response(
+                {'error': f'At most {settings.BATCH_LOOKUP_MAX_SIZE} identifiers per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        members = self.get_queryset().filter(
+            Q(pk__in=ids.values()) | Q(member_id__in=member_ids)
+        ) if ids or member_ids else []
+        by_id, by_member_id = {}, {}
+        for data in self.get_serializer(members, many=True).data:
+            by_id[data['id']] = data
+            by_member_id[data['member_id']] = data
+        return Response({
+            'ids': {value: by_id.get(pk) for value, pk in ids.items()},
+            'member_ids': {value: by_member_id.get(value) for value in member_ids},
+        })
+
+    @action(detail=True, methods=['get'])
+    def fines(self, request, pk=None):
+        """مانده جریمه و سطرهای دفتر جریمه عضو"""
+        member = self.get_object()
+        page = self.paginate_queryset(member.fine_entries.all())
+        response = self.get_paginated_response(FineEntrySerializer(page, many=True).data)
+        response.data['balance'] = member.fine_balance
+        return response
+
+    def _post_fine(self, request, kind):
+        member = self.get_object()
+        try:
+            entry = fines.post(
+                member, kind, request.data.get('amount') or 0,
+                note=request.data.get('note', ''), user=request.user,
+            )
+        except fines.FineError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'entry': FineEntrySerializer(entry).data, 'balance': member.fine_balance},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=['post'])
+    def pay(self, request, pk=None):
+        """ثبت پرداخت جریمه"""
+        return self._post_fine(request, 'payment')
+
+    @action(detail=True, methods=['post'])
+    def waive(self, request, pk=None):
+        """بخشودگی بخشی یا همه مانده جریمه"""
+        return self._post_fine(request, 'waiver')
+
+    @action(detail=False, methods=['post'], url_path='directory-sync', parser_classes=[MultiPartParser])
+    def directory_sync(self, request):
+        """همگام‌سازی گروهی اعضا با فایل CSV دایرکتوری دانشگاه"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Directory file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # فایل آپلودشده بدون خواندن کامل در حافظه به CSV داده می‌شود
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            summary = directory.sync_directory(
+                stream,
+                deactivate_missing=request.data.get('deactivate', 'true') != 'false',
+                dry_run=request.data.get('dry_run') == 'true',
+            )
+        except (directory.DirectoryError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
 
 class BorrowRecordViewSet(viewsets.ModelViewSet):
     """
     مدیریت سوابق امانت کتاب
     """
-    queryset = BorrowRecord.objects.annotate(
+    # کتاب و عضو برای سریالایزر و محاسبه جریمه بازگشت لازم‌اند
+    queryset = BorrowRecord.objects.select_related('book', 'member').annotate(
         days_overdue=ExpressionWrapper(
             F('return_date') - F('due_date'),
             output_field=DurationField()
@@ -234,7 +452,7 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
     serializer_class = BorrowRecordSerializer
     pagination_class = StandardPagination
     permission_classes = [IsLibrarian | IsAdminUser]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+    filter_backends = [drf_filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['book__title', 'member__first_name', 'member__last_name']
     filterset_fields = ['returned', 'book', 'member']
 
@@ -243,28 +461,80 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
         """ثبت بازگشت کتاب"""
         record = self.get_object()
         
-        if record.returned:
-            return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        with transaction.atomic():
-            # ثبت تاریخ بازگشت
-            record.returned = True
-            record.return_date = timezone.now().date()
-            
-            # محاسبه جریمه
-            if record.return_date > record.due_date:
-                days_late = (record.return_date - record.due_date).days
-                record.fine = days_late * 5000  # 5000 تومان برای هر روز تاخیر
-            
-            record.save()
-            
-            # افزایش موجودی کتاب
-            record.book.available = F('available') + 1
-            record.book.save()
+        try:
+            circulation.checkin(record)
+        except circulation.CirculationError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
-            'fine': record.fine
+            'fine': record.fine_amount
+        })
+
+
+class CirculationViewSet(viewsets.ViewSet):
+    """
+    امانت و بازگشت با اسکن بارکد نسخه در میز امانت
+    """
+    permission_classes = [IsLibrarian | IsAdminUser]
+
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        """امانت نسخه با بارکد و شماره عضویت"""
+        barcode = request.data.get('barcode')
+        member_id = request.data.get('member_id')
+
+        if not barcode or not member_id:
+            return Response({'error': 'Barcode and member ID are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            copy = Copy.objects.select_related('book').get(barcode=barcode)
+        except Copy.DoesNotExist:
+            return Response({'error': 'Copy not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            member = Member.objects.get(member_id=member_id)
+        except Member.DoesNotExist:
+            return Response({'error': 'Member not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if not member.active:
+            return Response({'error': 'Membership is not active'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            borrow_record = circulation.checkout(member, copy.book, copy=copy)
+        except circulation.CirculationError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'success': True,
+            'borrow_id': borrow_record.id,
+            'book': copy.book.title,
+            'barcode': copy.barcode,
+            'due_date': borrow_record.due_date
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='return')
+    def return_copy(self, request):
+        """بازگشت نسخه با بارکد"""
+        barcode = request.data.get('barcode')
+        if not barcode:
+            return Response({'error': 'Barcode is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        record = (
+            BorrowRecord.objects.select_related('book', 'member')
+            .filter(copy__barcode=barcode, returned=False).first()
+        )
+        if record is None:
+            return Response({'error': 'No open loan for this copy'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            circulation.checkin(record)
+        except circulation.CirculationError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'success': True,
+            'borrow_id': record.id,
+            'fine': record.fine_amount
         })
 
 
@@ -278,12 +548,24 @@ class GenreViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = GenreSerializer
     pagination_class = StandardPagination
     permission_classes = [AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [drf_filters.SearchFilter]
     search_fields = ['name']
 
 
+class BookListThrottle(TokenBucketThrottle):
+    scope = 'books'
+    cost = 10
+
+
+class SyncThrottle(TokenBucketThrottle):
+    # کیوسک‌ها مرتب نظرسنجی می‌کنند و سهم جداگانه‌ای جدا از سطل روزانه anon دارند
+    scope = 'kiosk'
+    shared = False
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([BookListThrottle])
 def book_list_api(request):
     """
     لیست کتاب‌ها برای API ساده
@@ -293,86 +575,110 @@ def book_list_api(request):
     return Response(serializer.data)
 
 
-def book_list(request):
-    """نمایش لیست کتاب‌ها در قالب HTML"""
-    books = Book.objects.all()
-    return render(request, 'books/book_list.html', {'books': books})
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([SyncThrottle])
+def sync_changes(request):
+    """
+    تغییرات کاتالوگ (کتاب، ژانر، موجودی و حذف‌ها) از توکن since به بعد
+    """
+    try:
+        limit = min(int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE)), settings.SYNC_PAGE_SIZE)
+    except ValueError:
+        limit = settings.SYNC_PAGE_SIZE
+    try:
+        data = sync.changes(request.query_params.get('since'), max(limit, 1))
+    except sync.ExpiredToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+    except sync.InvalidToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([SyncThrottle])
+def book_availability(request):
+    """
+    بیت‌مپ فشرده کتاب‌های در دسترس؛ با since فقط تغییرات پس از آن نسخه
+    """
+    since = request.query_params.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({'error': 'since must be an integer version'}, status=status.HTTP_400_BAD_REQUEST)
+        diff = availability.changes(since)
+        # تغییرات زیاد: بیت‌مپ کامل کوچک‌تر از لیست شناسه‌هاست
+        if diff is not None:
+            version, available, unavailable = diff
+            return Response({'version': version, 'full': False, 'available': available, 'unavailable': unavailable})
+    snap = availability.snapshot()
+    return Response({'version': snap['version'], 'full': True, 'encoding': 'zlib+base64', 'bitmap': snap['encoded']})
+
+def _catalog_page(queryset, request):
+    """
+    شماره صفحه و صفحه تنبل کاتالوگ
+
+    صفحه فقط وقتی از پایگاه داده خوانده می‌شود که قطعه نتایج در کش نباشد.
+    """
+    try:
+        number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        number = 1
+    paginator = EstimatedCountPaginator(queryset, settings.CATALOG_PAGE_SIZE)
+    return number, SimpleLazyObject(lambda: paginator.get_page(number))
+
+
+def book_list(request, partial=False):
+    """لیست صفحه‌بندی‌شده کتاب‌ها؛ با partial فقط قطعه نتایج بدون layout"""
+    books = Book.objects.select_related('genre').order_by('title', 'pk')
+    page_number, page_obj = _catalog_page(books, request)
+    template = 'books/partials/book_results.html' if partial else 'books/book_list.html'
+    return render(request, template, {
+        'page_obj': page_obj,
+        'page_number': page_number,
+        'version': catalog.version(),
+        'scope': 'all',
+        'fragment_timeout': settings.CATALOG_FRAGMENT_TIMEOUT,
+        'results_url': reverse('catalog-results'),
+    })
 
 
 def book_detail(request, pk):
     """نمایش جزئیات کتاب در قالب HTML"""
-    book = get_object_or_404(Book, pk=pk)
-    return render(request, 'books/book_detail.html', {'book': book})
+    book = get_object_or_404(Book.objects.select_related('genre'), pk=pk)
+    return render(request, 'books/book_detail.html', {
+        'book': book,
+        'fragment_timeout': settings.CATALOG_FRAGMENT_TIMEOUT,
+    })
 
 
-def book_search(request):
+@throttle('search', cost=5)
+def book_search(request, partial=False):
     """
-    جستجوی پیشرفته کتاب‌ها در قالب HTML
+    جستجوی پیشرفته کتاب‌ها در قالب HTML؛ با partial فقط نتایج و وجه‌ها
     """
-    query = request.GET.get('q', '')
-    genre = request.GET.get('genre', '')
-    author = request.GET.get('author', '')
-    min_year = request.GET.get('min_year', '')
-    max_year = request.GET.get('max_year', '')
-    in_stock = request.GET.get('in_stock', 'false') == 'true'
-    
-    books = Book.objects.all()
+    params = facets.normalize(request.GET)
+    books = facets.search(params).select_related('genre').order_by('title', 'pk')
+    page_number, page_obj = _catalog_page(books, request)
+    template = 'books/partials/search_results.html' if partial else 'books/search.html'
     
-    # فیلترهای جستجو
-    if query:
-        books = books.filter(
-            Q(title__icontains=query) |
-            Q(author__icontains=query) |
-            Q(publisher__icontains=query) |
-            Q(description__icontains=query)
-        ).distinct()
-    
-    if genre:
-        books = books.filter(genre__name__icontains=genre)
-    if author:
-        books = books.filter(author__icontains=author)
-    if min_year:
-        books = books.filter(publish_year__gte=min_year)
-    if max_year:
-        books = books.filter(publish_year__lte=max_year)
-    if in_stock:
-        books = books.filter(available__gt=0)
-    
-    # صفحه‌بندی
-    paginator = Paginator(books, 10) 
-    page = request.GET.get('page', 1)
-    
-    try:
-        books_page = paginator.page(page)
-    except PageNotAnInteger:
-        books_page = paginator.page(1)
-    except EmptyPage:
-        books_page = paginator.page(paginator.num_pages)
-    
-    # آمار جستجو
-    stats = {
-        'total_books': books.count(),
-        'available_books': books.filter(available__gt=0).count(),
-        'popular_genres': Genre.objects.annotate(
-            book_count=Count('book')
-        ).order_by('-book_count')[:5]
-    }
-    
-    return render(request, 'books/search.html', {
-        'books': books_page,
-        'query': query,
+    return render(request, template, {
+        'page_obj': page_obj,
+        'page_number': page_number,
+        'version': catalog.version(),
+        'scope': facets.digest(params),
+        # وجه‌ها هم فقط وقتی قطعه کناری در کش نباشد محاسبه (یا از کش خوانده) می‌شوند
+        'facets': SimpleLazyObject(lambda: facets.cached_facets(params)),
+        'query': params.get('q', ''),
         'filters': {
-            'genre': genre,
-            'author': author,
-            'min_year': min_year,
-            'max_year': max_year,
-            'in_stock': in_stock
-        },
-        'pagination': {
-            'current_page': books_page.number,
-            'total_pages': paginator.num_pages,
-            'has_previous': books_page.has_previous(),
-            'has_next': books_page.has_next()
+            'genre': params.get('genre', ''),
+            'author': params.get('author', ''),
+            'min_year': params.get('min_year', ''),
+            'max_year': params.get('max_year', ''),
+            'in_stock': params.get('in_stock', False)
         },
-        'stats': stats
-    })
\ No newline at end of file
+        'fragment_timeout': settings.CATALOG_FRAGMENT_TIMEOUT,
+        'results_url': reverse('book-search-results'),
+    })
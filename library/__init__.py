@@ -0,0 +1,4 @@
+# بارگذاری اپ Celery همراه با Django تا shared_task ها به آن متصل شوند
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -0,0 +1,43 @@
+"""
+بک‌اندهای کش با شمارش hit/miss برای متریک‌ها
+"""
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from . import metrics
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """افزودن شمارنده hit/miss به get و get_many"""
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_label = params.get('METRICS_LABEL', 'default')
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            metrics.CACHE_REQUESTS.inc(cache=self.metrics_label, result='miss')
+            return default
+        metrics.CACHE_REQUESTS.inc(cache=self.metrics_label, result='hit')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version)
+        hits = len(values)
+        if hits:
+            metrics.CACHE_REQUESTS.inc(hits, cache=self.metrics_label, result='hit')
+        if len(keys) > hits:
+            metrics.CACHE_REQUESTS.inc(len(keys) - hits, cache=self.metrics_label, result='miss')
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    pass
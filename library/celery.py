@@ -0,0 +1,15 @@
+"""
+اپلیکیشن Celery پروژه
+
+تنظیمات با پیشوند CELERY_ از settings خوانده می‌شوند و تسک‌ها از ماژول tasks
+هر اپ به‌صورت خودکار پیدا می‌شوند.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library.settings')
+
+app = Celery('library')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,134 @@
+"""
+مسیریابی خواندن به رپلیکاها با تضمین read-your-writes
+
+- درخواست‌های امن (GET/HEAD/OPTIONS) از رپلیکا می‌خوانند
+- درخواست‌های تغییر‌دهنده و هر کوئری داخل transaction.atomic به primary می‌روند
+- پس از نوشتن، بقیه همان درخواست و تا REPLICA_STICKY_SECONDS خواندن‌های همان کاربر/کلاینت از primary انجام می‌شود
+- خارج از چرخه درخواست (دستورات مدیریتی، تسک‌ها) همه چیز به primary می‌رود
+"""
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import empty
+
+_state = Local()
+
+STICKY_COOKIE = 'db_primary_until'
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def _user_key(user_id):
+    return f'db:primary_until:user:{user_id}'
+
+
+def _resolved_user(request):
+    """کاربر درخواست، فقط اگر قبلاً احراز شده باشد (بدون اجرای کوئری جدید)"""
+    user = request.__dict__.get('user')
+    wrapped = getattr(user, '_wrapped', user)
+    if wrapped is None or wrapped is empty:
+        return None
+    return wrapped if getattr(wrapped, 'is_authenticated', False) else None
+
+
+@contextmanager
+def primary():
+    """اجبار خواندن از primary در یک بلوک (مثلاً برای داده‌ای که باید تازه باشد)"""
+    previous = getattr(_state, 'primary', False)
+    _state.primary = True
+    try:
+        yield
+    finally:
+        _state.primary = previous
+
+
+class ReplicaRouter:
+    """روتر پایگاه داده برای DATABASE_REPLICAS"""
+
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas or getattr(_state, 'request', None) is None:
+            return DEFAULT_DB_ALIAS
+        if getattr(_state, 'primary', False) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        # پس از نوشتن در همین درخواست، رپلیکا هنوز تغییر را ندارد
+        if getattr(_state, 'wrote', False):
+            return DEFAULT_DB_ALIAS
+        if self._user_is_sticky():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # رپلیکاها کپی primary هستند، پس رابطه بین اشیای آن‌ها مجاز است
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in _replicas():
+            return False
+        return None
+
+    @staticmethod
+    def _user_is_sticky():
+        checked = getattr(_state, 'user_sticky', None)
+        if checked is not None:
+            return checked
+        user = _resolved_user(_state.request)
+        if user is None:
+            return False
+        _state.user_sticky = (cache.get(_user_key(user.pk)) or 0) > time.time()
+        return _state.user_sticky
+
+
+class ReplicaRoutingMiddleware:
+    """
+    تعیین وضعیت مسیریابی برای هر درخواست و ثبت پنجره چسبندگی پس از نوشتن
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            sticky_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            sticky_until = 0
+
+        _state.request = request
+        _state.primary = request.method not in ('GET', 'HEAD', 'OPTIONS') or sticky_until > time.time()
+        _state.wrote = False
+        _state.user_sticky = None
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.request = None
+            _state.primary = False
+            _state.wrote = False
+            _state.user_sticky = None
+
+        if wrote:
+            self.mark_sticky(request, response)
+        return response
+
+    @staticmethod
+    def mark_sticky(request, response):
+        seconds = _sticky_seconds()
+        until = time.time() + seconds
+        response.set_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=seconds, httponly=True)
+        user = _resolved_user(request)
+        if user is not None:
+            cache.set(_user_key(user.pk), until, seconds)
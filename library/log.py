@@ -0,0 +1,105 @@
+"""
+لاگ ساخت‌یافته JSON بدون I/O در thread درخواست
+
+رکوردها در thread فراخواننده فقط در یک صف گذاشته می‌شوند؛ یک QueueListener
+در thread جداگانه آن‌ها را به JSON تبدیل کرده و در فایل چرخشی می‌نویسد.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+
+# صفت‌های استاندارد LogRecord که نباید به‌عنوان فیلد اضافی در JSON تکرار شوند
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'taskName'
+}
+
+_exception_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """تبدیل هر رکورد به یک خط JSON"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """نمونه‌برداری از رکوردهای DEBUG؛ سطوح بالاتر همیشه عبور می‌کنند"""
+
+    def __init__(self, rate=0.1):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        return random.random() < self.rate
+
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """
+    هندلر غیرمسدودکننده: صف در thread درخواست، فایل چرخشی JSON در thread شنونده
+
+    اگر صف پر باشد رکورد دور ریخته می‌شود تا درخواست هیچ‌وقت منتظر دیسک نماند.
+    در filename می‌توان از {pid} استفاده کرد تا هر worker فایل جدای خود را بچرخاند.
+    """
+
+    def __init__(self, filename, maxBytes=10 * 1024 * 1024, backupCount=5,
+                 queue_size=10000, encoding='utf-8'):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        filename = str(filename).format(pid=os.getpid())
+        self.file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding
+        )
+        self.file_handler.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+        self.dropped = 0
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # فقط کارهای ضروری در thread فراخواننده؛ قالب‌بندی JSON در شنونده انجام می‌شود
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.file_handler.close()
+        super().close()
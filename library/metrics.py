@@ -0,0 +1,274 @@
+"""
+متریک‌های عملیاتی با فرمت متنی Prometheus
+
+هر پروسه مقادیر خود را در حافظه نگه می‌دارد. اگر METRICS_DIR تنظیم شده باشد
+(مثلاً زیر gunicorn با چند worker)، هر پروسه به‌صورت دوره‌ای یک فایل snapshot
+در آن پوشه می‌نویسد و endpoint متریک‌ها همه فایل‌ها را با هم جمع می‌کند.
+"""
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0
+)
+
+_process_token = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """پایه متریک‌ها با پشتیبانی از label"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): value for key, value in self._values.items()}
+
+
+class Counter(Metric):
+    """شمارنده افزایشی"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(target, values):
+        for key, value in values.items():
+            target[key] = target.get(key, 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, json.loads(key))} {_format_value(value)}'
+
+
+class Histogram(Metric):
+    """هیستوگرام با bucketهای تجمعی"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['count'] += 1
+            state['sum'] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                json.dumps(key): {
+                    'buckets': list(state['buckets']),
+                    'count': state['count'],
+                    'sum': state['sum'],
+                }
+                for key, state in self._values.items()
+            }
+
+    @staticmethod
+    def merge(target, values):
+        for key, state in values.items():
+            current = target.get(key)
+            if current is None:
+                target[key] = {
+                    'buckets': list(state['buckets']),
+                    'count': state['count'],
+                    'sum': state['sum'],
+                }
+                continue
+            current['buckets'] = [a + b for a, b in zip(current['buckets'], state['buckets'])]
+            current['count'] += state['count']
+            current['sum'] += state['sum']
+
+    def render(self, values):
+        for key, state in sorted(values.items()):
+            label_values = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, label_values, ('le', _format_value(bound)))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, label_values, ('le', '+Inf'))
+            yield f'{self.name}_bucket{labels} {state["count"]}'
+            labels = _format_labels(self.labelnames, label_values)
+            yield f'{self.name}_sum{labels} {_format_value(state["sum"])}'
+            yield f'{self.name}_count{labels} {state["count"]}'
+
+
+class Registry:
+    """نگهداری متریک‌ها و تجمیع snapshotهای چند پروسه"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    @staticmethod
+    def _directory():
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def flush(self, force=False):
+        """نوشتن snapshot این پروسه در METRICS_DIR (حداکثر یک بار در هر بازه)"""
+        directory = self._directory()
+        if not directory:
+            return
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        now = time.monotonic()
+        if not force and now - self._last_flush < interval:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = now
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'metrics-{_process_token}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        """مقادیر تجمیع‌شده همه پروسه‌ها"""
+        directory = self._directory()
+        if not directory:
+            return self.snapshot()
+
+        self.flush(force=True)
+        merged = {name: {} for name in self._metrics}
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, values in data.items():
+                metric = self._metrics.get(name)
+                if metric is not None:
+                    metric.merge(merged[name], values)
+        return merged
+
+    def render(self):
+        collected = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.render(collected.get(name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds',
+    'Request latency by route',
+    ['method', 'route'],
+)
+RESPONSES = registry.counter(
+    'http_responses_total',
+    'Responses by route and status code',
+    ['method', 'route', 'status'],
+)
+DB_QUERIES = registry.histogram(
+    'http_request_db_queries',
+    'Database queries executed per request',
+    ['route'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+DB_DURATION = registry.histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database queries per request',
+    ['route'],
+)
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total',
+    'Cache lookups by result',
+    ['cache', 'result'],
+)
+CIRCULATION = registry.counter(
+    'circulation_events_total',
+    'Circulation events (checkout, return, fine)',
+    ['event'],
+)
+FINES_AMOUNT = registry.counter(
+    'circulation_fines_amount_total',
+    'Sum of fines charged on returns',
+)
+
+
+def metrics_view(request):
+    """نمایش متریک‌ها برای Prometheus (فقط از آدرس‌های مجاز)"""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,48 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics
+
+
+class QueryCounter:
+    """شمارش تعداد و زمان کوئری‌های یک درخواست"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """
+    ثبت تأخیر، کد وضعیت و آمار پایگاه داده برای هر مسیر
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match and match.route else '<unmatched>'
+        metrics.REQUEST_LATENCY.observe(duration, method=request.method, route=route)
+        metrics.RESPONSES.inc(method=request.method, route=route, status=response.status_code)
+        metrics.DB_QUERIES.observe(queries.count, route=route)
+        metrics.DB_DURATION.observe(queries.duration, route=route)
+        metrics.registry.flush()
+        return response
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 from dotenv import load_dotenv  # افزودن مدیریت متغیرهای محیطی
 
 # Load environment variables from .env file
@@ -44,12 +45,15 @@ INSTALLED_APPS = [
 
 # ================ میدل‌ورها ================
 MIDDLEWARE = [
+    'library.middleware.MetricsMiddleware',  # متریک‌های تأخیر و پایگاه داده
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'library.db_router.ReplicaRoutingMiddleware',  # خواندن از رپلیکا با چسبندگی پس از نوشتن
+    'library.throttling.RateLimitHeadersMiddleware',  # هدرهای RateLimit-* پاسخ‌های API
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'csp.middleware.CSPMiddleware',  # میدل‌ور سیاست امنیتی محتوا
@@ -147,9 +151,19 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'library.throttling.TokenBucketThrottle',
+    ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        # محدوده‌های endpoint؛ هر درخواست به اندازه وزنش (throttle_cost) توکن مصرف می‌کند
+        'books': '300/min',
+        'search': '60/min',
+        # همگام‌سازی و بیت‌مپ موجودی کیوسک‌ها (بدون سطل anon)
+        'kiosk': '1200/hour',
+        # پیشنهاد هنگام تایپ؛ ظرفیت سطل یک جستجوی کامل را بدون انتظار پوشش می‌دهد (بدون سطل anon)
+        'autocomplete': '120/min',
     }
 }
 
@@ -197,6 +211,13 @@ SIMPLE_JWT = {
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # ================ لاگینگ ================
+# هندلرهای فایل از صف و thread شنونده استفاده می‌کنند تا درخواست‌ها منتظر دیسک نمانند.
+# در حالت چند worker می‌توان با {pid} در LOG_FILE برای هر پروسه فایل جدا ساخت.
+LOG_FILE = os.environ.get('LOG_FILE', str(BASE_DIR / 'debug.log'))
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -206,6 +227,12 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'sample_debug': {
+            '()': 'library.log.DebugSamplingFilter',
+            'rate': LOG_DEBUG_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
@@ -213,9 +240,18 @@ LOGGING = {
         },
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'debug.log',
-            'formatter': 'verbose',
+            'class': 'library.log.QueueFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
+            'filters': ['sample_debug'],
+        },
+        'slow_queries': {
+            'level': 'WARNING',
+            'class': 'library.log.QueueFileHandler',
+            'filename': BASE_DIR / 'slow_queries.log',
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
         },
     },
     'root': {
@@ -238,24 +274,157 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'books.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
+# ================ کوئری‌های کند ================
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'True') == 'True'
+SLOW_QUERY_QUEUE_SIZE = 1000
+
 # ================ کش ================
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'library.cache.InstrumentedLocMemCache',
         'LOCATION': 'unique-snowflake',
     }
 }
 
+# ================ متریک‌ها ================
+# در حالت چند worker (gunicorn) باید به یک پوشه مشترک اشاره کند که در هر استقرار پاک می‌شود
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
 # ================ Celery ================
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+# CELERY_EAGER=True: اجرای همزمان تسک‌ها با broker درون‌حافظه‌ای (بدون Redis، برای توسعه)
+# تست‌ها از طریق TEST_RUNNER همیشه eager اجرا می‌شوند
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_EAGER', 'False') == 'True'
+CELERY_TASK_EAGER_PROPAGATES = True
+if CELERY_TASK_ALWAYS_EAGER:
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_RESULT_BACKEND = 'cache+memory://'
+else:
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+TEST_RUNNER = 'library.test_runner.CeleryEagerTestRunner'
+
+CELERY_BEAT_SCHEDULE = {
+    'backup-database': {
+        'task': 'books.tasks.backup_database',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'recompute-fines': {
+        'task': 'books.tasks.recompute_fines',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'archive-borrow-records': {
+        'task': 'books.tasks.archive_borrow_records',
+        'schedule': crontab(hour=4, minute=0, day_of_week='fri'),
+    },
+    'refresh-recommendations': {
+        'task': 'books.tasks.refresh_recommendations',
+        'schedule': crontab(minute=15),
+    },
+    'reconcile-inventory': {
+        'task': 'books.tasks.reconcile_inventory',
+        'schedule': crontab(hour=1, minute=30),
+    },
+    'reconcile-fines': {
+        'task': 'books.tasks.reconcile_fines',
+        'schedule': crontab(hour=1, minute=45),
+    },
+    'purge-tombstones': {
+        'task': 'books.tasks.purge_tombstones',
+        'schedule': crontab(hour=4, minute=30, day_of_week='sun'),
+    },
+    'send-notifications': {
+        'task': 'books.tasks.send_notifications',
+        'schedule': crontab(hour=9, minute=0),
+    },
+    'popular-books-report': {
+        'task': 'books.tasks.generate_popular_report',
+        'schedule': crontab(minute='*/30'),
+    },
+}
+
+# حداکثر ابعاد تصویر جلد پس از پردازش
+COVER_MAX_SIZE = (600, 900)
+
+# ================ بایگانی سوابق امانت ================
+BORROW_ARCHIVE_AFTER_DAYS = int(os.environ.get('BORROW_ARCHIVE_AFTER_DAYS', 365))
+BORROW_ARCHIVE_BATCH_SIZE = 1000
+
+# ================ تکمیل خودکار ================
+AUTOCOMPLETE_SYNC_INTERVAL = 30  # ثانیه؛ بررسی تغییرات پروسه‌های دیگر
+AUTOCOMPLETE_MAX_CANDIDATES = 500
+
+# ================ پیشنهاد کتاب ================
+RECOMMENDATIONS_TOP_K = 10
+
+# ================ صفحه‌بندی ================
+# بالای این تعداد، تعداد کل لیست‌های بدون فیلتر از آمار جدول گرفته می‌شود (فقط PostgreSQL)
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# ================ صفحه‌های HTML کاتالوگ ================
+CATALOG_PAGE_SIZE = 24
+CATALOG_FRAGMENT_TIMEOUT = 3600  # ثانیه؛ کلید قطعه‌ها با نسخه کاتالوگ عوض می‌شود
+CATALOG_VERSION_TTL = 5  # ثانیه؛ تأخیر دیده‌شدن تغییرات پروسه‌های دیگر
+
+# ================ بسط منابع (?expand=) ================
+EXPAND_MAX_DEPTH = 2  # genre.parent
+EXPAND_MAX_ITEMS = 20  # سقف سطرهای هر بسط چندتایی برای هر شیء
+
+# ================ دریافت دسته‌ای ================
+BATCH_LOOKUP_MAX_SIZE = 100  # بیشینه شناسه‌ها در هر درخواست batch
+
+# ================ جستجوی چندوجهی ================
+FACETS_CACHE_TIMEOUT = 300  # ثانیه
+
+# ================ همگام‌سازی کیوسک‌ها ================
+SYNC_PAGE_SIZE = 500
+SYNC_SAFETY_LAG = 5  # ثانیه؛ فاصله از تغییرات تازه برای تراکنش‌های در حال commit
+SYNC_TOMBSTONE_RETENTION_DAYS = 30  # توکن قدیمی‌تر نیاز به همگام‌سازی کامل دارد
+AVAILABILITY_DIFF_LIMIT = 5000  # رویدادهای بیشتر: بیت‌مپ کامل برگردانده می‌شود
+
+# ================ لاگ رویدادها ================
+EVENT_BATCH_SIZE = 500
+EVENT_SAFETY_LAG = 5  # ثانیه؛ رویدادهای تازه‌تر هنوز به مصرف‌کننده‌ها داده نمی‌شوند
+
+# ================ تطبیق موجودی ================
+INVENTORY_RECONCILE_CHUNK_SIZE = 500
+
+# ================ کتاب‌های پرطرفدار اخیر ================
+TRENDING_HALF_LIFE_DAYS = 7  # با تغییر این دو مقدار دستور rebuild_trending را اجرا کنید
+TRENDING_EPOCH = '2026-01-01'
+TRENDING_TOP_K = 20
+
+# ================ دفتر جریمه ================
+FINE_BLOCK_THRESHOLD = 0  # امانت برای مانده بیشتر از این مبلغ مسدود است
+FINE_RECONCILE_CHUNK_SIZE = 1000
+
+# ================ سیاست‌های امانت ================
+LOAN_POLICY_SYNC_INTERVAL = 30  # ثانیه؛ بررسی تغییر سیاست‌ها در پروسه‌های دیگر
+
+# ================ همگام‌سازی دایرکتوری اعضا ================
+DIRECTORY_SYNC_CHUNK_SIZE = 2000  # ردیف‌های فایل در هر تراکنش
+
+# ================ اطلاعیه‌ها ================
+NOTIFICATION_BATCH_SIZE = 100     # ایمیل‌های هر اتصال SMTP
+NOTIFICATION_CONCURRENCY = 4      # حداکثر اتصال‌های همزمان
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_CLAIM_TIMEOUT = 15 * 60  # ثانیه؛ پس از آن ردیف‌های در حال ارسال دوباره تخصیص می‌یابند
 
 # ================ احراز هویت ================
 ADMIN_URL = os.environ.get('ADMIN_URL', 'admin/')  # مسیر ادمین قابل تغییر
@@ -317,7 +486,34 @@ if not DEBUG:
     # Production cache
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'BACKEND': 'library.cache.InstrumentedRedisCache',
             'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
         }
-    }
\ No newline at end of file
+    }
+
+# ================ رپلیکاهای خواندنی ================
+# REPLICA_DB_HOSTS: فهرست میزبان‌های رپلیکا (جداشده با کاما) با همان تنظیمات primary.
+# USE_SQLITE_REPLICA=True برای آزمایش محلی: primary و رپلیکا دو اتصال SQLite جدا به یک فایل هستند.
+if os.environ.get('USE_SQLITE_REPLICA') == 'True':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+else:
+    for index, host in enumerate(filter(None, os.environ.get('REPLICA_DB_HOSTS', '').split(',')), 1):
+        DATABASES[f'replica_{index}'] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['library.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
@@ -0,0 +1,25 @@
+"""
+اجراکننده تست پروژه
+
+تسک‌های Celery در تست‌ها همزمان و با broker درون‌حافظه‌ای اجرا می‌شوند تا تست‌ها
+به Redis وابسته نباشند؛ تنظیمات اجرای واقعی دست نمی‌خورند.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CeleryEagerTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # اپ Celery تنظیمات CELERY_ را هنگام استفاده از django.conf.settings می‌خواند
+        self.celery_settings = override_settings(
+            CELERY_TASK_ALWAYS_EAGER=True,
+            CELERY_TASK_EAGER_PROPAGATES=True,
+            CELERY_BROKER_URL='memory://',
+            CELERY_RESULT_BACKEND='cache+memory://',
+        )
+        self.celery_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.celery_settings.disable()
+        super().teardown_test_environment(**kwargs)
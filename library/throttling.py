@@ -0,0 +1,247 @@
+"""
+محدودیت نرخ درخواست با سطل توکن روی کش مشترک
+
+هر کلاینت برای هر محدوده (anon/user و محدوده endpoint مثل search) یک سطل دارد
+که با نرخ ثابت پر می‌شود. هر درخواست یک توکن از سطل عمومی anon/user و به اندازه
+وزن خودش از سطل محدوده endpoint برمی‌دارد؛ پس وزن‌ها فقط سهم endpoint را کم می‌کنند.
+در Redis همه سطل‌های یک درخواست با یک اسکریپت Lua و یک رفت‌وبرگشت به‌صورت
+اتمی بررسی و کم می‌شوند؛ در کش‌های درون‌پروسه‌ای (LocMem) یک قفل پروسه کافی است.
+
+هدرهای RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset روی پاسخ
+(توسط RateLimitHeadersMiddleware یا دکوراتور throttle) قرار می‌گیرند.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpResponse
+from rest_framework.throttling import BaseThrottle
+
+KEY_PREFIX = 'throttle'
+
+_DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS: سطل‌ها، ARGV: [نرخ۱، ظرفیت۱، وزن۱، نرخ۲، ظرفیت۲، وزن۲، ...]
+# خروجی: [مجاز؟، توکن باقی‌مانده سطل۱، ...]؛ اگر یک سطل کم بیاورد از هیچ‌کدام کم نمی‌شود
+_TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local allowed = 1
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local capacity = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        allowed = 0
+    end
+end
+local result = {allowed}
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local capacity = tonumber(ARGV[3 * i - 1])
+    local tokens = levels[i]
+    if allowed == 1 then
+        tokens = tokens - tonumber(ARGV[3 * i])
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+    result[i + 1] = tostring(tokens)
+end
+return result
+"""
+
+_script = None
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'100/min' -> (100, 60)؛ همان قالب DEFAULT_THROTTLE_RATES در DRF"""
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), _DURATIONS[period[0]]
+
+
+def get_rate(scope):
+    return parse_rate(settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}).get(scope))
+
+
+class Bucket:
+    def __init__(self, scope, ident, limit, duration, cost=1):
+        # هش‌تگ {ident} همه سطل‌های یک کلاینت را در Redis Cluster روی یک slot نگه می‌دارد
+        self.key = f'{KEY_PREFIX}:{{{ident}}}:{scope}'
+        self.capacity = limit
+        self.rate = limit / duration
+        self.tokens = limit
+        # وزن هر درخواست در این سطل
+        self.cost = cost
+
+    def wait(self, cost=None):
+        """ثانیه تا وقتی که این سطل برای وزن cost (پیش‌فرض وزن سطل) توکن کافی داشته باشد"""
+        return max(0.0, ((self.cost if cost is None else cost) - self.tokens) / self.rate)
+
+    def reset(self):
+        """ثانیه تا پر شدن کامل سطل"""
+        return math.ceil((self.capacity - self.tokens) / self.rate)
+
+
+def _take_redis(backend, buckets):
+    global _script
+    keys = [backend.make_and_validate_key(bucket.key) for bucket in buckets]
+    client = backend._cache.get_client(keys[0], write=True)
+    if _script is None:
+        _script = client.register_script(_TAKE_SCRIPT)
+    args = []
+    for bucket in buckets:
+        args.extend([bucket.rate, bucket.capacity, bucket.cost])
+    allowed, *levels = _script(keys=keys, args=args, client=client)
+    for bucket, tokens in zip(buckets, levels):
+        bucket.tokens = float(tokens)
+    return bool(allowed)
+
+
+def _take_local(backend, buckets):
+    # برای کش‌های درون‌پروسه‌ای اتمی است؛ برای سایر بک‌اندها (مثلاً memcached) تقریبی
+    now = time.time()
+    with _local_lock:
+        stored = backend.get_many([bucket.key for bucket in buckets])
+        for bucket in buckets:
+            tokens, updated = stored.get(bucket.key, (bucket.capacity, now))
+            bucket.tokens = min(bucket.capacity, tokens + max(0.0, now - updated) * bucket.rate)
+        allowed = all(bucket.tokens >= bucket.cost for bucket in buckets)
+        for bucket in buckets:
+            if allowed:
+                bucket.tokens -= bucket.cost
+        backend.set_many(
+            {bucket.key: (bucket.tokens, now) for bucket in buckets},
+            max(bucket.reset() for bucket in buckets) + 1,
+        )
+    return allowed
+
+
+def take(buckets, cost=None):
+    """
+    برداشت اتمی وزن هر سطل از آن؛ اگر یکی کافی نباشد هیچ‌کدام کم نمی‌شوند
+
+    با cost همه سطل‌ها همین وزن را می‌گیرند.
+    """
+    if not buckets:
+        return True
+    if cost is not None:
+        for bucket in buckets:
+            bucket.cost = cost
+    if isinstance(cache, RedisCache):
+        return _take_redis(cache, buckets)
+    return _take_local(cache, buckets)
+
+
+def client_ident(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user', f'user:{user.pk}'
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    num_proxies = settings.REST_FRAMEWORK.get('NUM_PROXIES')
+    if forwarded and num_proxies:
+        addrs = [addr.strip() for addr in forwarded.split(',')]
+        return 'anon', f'ip:{addrs[-min(num_proxies, len(addrs))]}'
+    return 'anon', f"ip:{request.META.get('REMOTE_ADDR')}"
+
+
+def buckets_for(request, scope=None, cost=1, shared=True):
+    """
+    سطل عمومی (anon/user) با وزن ۱ و در صورت وجود سطل محدوده endpoint با وزن cost
+
+    با shared=False فقط سطل محدوده استفاده می‌شود (مثلاً کیوسک‌ها که سهم جداگانه دارند).
+    """
+    default_scope, ident = client_ident(request)
+    buckets = []
+    for name, weight in ((default_scope if shared else None, 1), (scope, cost)):
+        rate = get_rate(name) if name else None
+        if rate is not None:
+            buckets.append(Bucket(name, ident, *rate, cost=weight))
+    return buckets
+
+
+def rate_limit_headers(buckets):
+    """هدرهای استاندارد بر اساس محدودکننده‌ترین سطل"""
+    bucket = min(buckets, key=lambda b: b.tokens / b.capacity)
+    return {
+        'RateLimit-Limit': str(bucket.capacity),
+        'RateLimit-Remaining': str(max(0, int(bucket.tokens))),
+        'RateLimit-Reset': str(bucket.reset()),
+    }
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    throttle پیش‌فرض DRF
+
+    view می‌تواند با throttle_scope محدوده جداگانه و با throttle_cost
+    (یا throttle_costs بر اساس action) وزن درخواست در سطل محدوده را تعیین کند؛ برای
+    view های تابعی (api_view) همین مقادیر با زیرکلاس و scope/cost داده می‌شوند.
+    """
+    scope = None
+    cost = 1
+    # آیا درخواست از سطل عمومی anon/user هم کم می‌کند
+    shared = True
+
+    def allow_request(self, request, view):
+        # api_view روی view های تابعی throttle_scope=None می‌گذارد
+        scope = getattr(view, 'throttle_scope', None) or self.scope
+        self.buckets = buckets_for(request, scope, self.get_cost(view), self.shared)
+        if not self.buckets:
+            return True
+        allowed = take(self.buckets)
+        # برای RateLimitHeadersMiddleware روی HttpRequest اصلی نگه داشته می‌شود
+        request._request.rate_limit_headers = rate_limit_headers(self.buckets)
+        return allowed
+
+    def get_cost(self, view):
+        costs = getattr(view, 'throttle_costs', {})
+        return costs.get(getattr(view, 'action', None), getattr(view, 'throttle_cost', self.cost))
+
+    def wait(self):
+        return max(bucket.wait() for bucket in self.buckets)
+
+
+def throttle(scope=None, cost=1):
+    """دکوراتور محدودیت نرخ برای view های معمولی جنگو (غیر DRF)"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            buckets = buckets_for(request, scope, cost)
+            if not buckets:
+                return view_func(request, *args, **kwargs)
+            if take(buckets):
+                response = view_func(request, *args, **kwargs)
+            else:
+                response = HttpResponse('Too Many Requests', status=429, content_type='text/plain')
+                response['Retry-After'] = str(math.ceil(max(bucket.wait() for bucket in buckets)))
+            for header, value in rate_limit_headers(buckets).items():
+                response[header] = value
+            return response
+        return wrapper
+    return decorator
+
+
+class RateLimitHeadersMiddleware:
+    """افزودن هدرهای RateLimit-* که TokenBucketThrottle برای درخواست ثبت کرده است"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        for header, value in getattr(request, 'rate_limit_headers', {}).items():
+            response.setdefault(header, value)
+        return response
@@ -3,12 +3,16 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from books.views import BookListAPI, BookViewSet, MemberViewSet, book_search
+from books.views import (
+    BookViewSet, CirculationViewSet, MemberViewSet, book_availability, book_detail, book_list, book_list_api, book_search, sync_changes,
+)
+from library.metrics import metrics_view
 
 
 router = DefaultRouter()
 router.register(r'books', BookViewSet, basename='book') 
 router.register(r'members', MemberViewSet, basename='member') 
+router.register(r'circulation', CirculationViewSet, basename='circulation')
 
 urlpatterns = [
 
@@ -17,14 +21,23 @@ urlpatterns = [
 
     path('api/', include([
         path('v1/', include(router.urls)),  
-        path('v1/books-list/', BookListAPI.as_view(), name='books-list'), 
+        path('v1/books-list/', book_list_api, name='books-list'), 
+        path('v1/sync/', sync_changes, name='sync-changes'),
+        path('v1/availability/', book_availability, name='book-availability'),
     ])),
     
 
     path('search/', book_search, name='book-search'),
+    path('search/results/', book_search, {'partial': True}, name='book-search-results'),
+    path('catalog/', book_list, name='catalog'),
+    path('catalog/results/', book_list, {'partial': True}, name='catalog-results'),
+    path('catalog/<int:pk>/', book_detail, name='book_detail'),
     
 
     path('api/auth/', include('rest_framework.urls', namespace='rest_framework')),
+    
+
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library.settings')
 
 application = get_wsgi_application()
+
+# ساخت ایندکس تکمیل خودکار هنگام شروع پروسه وب
+from books.autocomplete import index  # noqa: E402
+
+index.warm()